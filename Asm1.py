@@ -4,11 +4,19 @@ import json
 import datetime
 from collections import deque
 import os
+import sys
 import threading
 import time
 
+# Reuse the backend's per-shelf background model registry when it is available
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+try:
+    from bg_registry import BackgroundModelRegistry
+except ImportError:
+    BackgroundModelRegistry = None
+
 class AutomatedStockMonitor:
-    def __init__(self, camera_id=0, config_file='shelf_config.json'):
+    def __init__(self, camera_id=0, config_file='shelf_config.json', bg_snapshot_file='asm1_bg_models.npz'):
         self.cap = cv2.VideoCapture(camera_id)
         self.config_file = config_file
         self.shelf_regions = []
@@ -25,6 +33,12 @@ class AutomatedStockMonitor:
             history=500, varThreshold=16, detectShadows=True
         )
         
+        # Per-shelf background models, restored from the last run if a snapshot exists
+        self.bg_snapshot_file = bg_snapshot_file
+        self.bg_registry = BackgroundModelRegistry() if BackgroundModelRegistry is not None else None
+        if self.bg_registry is not None:
+            self.bg_registry.load(self.bg_snapshot_file)
+        
         # Alert system
         self.alert_cooldown = {}  # Prevent spam alerts
         self.alert_duration = 300  # 5 minutes cooldown
@@ -91,7 +105,7 @@ class AutomatedStockMonitor:
         
         return potential_shelves
     
-    def analyze_shelf_occupancy(self, frame, shelf_region):
+    def analyze_shelf_occupancy(self, frame, shelf_region, shelf_id=None):
         """Analyze if a shelf is empty or stocked"""
         x1, y1, x2, y2 = shelf_region
         shelf_roi = frame[y1:y2, x1:x2]
@@ -99,9 +113,8 @@ class AutomatedStockMonitor:
         if shelf_roi.size == 0:
             return 0.0, shelf_roi
         
-        # Convert to different color spaces for analysis
+        # Convert to grayscale for analysis
         gray_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2GRAY)
-        hsv_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2HSV)
         
         # Method 1: Edge density analysis
         edges = cv2.Canny(gray_roi, 50, 150)
@@ -115,7 +128,11 @@ class AutomatedStockMonitor:
         hist_variance = np.var(hist)
         
         # Method 4: Background subtraction
-        fg_mask = self.bg_subtractor.apply(shelf_roi)
+        if self.bg_registry is not None:
+            model_key = shelf_id if shelf_id is not None else tuple(shelf_region)
+            fg_mask = self.bg_registry.apply(model_key, shelf_roi)
+        else:
+            fg_mask = self.bg_subtractor.apply(shelf_roi)
         foreground_ratio = np.sum(fg_mask > 0) / (fg_mask.shape[0] * fg_mask.shape[1])
         
         # Combine metrics to determine occupancy
@@ -218,7 +235,7 @@ class AutomatedStockMonitor:
             x1, y1, x2, y2 = shelf['region']
             
             # Analyze occupancy
-            occupancy_score, shelf_roi = self.analyze_shelf_occupancy(frame, shelf['region'])
+            occupancy_score, shelf_roi = self.analyze_shelf_occupancy(frame, shelf['region'], shelf['id'])
             
             # Determine color based on occupancy
             if occupancy_score < self.empty_threshold:
@@ -362,6 +379,8 @@ class AutomatedStockMonitor:
                 self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
                     history=500, varThreshold=16, detectShadows=True
                 )
+                if self.bg_registry is not None:
+                    self.bg_registry.clear()
                 print("Background model reset")
         
         cv2.destroyWindow('Monitoring')
@@ -410,6 +429,11 @@ class AutomatedStockMonitor:
     def cleanup(self):
         """Cleanup resources"""
         self.cap.release()
+        if self.bg_registry is not None:
+            try:
+                self.bg_registry.save(self.bg_snapshot_file)
+            except Exception as e:
+                print(f"Error saving background models: {e}")
         cv2.destroyAllWindows()
         print("System shutdown complete.")
 
@@ -18,6 +18,8 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Token security
 security = HTTPBearer()
+# For endpoints that also accept the token as a query parameter (e.g. <img> sources)
+optional_security = HTTPBearer(auto_error=False)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -53,11 +55,9 @@ def verify_token(token: str):
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
-):
-    email = verify_token(credentials.credentials)
+def get_user_from_token(token: str, db: Session) -> User:
+    """User an access token belongs to; for endpoints that take the token as a query parameter"""
+    email = verify_token(token)
     user = db.query(User).filter(User.email == email).first()
     if user is None:
         raise HTTPException(
@@ -66,3 +66,23 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     return user
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
+    return get_user_from_token(credentials.credentials, db)
+
+async def get_user_from_header_or_query(
+    token: Optional[str] = None,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: Session = Depends(get_db)
+):
+    """Like get_current_user, but falls back to a ``token`` query parameter"""
+    if credentials is None and not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return get_user_from_token(credentials.credentials if credentials is not None else token, db)
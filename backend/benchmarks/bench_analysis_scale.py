@@ -0,0 +1,185 @@
+"""
+Benchmark: downscaled shelf analysis, latency vs. agreement with full resolution.
+
+Generates synthetic 1280x720 shelf scenes where every shelf is stocked to a
+random fill level, then classifies all shelves at analysis scales 1.0, 0.5
+and 0.25. Reports per-frame latency, agreement of the stock level with the
+full-resolution classification, and the mean absolute score difference.
+
+With --calibrate it instead fits cv_features.SCALE_GAINS on scenes from a
+different seed: for each scale-dependent feature, the median ratio of its
+value at full resolution to its uncompensated value at each scale, over the
+shelves where neither value is zero and neither saturates the normaliser.
+
+Background subtraction is disabled here: its output depends on frame history,
+not resolution. If cv_system/enhanced_monitor.py can be imported, the latency
+of its analyze_shelf_occupancy_advanced is measured too. Its histogram and
+colour entropy terms are computed over raw bin counts, so its scores are not
+on the stock-level scale and no agreement is reported for it.
+
+Usage (from the backend directory):
+    python benchmarks/bench_analysis_scale.py [--frames 10] [--shelves 24] [--calibrate]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BACKEND_DIR))
+import cv_features  # noqa: E402
+from cv_processor import CVProcessor  # noqa: E402
+
+SCALES = [1.0, 0.5, 0.25]
+CALIBRATION_SCALES = [0.5, 0.25, 0.125]
+
+
+class BenchShelf:
+    def __init__(self, shelf_id, region):
+        self.id = shelf_id
+        self.name = f"Shelf_{shelf_id}"
+        self.region = region
+        self.empty_threshold = 0.15
+
+
+def make_scene(shelf_count, rng, width=1280, height=720):
+    """Frame with shelf boards stocked to a random fill level each"""
+    frame = np.full((height, width, 3), 70, np.uint8)
+    shelves = []
+    rows = max(1, int(np.ceil(shelf_count / 4)))
+    row_h = height // rows
+    shelf_w = width // 4
+    for i in range(shelf_count):
+        x, y = (i % 4) * shelf_w + 10, (i // 4) * row_h + 10
+        w, h = shelf_w - 20, row_h - 20
+        cv2.rectangle(frame, (x, y), (x + w, y + h), (150, 150, 150), -1)
+        fill = rng.uniform(0, 1)
+        px = x
+        while px < x + int(w * fill):
+            pw = int(rng.integers(12, 30))
+            ph = int(rng.integers(h // 2, h))
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(frame, (px, y + h - ph), (min(px + pw, x + w), y + h), color, -1)
+            cv2.putText(frame, "A", (px + 2, y + h - ph // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+            px += pw + int(rng.integers(1, 4))
+        shelves.append(BenchShelf(i + 1, [x, y, w, h]))
+    noise = rng.normal(0, 4, frame.shape)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8), shelves
+
+
+def load_enhanced_monitor():
+    sys.path.append(str(BACKEND_DIR.parent / "cv_system"))
+    try:
+        from enhanced_monitor import EnhancedStockMonitor
+    except ImportError as e:
+        print(f"(skipping EnhancedStockMonitor: {e})")
+        return None
+    monitor = EnhancedStockMonitor()
+    monitor.bg_registry = None
+    monitor.bg_subtractor = None  # foreground ratio falls back to 0
+    return monitor
+
+
+def raw_feature_values(frame, shelves, scale):
+    """Value of every scale-dependent feature per shelf, uncompensated (features are told scale 1)"""
+    values = {name: [] for name in cv_features.SCALE_GAINS}
+    for shelf in shelves:
+        x, y, w, h = shelf.region
+        roi = frame[y:y + h, x:x + w]
+        if scale != 1.0:
+            size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            roi = cv2.resize(roi, size, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY)
+        planes = {"gray": gray, "edges": cv2.Canny(gray, 50, 150)}
+        for name in values:
+            feature = cv_features.OCCUPANCY_FEATURES.features[name]
+            values[name].append(feature.fn(planes[feature.plane], 1.0))
+    return {name: np.array(v) for name, v in values.items()}
+
+
+def calibrate(scenes):
+    raw = {}
+    for scale in [1.0] + CALIBRATION_SCALES:
+        per_scene = [raw_feature_values(frame, shelves, scale) for frame, shelves in scenes]
+        raw[scale] = {name: np.concatenate([values[name] for values in per_scene]) for name in cv_features.SCALE_GAINS}
+    print("SCALE_GAINS = {")
+    for name in cv_features.SCALE_GAINS:
+        full = raw[1.0][name]
+        points = ["(1.0, 1.0)"]
+        for scale in CALIBRATION_SCALES:
+            scaled = raw[scale][name]
+            usable = (full > 0) & (full < 1.0) & (scaled > 0) & (scaled < 1.0)
+            gain = np.median(full[usable] / scaled[usable])
+            points.append(f"({scale}, {gain:.3g})")
+        print(f'    "{name}": ({", ".join(points)}),')
+    print("}")
+
+
+def classify(processor, score):
+    return processor.classify_stock_level(score)
+
+
+def report(name, scores_by_scale, latency_by_scale, processor):
+    print(f"\n{name}")
+    if scores_by_scale is None:
+        print(f"{'scale':>6} {'ms/frame':>9} {'speedup':>8}")
+    else:
+        print(f"{'scale':>6} {'ms/frame':>9} {'speedup':>8} {'agreement':>10} {'mean |d score|':>15}")
+    for scale in SCALES:
+        latency = latency_by_scale[scale]
+        line = f"{scale:>6.2f} {latency:>9.2f} {latency_by_scale[1.0] / latency:>7.1f}x"
+        if scores_by_scale is not None:
+            reference, scores = scores_by_scale[1.0], scores_by_scale[scale]
+            agree = np.mean([classify(processor, a) == classify(processor, b) for a, b in zip(reference, scores)])
+            delta = np.mean(np.abs(np.array(reference) - np.array(scores)))
+            line += f" {agree:>9.1%} {delta:>15.4f}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--shelves", type=int, default=24)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--calibrate", action="store_true", help="fit SCALE_GAINS instead of benchmarking")
+    args = parser.parse_args()
+
+    if args.calibrate:
+        rng = np.random.default_rng(args.seed + 1)
+        calibrate([make_scene(args.shelves, rng) for _ in range(args.frames * 4)])
+        return
+
+    rng = np.random.default_rng(args.seed)
+    scenes = [make_scene(args.shelves, rng) for _ in range(args.frames)]
+
+    processor = CVProcessor()
+    processor.change_gate = None
+    processor.bg_registry = None
+    scores = {}
+    latency = {}
+    for scale in SCALES:
+        processor.set_analysis_scale(scale)
+        scores[scale] = []
+        start = time.perf_counter()
+        for frame, shelves in scenes:
+            scores[scale].extend(r['occupancy_score'] for r in processor.process_frame(frame, shelves))
+        latency[scale] = (time.perf_counter() - start) / len(scenes) * 1000.0
+    report(f"CVProcessor.process_frame ({args.shelves} shelves, {args.frames} frames)", scores, latency, processor)
+
+    monitor = load_enhanced_monitor()
+    if monitor is not None:
+        latency = {}
+        for scale in SCALES:
+            start = time.perf_counter()
+            for frame, shelves in scenes:
+                for shelf in shelves:
+                    monitor.analyze_shelf_occupancy_advanced(frame, shelf.region, shelf.id, scale)
+            latency[scale] = (time.perf_counter() - start) / len(scenes) * 1000.0
+        report("EnhancedStockMonitor.analyze_shelf_occupancy_advanced (latency only)", None, latency, processor)
+
+
+if __name__ == "__main__":
+    main()
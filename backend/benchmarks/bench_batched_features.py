@@ -0,0 +1,96 @@
+"""
+Benchmark: batched (N, H, W) ROI features vs. the per-shelf loop.
+
+Measures the batchable features (edge density, gray variance, histogram
+variance) of N shelves on a synthetic 1920x1080 shelf frame. The per-shelf
+loop is the "planes" backend: one shared gray/Canny plane, then one crop and
+one set of reductions per shelf. The batched backend resizes every ROI to a
+few canonical shapes, stacks each group and reduces along the batch axis,
+returning a structured array. Plane construction is timed on both paths.
+
+The "mean |diff|" and "max |diff|" columns compare the blended score of the
+two paths. Gray features are computed from the histograms of the unresized
+ROIs on both, so the difference comes from edge density alone, whose ROIs
+are resampled to the canonical shapes.
+
+Usage (from the backend directory):
+    python benchmarks/bench_batched_features.py [--shelves 10 50 200]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from cv_features import OCCUPANCY_FEATURES  # noqa: E402
+from cv_processor import BatchedFramePlanes, FramePlanes, union_bounds  # noqa: E402
+
+FEATURES = [OCCUPANCY_FEATURES.features[name] for name in ("edge_density", "color_variance", "histogram")]
+
+
+def make_frame(width=1920, height=1080, seed=0):
+    """Synthetic shelf scene: textured product blocks on a flat background"""
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 90, np.uint8)
+    for _ in range(1500):
+        x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 40))
+        w, h = int(rng.integers(10, 40)), int(rng.integers(10, 40))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+    noise = rng.normal(0, 6, frame.shape)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+def make_regions(count, width=1920, height=1080, seed=1):
+    rng = np.random.default_rng(seed)
+    regions = []
+    for _ in range(count):
+        w, h = int(rng.integers(120, 480)), int(rng.integers(40, 160))
+        regions.append([int(rng.integers(0, width - w)), int(rng.integers(0, height - h)), w, h])
+    return regions
+
+
+def per_shelf(frame, regions, bounds, scale):
+    planes = FramePlanes(frame, bounds, scale)
+    return np.array([[planes.measure(feature, region) for feature in FEATURES] for region in regions])
+
+
+def batched(frame, regions, bounds, scale):
+    planes = BatchedFramePlanes(frame, bounds, scale)
+    planes.expect(regions)
+    return planes.feature_array(FEATURES)
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shelves", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    frame = make_frame()
+    weights = np.array([feature.weight for feature in FEATURES])
+    print(f"{'shelves':>8}{'per-shelf ms':>14}{'batched ms':>12}{'speedup':>9}{'mean |diff|':>13}{'max |diff|':>12}")
+    for count in args.shelves:
+        regions = make_regions(count)
+        bounds = union_bounds(frame.shape, regions)
+        loop_ms, loop_values = timed(lambda: per_shelf(frame, regions, bounds, args.scale), args.repeat)
+        batch_ms, table = timed(lambda: batched(frame, regions, bounds, args.scale), args.repeat)
+        batch_values = np.stack([table[feature.name] for feature in FEATURES], axis=1)
+        diff = np.abs(loop_values @ weights - batch_values @ weights) / weights.sum()
+        print(f"{count:>8}{loop_ms:>14.2f}{batch_ms:>12.2f}{loop_ms / batch_ms:>8.1f}x{diff.mean():>13.4f}{diff.max():>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark: cascade scoring with early exit vs. evaluating every feature.
+
+Builds a synthetic 1280x720 frame where shelves are empty (flat, lightly
+textured board), sparsely stocked or fully stocked, then scores the same
+frames with CVProcessor's full evaluation and with the cascade enabled.
+Reports the time per shelf, which cascade stage settled each shelf, whether
+any shelf ended up at a different stock level than with the full evaluation
+(the cascade only stops once the worst-case bounds prove the level, so this
+stays at 0) and the largest score difference, which is at most the weight
+share of the skipped features.
+
+The first ``--warmup`` frames are scored untimed on both paths, so the
+per-shelf background models are warm when timing starts.
+
+Usage (from the backend directory):
+    python benchmarks/bench_cascade.py [--repeats 10] [--shelves 60]
+"""
+import argparse
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from cv_processor import CVProcessor  # noqa: E402
+
+
+class BenchShelf:
+    def __init__(self, shelf_id, region):
+        self.id = shelf_id
+        self.name = f"Shelf_{shelf_id}"
+        self.region = region
+        self.empty_threshold = 0.15
+        self.camera_id = 1
+
+
+def make_scene(count, width=1280, height=720, seed=0):
+    """Frame and a grid of shelves, a third each empty, sparse and full"""
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 120, np.uint8)
+    cols = 6
+    rows = (count + cols - 1) // cols
+    cell_w, cell_h = width // cols, height // rows
+    shelves = []
+    for i in range(count):
+        x, y = (i % cols) * cell_w + 4, (i // cols) * cell_h + 4
+        w, h = cell_w - 8, cell_h - 8
+        kind = i % 3
+        products = {0: 0, 1: 6, 2: 60}[kind]
+        for _ in range(products):
+            px, py = x + int(rng.integers(0, w - 12)), y + int(rng.integers(0, h - 12))
+            pw, ph = int(rng.integers(6, 30)), int(rng.integers(8, 40))
+            color = tuple(int(c) for c in rng.integers(0, 255, 3))
+            cv2.rectangle(frame, (px, py), (min(px + pw, x + w), min(py + ph, y + h)), color, -1)
+        shelves.append(BenchShelf(i + 1, [x, y, w, h]))
+    return frame, shelves
+
+
+def noisy(frame, rng):
+    return cv2.add(frame, rng.normal(0, 3, frame.shape).astype(np.int8), dtype=cv2.CV_8U)
+
+
+def run(processor, frames, shelves, warmup):
+    """Score every frame; returns (ms per shelf, levels, deciding stages and scores of the last frame)"""
+    for frame in frames[:warmup]:
+        processor.score_frame(frame, shelves)
+    frames = frames[warmup:]
+    start = time.perf_counter()
+    for frame in frames:
+        scores = processor.score_frame(frame, shelves)
+    elapsed = (time.perf_counter() - start) * 1000.0
+    levels = [processor.classify_stock_level(score.occupancy_score, shelf.empty_threshold)
+              for shelf, score in zip(shelves, scores)]
+    return elapsed / (len(frames) * len(shelves)), levels, [score.decided_by for score in scores], scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=10, help="frames timed per run")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--shelves", type=int, default=60)
+    parser.add_argument("--margin", type=float, default=0.02)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    base, shelves = make_scene(args.shelves)
+    frames = [noisy(base, rng) for _ in range(args.warmup + args.repeats)]
+    print(f"Frame: {base.shape[1]}x{base.shape[0]}, shelves: {len(shelves)}, frames: {args.repeats}")
+
+    for profile in ("full", "balanced"):
+        full = CVProcessor()
+        full.change_gate = None  # measure the analysis on every frame
+        full.set_metric_profile(profile)
+        cascade = CVProcessor()
+        cascade.change_gate = None
+        cascade.set_metric_profile(profile)
+        cascade.set_cascade(True, args.margin)
+
+        full_ms, full_levels, _, full_scores = run(full, frames, shelves, args.warmup)
+        cascade_ms, cascade_levels, stages, cascade_scores = run(cascade, frames, shelves, args.warmup)
+        changed = sum(a != b for a, b in zip(full_levels, cascade_levels))
+        score_diff = max(abs(a.occupancy_score - b.occupancy_score) for a, b in zip(full_scores, cascade_scores))
+
+        print(f"\nprofile {profile}: full {full_ms:.3f} ms/shelf, cascade {cascade_ms:.3f} ms/shelf "
+              f"({full_ms / cascade_ms:.2f}x)")
+        print(f"  levels changed: {changed}/{len(shelves)}, max score difference: {score_diff:.3f}")
+        print(f"  levels: {dict(Counter(full_levels))}")
+        print(f"  decided by: {dict(Counter(stages))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark: upload decode, PIL path vs. cv2.imdecode (optionally reduced).
+
+The old path was BytesIO -> PIL.Image.open -> np.array -> cv2.cvtColor(RGB2BGR).
+The new path is decode_image(): cv2.imdecode over a np.frombuffer view of the
+upload, with IMREAD_REDUCED_COLOR_2/4 when the analysis scale allows it.
+
+Reports the median decode latency and the tracemalloc peak per decode. PIL's
+internal decode buffers are allocated outside the Python allocator, so the old
+path's peak is a lower bound. Also checks that grayscale, RGBA, palette and
+16-bit PNGs decode to 8-bit BGR frames with the right pixels.
+
+Usage (from the backend directory):
+    python benchmarks/bench_decode.py [--repeats 30]
+"""
+import argparse
+import statistics
+import sys
+import time
+import tracemalloc
+from io import BytesIO
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(BACKEND_DIR))
+from cv_executor import decode_image  # noqa: E402
+
+
+def legacy_decode(image_data):
+    """Decode path used by the API before decode_image"""
+    image = Image.open(BytesIO(image_data))
+    return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+
+
+def make_frame(width, height, rng):
+    """Shelf-like frame with texture, so JPEG sizes are realistic"""
+    frame = np.full((height, width, 3), 70, np.uint8)
+    for _ in range(400):
+        x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 60))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(frame, (x, y), (x + int(rng.integers(10, 40)), y + int(rng.integers(20, 60))), color, -1)
+    return cv2.add(frame, rng.normal(0, 6, frame.shape).astype(np.int8), dtype=cv2.CV_8U)
+
+
+def measure(fn, data, repeats):
+    fn(data)  # warm-up
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(data)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times) * 1000, peak / (1024 * 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=30)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    paths = [
+        ("PIL + cvtColor", legacy_decode),
+        ("imdecode", lambda d: decode_image(d, 1)),
+        ("imdecode 1/2", lambda d: decode_image(d, 2)),
+        ("imdecode 1/4", lambda d: decode_image(d, 4)),
+    ]
+
+    for width, height in [(1280, 720), (1920, 1080)]:
+        frame = make_frame(width, height, rng)
+        jpg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+        print(f"\nJPEG {width}x{height} ({len(jpg) / 1024:.0f} KiB)")
+        print(f"{'path':<16}{'output':>14}{'latency ms':>12}{'peak MiB':>10}")
+        for name, fn in paths:
+            shape = fn(jpg).shape
+            latency, peak = measure(fn, jpg, args.repeats)
+            print(f"{name:<16}{str(shape[1]) + 'x' + str(shape[0]):>14}{latency:>12.2f}{peak:>10.2f}")
+
+    frame = make_frame(640, 360, rng)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    quantized = Image.fromarray(frame[:, :, ::-1]).quantize(64)
+    palette = BytesIO()
+    quantized.save(palette, "PNG")
+    inputs = {
+        "gray PNG": (cv2.imencode(".png", gray)[1].tobytes(), cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)),
+        "RGBA PNG": (cv2.imencode(".png", cv2.cvtColor(frame, cv2.COLOR_BGR2BGRA))[1].tobytes(), frame),
+        "palette PNG": (palette.getvalue(), np.ascontiguousarray(np.asarray(quantized.convert("RGB"))[:, :, ::-1])),
+        "16-bit PNG": (cv2.imencode(".png", gray.astype(np.uint16) * 257)[1].tobytes(),
+                       cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)),
+    }
+    print("\nNon-RGB inputs (ok = 8-bit BGR matching the source pixels)")
+    for label, (data, expected) in inputs.items():
+        results = []
+        for name, fn in paths[:2]:
+            try:
+                decoded = fn(data)
+                ok = (decoded.dtype == np.uint8 and decoded.shape == expected.shape
+                      and np.abs(decoded.astype(int) - expected).max() <= 1)
+                results.append(f"{name}: {'ok' if ok else 'wrong'} {decoded.shape} {decoded.dtype}")
+            except Exception as e:
+                results.append(f"{name}: {type(e).__name__}")
+        print(f"{label:<12} " + "; ".join(results))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Benchmark: CNN shelf scoring with one batched forward pass vs. one per shelf.
+
+Writes the tiny gradient-energy CNN (tiny_occupancy_cnn.py) to a temporary
+directory, so no model download is needed, and scores N shelf ROIs cut from a
+synthetic 1080p frame with one blobFromImage + forward per ROI, with a single
+blobFromImages batch of all N, and through DnnOccupancyScorer in batches of
+at most --max-batch.
+
+Usage (from the backend directory):
+    python benchmarks/bench_dnn.py [--shelves 10 50 200] [--size 64] [--max-batch 16]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from dnn_scorer import MODEL_CACHE, DnnOccupancyScorer  # noqa: E402
+from tiny_occupancy_cnn import write_tiny_occupancy_model  # noqa: E402
+
+
+def timed(fn, repeat):
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shelves", type=int, nargs="+", default=[10, 50, 200])
+    parser.add_argument("--size", type=int, default=64, help="square network input size")
+    parser.add_argument("--max-batch", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    frame = (rng.random((1080, 1920, 3)) * 255).astype(np.uint8)
+    frame = cv2.GaussianBlur(frame, (7, 7), 0)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_tiny_occupancy_model(os.path.join(directory, "tiny_occupancy.onnx"), (args.size, args.size))
+        scorer = DnnOccupancyScorer(path, (args.size, args.size), max_batch=args.max_batch)
+        unbounded = DnnOccupancyScorer(path, (args.size, args.size), max_batch=max(args.shelves))
+        net, _ = MODEL_CACHE.get(path)
+
+        def one_by_one(rois):
+            scores = []
+            for roi in rois:
+                net.setInput(cv2.dnn.blobFromImage(roi, scorer.scale, scorer.input_size, scorer.mean, False, crop=False))
+                scores.append(float(net.forward().ravel()[0]))
+            return np.array(scores)
+
+        print(f"{'shelves':>8}{'per-ROI ms':>12}{'one pass ms':>13}{'speedup':>9}"
+              f"{'batches of ' + str(args.max_batch):>17}{'speedup':>9}{'max diff':>10}")
+        for count in args.shelves:
+            rois = []
+            for _ in range(count):
+                w, h = int(rng.integers(150, 500)), int(rng.integers(60, 200))
+                x, y = int(rng.integers(0, 1920 - w)), int(rng.integers(0, 1080 - h))
+                rois.append(frame[y:y+h, x:x+w])
+            single_ms, single = timed(lambda: one_by_one(rois), args.repeat)
+            pass_ms, _ = timed(lambda: unbounded.score(rois), args.repeat)
+            batch_ms, batched = timed(lambda: scorer.score(rois), args.repeat)
+            print(f"{count:>8}{single_ms:>12.2f}{pass_ms:>13.2f}{single_ms / pass_ms:>8.1f}x"
+                  f"{batch_ms:>17.2f}{single_ms / batch_ms:>8.1f}x{np.max(np.abs(single - batched)):>10.1e}")
+        print(f"Model loaded {MODEL_CACHE.loads} time(s) for all runs")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark: shared per-frame feature planes vs. per-shelf recomputation.
+
+Runs CVProcessor.process_frame on a synthetic 1280x720 shelf frame for a
+growing number of shelves and compares it with the original per-shelf loop
+(one BGR->gray, BGR->HSV, Canny and histogram per ROI).
+
+The "path" column is the planes the processor picked: "union" computes them
+once over the shelves' bounding box, "per-ROI" per shelf when that box is
+more than ROI_PLANES_RATIO times the shelves' summed area.
+
+The "no fg" columns disable background subtraction on both paths. The
+original loop fed differently sized ROIs into one shared MOG2 model, which
+re-initialises it on every call and makes its foreground step artificially
+cheap (and meaningless); the current path keeps a correctly sized model per
+shelf, which is real work.
+
+Usage (from the backend directory):
+    python benchmarks/bench_frame_planes.py [--repeats 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from cv_processor import CVProcessor, RoiFramePlanes  # noqa: E402
+
+
+class BenchShelf:
+    def __init__(self, shelf_id, region):
+        self.id = shelf_id
+        self.name = f"Shelf_{shelf_id}"
+        self.region = region
+        self.empty_threshold = 0.15
+
+
+def make_frame(width=1280, height=720, seed=0):
+    """Synthetic shelf scene: textured product blocks on a flat background"""
+    rng = np.random.default_rng(seed)
+    frame = np.full((height, width, 3), 90, np.uint8)
+    for _ in range(400):
+        x, y = int(rng.integers(0, width - 40)), int(rng.integers(0, height - 40))
+        w, h = int(rng.integers(10, 40)), int(rng.integers(10, 40))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(frame, (x, y), (x + w, y + h), color, -1)
+    noise = rng.normal(0, 6, frame.shape)
+    return np.clip(frame + noise, 0, 255).astype(np.uint8)
+
+
+def make_shelves(count, width=1280, height=720, seed=1):
+    """Grid of shelf regions, overlapping once the grid gets dense"""
+    rng = np.random.default_rng(seed)
+    shelves = []
+    for i in range(count):
+        w, h = int(rng.integers(120, 320)), int(rng.integers(60, 140))
+        x, y = int(rng.integers(0, width - w)), int(rng.integers(0, height - h))
+        shelves.append(BenchShelf(i + 1, [x, y, w, h]))
+    return shelves
+
+
+def legacy_analyze(bg_subtractor, frame, shelf_region):
+    """The original per-shelf implementation, kept here as the baseline"""
+    x, y, w, h = shelf_region
+    shelf_roi = frame[y:y+h, x:x+w]
+    gray_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2GRAY)
+    hsv_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2HSV)  # noqa: F841 - computed, as before
+    edges = cv2.Canny(gray_roi, 50, 150)
+    edge_density = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
+    color_variance = np.var(gray_roi)
+    hist = cv2.calcHist([gray_roi], [0], None, [256], [0, 256])
+    hist_variance = np.var(hist)
+    try:
+        fg_mask = bg_subtractor.apply(shelf_roi)
+        foreground_ratio = np.sum(fg_mask > 0) / (fg_mask.shape[0] * fg_mask.shape[1])
+    except Exception:
+        foreground_ratio = 0.0
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    contour_score = min(len(contours) / 20.0, 1.0)
+    return min(edge_density * 0.25 + min(color_variance / 1000, 1.0) * 0.25 +
+               min(hist_variance / 1000000, 1.0) * 0.2 + foreground_ratio * 0.15 +
+               contour_score * 0.15, 1.0)
+
+
+def time_call(fn, repeats):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--shelves", type=int, nargs="+", default=[1, 5, 10, 20, 40, 80])
+    args = parser.parse_args()
+
+    frame = make_frame()
+    print(f"Frame: {frame.shape[1]}x{frame.shape[0]}, repeats: {args.repeats}")
+    print(f"{'shelves':>8} {'path':>8} {'per-shelf ms':>14} {'planes ms':>11} {'speedup':>8} "
+          f"{'per-shelf no fg':>16} {'planes no fg':>13} {'speedup':>8}")
+
+    for count in args.shelves:
+        shelves = make_shelves(count)
+        legacy_bg = cv2.createBackgroundSubtractorMOG2(history=500, varThreshold=16, detectShadows=True)
+        processor = CVProcessor()
+        processor.change_gate = None  # measure the full analysis on every repeat
+        planes = processor.compute_frame_planes(frame, [s.region for s in shelves])
+        path = "per-ROI" if isinstance(planes, RoiFramePlanes) else "union"
+
+        legacy_ms = time_call(lambda: [legacy_analyze(legacy_bg, frame, s.region) for s in shelves], args.repeats)
+        planes_ms = time_call(lambda: processor.process_frame(frame, shelves), args.repeats)
+
+        processor.bg_registry = None
+        legacy_nofg_ms = time_call(lambda: [legacy_analyze(None, frame, s.region) for s in shelves], args.repeats)
+        planes_nofg_ms = time_call(lambda: processor.process_frame(frame, shelves), args.repeats)
+
+        print(f"{count:>8} {path:>8} {legacy_ms:>14.2f} {planes_ms:>11.2f} {legacy_ms / planes_ms:>7.1f}x "
+              f"{legacy_nofg_ms:>16.2f} {planes_nofg_ms:>13.2f} {legacy_nofg_ms / planes_nofg_ms:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
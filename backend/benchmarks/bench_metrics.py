@@ -0,0 +1,91 @@
+"""
+Benchmark: overhead of the timing instrumentation on the CV hot path.
+
+Times Histogram.observe, the ``timed`` context manager and a ``timed``
+decorated function against an empty baseline, and scores a synthetic frame
+with N shelves with and without the per-feature histogram behind
+CostAccounting. The per-call numbers are the cost added to every decode,
+plane and feature step.
+
+Usage (from the backend directory):
+    python benchmarks/bench_metrics.py [--shelves 20] [--calls 200000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from cv_features import CostAccounting  # noqa: E402
+from cv_processor import CVProcessor, ShelfSpec  # noqa: E402
+from metrics import Histogram, timed  # noqa: E402
+
+
+def per_call_ns(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def make_shelves(count, width=1280, height=720, seed=1):
+    rng = np.random.default_rng(seed)
+    shelves = []
+    for index in range(count):
+        w, h = int(rng.integers(80, 320)), int(rng.integers(40, 120))
+        region = [int(rng.integers(0, width - w)), int(rng.integers(0, height - h)), w, h]
+        shelves.append(ShelfSpec(id=index, camera_id=1, name=f"shelf-{index}", region=region))
+    return shelves
+
+
+def score_ms(processor, frame, shelves):
+    start = time.perf_counter()
+    processor.score_frame(frame, shelves)
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shelves", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    histogram = Histogram("bench_seconds", "Benchmark histogram", ["step"])
+
+    def empty():
+        pass
+
+    def block():
+        with timed(histogram, "block"):
+            pass
+
+    decorated = timed(histogram, "decorated")(empty)
+    baseline = per_call_ns(empty, args.calls)
+    print(f"{'observe':>12}{per_call_ns(lambda: histogram.observe(0.001, 'observe'), args.calls) - baseline:>10.0f} ns")
+    print(f"{'with timed':>12}{per_call_ns(block, args.calls) - baseline:>10.0f} ns")
+    print(f"{'@timed':>12}{per_call_ns(decorated, args.calls) - baseline:>10.0f} ns")
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (720, 1280, 3), dtype=np.uint8)
+    shelves = make_shelves(args.shelves)
+    processor = CVProcessor()
+    processor.change_gate = None  # measure the analysis on every frame
+    plain_costs = CostAccounting()
+    histogram_costs = CostAccounting(Histogram("bench_step_seconds", "Benchmark histogram", ["step"]))
+    processor.score_frame(frame, shelves)
+    # Interleaved, best of --repeat: background models keep changing from frame to frame
+    plain, instrumented = float("inf"), float("inf")
+    for _ in range(args.repeat):
+        processor.costs = plain_costs
+        plain = min(plain, score_ms(processor, frame, shelves))
+        processor.costs = histogram_costs
+        instrumented = min(instrumented, score_ms(processor, frame, shelves))
+    print(f"score_frame, {args.shelves} shelves: {plain:.2f} ms without histogram, {instrumented:.2f} ms with "
+          f"({(instrumented / plain - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark: blending per-shelf feature values into occupancy scores.
+
+Compares the per-shelf Python blend of the hand-tuned weights
+(FeatureRegistry.combine, as CVProcessor.score_region runs it) with a learned
+OccupancyModel scoring every shelf's feature row in one matrix product.
+Feature extraction is the same for both and not timed.
+
+Usage (from the backend directory):
+    python benchmarks/bench_occupancy_model.py [--shelves 10 100 1000 10000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from cv_features import OCCUPANCY_FEATURES  # noqa: E402
+from occupancy_model import fit_model  # noqa: E402
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--shelves", type=int, nargs="+", default=[10, 100, 1000, 10000])
+    parser.add_argument("--profile", default="balanced")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    features = OCCUPANCY_FEATURES.resolve(args.profile)
+    names = [feature.name for feature in features]
+    rng = np.random.default_rng(0)
+    X_train = rng.random((500, len(features)))
+    model = fit_model("logistic", names, X_train, X_train.mean(axis=1))
+
+    print(f"{'shelves':>8}{'python blend ms':>17}{'matmul ms':>11}{'speedup':>9}")
+    for count in args.shelves:
+        X = rng.random((count, len(features)))
+        rows = X.tolist()
+        blend_ms = timed(lambda: [OCCUPANCY_FEATURES.combine(list(zip(features, row))) for row in rows], args.repeat)
+        matmul_ms = timed(lambda: model.predict(X), args.repeat)
+        print(f"{count:>8}{blend_ms:>17.3f}{matmul_ms:>11.3f}{blend_ms / matmul_ms:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Benchmark: adaptive per-shelf sampling vs. sampling every shelf at a fixed rate.
+
+Simulates an hour of ingestion (in simulated time, no frames are decoded) for
+many cameras with several shelves each. Most shelves sit at a stable level with
+a little noise, some hover around empty_threshold, and a few are emptied at a
+random moment. Counts the shelf analyses each policy runs and how long the
+emptied shelves take to be seen below the threshold.
+
+The fixed policy analyses every shelf every --interval seconds, as ingestion
+did before the scheduler. The adaptive policy uses SamplingScheduler with the
+same minimum interval.
+
+Usage (from the backend directory):
+    python benchmarks/bench_sampling.py [--cameras 50] [--shelves 8]
+"""
+import argparse
+import heapq
+import statistics
+import sys
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from sampling_scheduler import SamplingScheduler  # noqa: E402
+
+EMPTY_THRESHOLD = 0.15
+
+
+def make_shelves(count, duration, rng):
+    """(base score, noise, time it is emptied or None) per shelf"""
+    shelves = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.1:
+            shelves.append((EMPTY_THRESHOLD + 0.02, 0.02, None))  # borderline
+        elif kind < 0.15:
+            shelves.append((0.8, 0.02, float(rng.uniform(0.2, 0.8) * duration)))  # emptied during the run
+        else:
+            shelves.append((float(rng.uniform(0.35, 0.95)), 0.01, None))  # stable
+    return shelves
+
+
+def score_at(shelf, now, rng):
+    base, noise, emptied_at = shelf
+    if emptied_at is not None and now >= emptied_at:
+        base = 0.03
+    return min(max(base + rng.normal(0, noise), 0.0), 1.0)
+
+
+def simulate(shelves, duration, next_interval, rng):
+    """Run a sampling policy; returns (analyses, detection delays of emptied shelves)"""
+    analyses = 0
+    delays = []
+    detected = set()
+    queue = [(0.0, index) for index in range(len(shelves))]
+    heapq.heapify(queue)
+    while queue:
+        now, index = heapq.heappop(queue)
+        if now > duration:
+            break
+        score = score_at(shelves[index], now, rng)
+        analyses += 1
+        emptied_at = shelves[index][2]
+        if emptied_at is not None and index not in detected and now >= emptied_at and score < EMPTY_THRESHOLD:
+            detected.add(index)
+            delays.append(now - emptied_at)
+        heapq.heappush(queue, (now + next_interval(index, score, now), index))
+    return analyses, delays
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cameras", type=int, default=50)
+    parser.add_argument("--shelves", type=int, default=8, help="shelves per camera")
+    parser.add_argument("--duration", type=float, default=3600.0, help="simulated seconds")
+    parser.add_argument("--interval", type=float, default=1.0, help="fixed / minimum sampling interval")
+    parser.add_argument("--max-interval", type=float, default=300.0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    shelves = make_shelves(args.cameras * args.shelves, args.duration, rng)
+    print(f"{len(shelves)} shelves on {args.cameras} cameras, {args.duration:.0f} s simulated")
+
+    fixed = simulate(shelves, args.duration, lambda index, score, now: args.interval, np.random.default_rng(1))
+
+    scheduler = SamplingScheduler(min_interval=args.interval, max_interval=args.max_interval)
+
+    def adaptive_interval(index, score, now):
+        return scheduler.observe(index // args.shelves, index, score, EMPTY_THRESHOLD, now=now) - now
+
+    adaptive = simulate(shelves, args.duration, adaptive_interval, np.random.default_rng(1))
+
+    print(f"{'policy':<10}{'analyses':>12}{'per second':>12}{'detected':>10}{'median delay s':>16}{'max delay s':>13}")
+    for name, (analyses, delays) in [("fixed", fixed), ("adaptive", adaptive)]:
+        median = statistics.median(delays) if delays else float("nan")
+        worst = max(delays) if delays else float("nan")
+        print(f"{name:<10}{analyses:>12}{analyses / args.duration:>12.1f}{len(delays):>10}{median:>16.1f}{worst:>13.1f}")
+    print(f"Shelf analyses reduced {fixed[0] / adaptive[0]:.1f}x; "
+          f"the same CPU covers about {fixed[0] / adaptive[0]:.0f}x the cameras")
+
+
+if __name__ == "__main__":
+    main()
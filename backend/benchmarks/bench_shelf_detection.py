@@ -0,0 +1,143 @@
+"""
+Benchmark: shelf line grouping and non-maximum suppression on busy frames.
+
+Generates synthetic sets of horizontal Hough segments: shelf edges every
+--spacing pixels, each edge broken into several segments (price strips,
+products hanging over the edge), plus random clutter segments. Compares:
+
+  grouping  the nested-while pairing of Asm.detect_shelf_rois (one line per
+            segment) against shelf_detection.merge_rows + pair_rows (sorted
+            sweep into edge rows, binary search for the partner edge)
+  nms       a per-pair Python IoU loop against shelf_detection's
+            vectorised non_max_suppression
+
+and times the full detect_shelves ensemble on a rendered frame.
+
+Usage (from the backend directory):
+    python benchmarks/bench_shelf_detection.py [--segments 100 300 1000] [--repeat 20]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+import shelf_detection  # noqa: E402
+
+
+def make_segments(count, width, height, spacing, rng):
+    """(N, 4) Hough-style segments [x1, y1, x2, y2], about 70% of them on shelf edges"""
+    edges = np.arange(spacing // 2, height - 10, spacing)
+    on_edge = int(count * 0.7)
+    y = rng.choice(edges, on_edge) + rng.integers(-2, 3, on_edge)
+    x1 = rng.integers(0, width - 150, on_edge)
+    x2 = np.minimum(x1 + rng.integers(100, 400, on_edge), width - 1)
+    clutter = count - on_edge
+    cy = rng.integers(0, height, clutter)
+    cx1 = rng.integers(0, width - 150, clutter)
+    cx2 = np.minimum(cx1 + rng.integers(100, 200, clutter), width - 1)
+    segments = np.stack([np.concatenate([x1, cx1]), np.concatenate([y, cy]),
+                         np.concatenate([x2, cx2]), np.concatenate([y, cy])], axis=1)
+    return segments[rng.permutation(count)]
+
+
+def nested_grouping(lines, min_height=80, max_height=150):
+    """Line pairing as in Asm.detect_shelf_rois"""
+    lines = sorted((tuple(line) for line in lines), key=lambda line: line[1])
+    rois = []
+    i = 0
+    while i < len(lines) - 1:
+        y1 = lines[i][1]
+        j = i + 1
+        while j < len(lines):
+            height = lines[j][1] - y1
+            if min_height <= height <= max_height:
+                x = int(min(lines[i][0], lines[j][0]))
+                w = int(max(lines[i][2], lines[j][2]) - x)
+                if w > 0 and height - 10 > 0:
+                    rois.append((x, y1 + 5, w, height - 10))
+                i = j - 1
+                break
+            j += 1
+        i += 1
+    return rois
+
+
+def sweep_grouping(lines):
+    segments = np.stack([lines[:, 0], lines[:, 2], (lines[:, 1] + lines[:, 3]) / 2], axis=1).astype(np.float64)
+    boxes, _ = shelf_detection.pair_rows(shelf_detection.merge_rows(segments))
+    return boxes
+
+
+def loop_nms(boxes, scores, iou_threshold=0.4):
+    order = sorted(range(len(scores)), key=lambda index: -scores[index])
+    kept = []
+    suppressed = set()
+    for position, best in enumerate(order):
+        if best in suppressed:
+            continue
+        kept.append(best)
+        bx, by, bw, bh = boxes[best]
+        for other in order[position + 1:]:
+            if other in suppressed:
+                continue
+            ox, oy, ow, oh = boxes[other]
+            iw = max(0.0, min(bx + bw, ox + ow) - max(bx, ox))
+            ih = max(0.0, min(by + bh, oy + oh) - max(by, oy))
+            intersection = iw * ih
+            if intersection / (bw * bh + ow * oh - intersection) > iou_threshold:
+                suppressed.add(other)
+    return kept
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, nargs="+", default=[100, 300, 1000, 3000])
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--spacing", type=int, default=110, help="pixels between shelf edges")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+
+    print(f"{'segments':>9}{'nested ms':>12}{'sweep ms':>11}{'boxes':>14}{'loop NMS ms':>14}{'vector NMS ms':>15}{'kept':>6}")
+    for count in args.segments:
+        lines = make_segments(count, args.width, args.height, args.spacing, rng)
+        nested_ms, nested = timed(lambda: nested_grouping(lines), args.repeat)
+        sweep_ms, swept = timed(lambda: sweep_grouping(lines), args.repeat)
+
+        # NMS input: one jittered candidate box per segment, as a dense detector would produce
+        boxes = np.stack([lines[:, 0], lines[:, 1], lines[:, 2] - lines[:, 0], np.full(count, 90)], axis=1)
+        boxes = (boxes + rng.normal(0, 4, boxes.shape)).clip(1)
+        scores = rng.random(count)
+        loop_ms, loop_kept = timed(lambda: loop_nms(boxes.tolist(), scores.tolist()), max(1, args.repeat // 4))
+        vector_ms, vector_kept = timed(lambda: shelf_detection.non_max_suppression(boxes, scores), args.repeat)
+        assert loop_kept == [best for best, _ in vector_kept]
+
+        print(f"{count:>9}{nested_ms:>12.2f}{sweep_ms:>11.2f}{len(nested):>7}/{len(swept):<6}"
+              f"{loop_ms:>14.2f}{vector_ms:>15.2f}{len(vector_kept):>6}")
+
+    frame = np.full((args.height, args.width, 3), 190, np.uint8)
+    for y in range(args.spacing // 2, args.height - args.spacing, args.spacing):
+        cv2.rectangle(frame, (60, y), (args.width - 60, y + args.spacing - 10), (50, 50, 50), 3)
+        for x in range(80, args.width - 120, 45):
+            cv2.rectangle(frame, (x, y + 15), (x + 30, y + args.spacing - 15), tuple(int(v) for v in rng.integers(0, 255, 3)), -1)
+    segments = shelf_detection.horizontal_segments(shelf_detection.edge_map(frame))
+    ensemble_ms, shelves = timed(lambda: shelf_detection.detect_shelves(frame, max_results=None), max(1, args.repeat // 4))
+    both = sum(1 for shelf in shelves if len(shelf['detectors']) == 2)
+    print(f"detect_shelves on a {args.width}x{args.height} frame with {len(segments)} horizontal segments: "
+          f"{ensemble_ms:.1f} ms, {len(shelves)} shelves ({both} found by both detectors)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import cv2
+import numpy as np
+import json
+import os
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# MOG2 keeps nmixtures x (weight, variance, per-channel mean) floats plus a
+# used-modes byte for every pixel; used to budget registry memory.
+MOG2_MIXTURES = 5
+
+def estimate_model_bytes(shape: Tuple[int, ...]) -> int:
+    """Approximate memory held by one MOG2 model for an ROI of ``shape``"""
+    height, width = shape[:2]
+    channels = shape[2] if len(shape) > 2 else 1
+    return height * width * (MOG2_MIXTURES * (2 + channels) * 4 + 1)
+
+class _ModelEntry:
+    def __init__(self, model: Any, shape: Tuple[int, ...]):
+        self.model = model
+        self.shape = shape
+        self.nbytes = estimate_model_bytes(shape)
+        self.frames = 0
+
+# (key, frames learned, background image) of one model in a snapshot
+BackgroundSnapshot = List[Tuple[Hashable, int, np.ndarray]]
+
+def merge_snapshots(snapshots: Iterable[BackgroundSnapshot]) -> BackgroundSnapshot:
+    """Combine snapshots of several registries (one per worker process), keeping the most trained model per key"""
+    merged: Dict[Hashable, Tuple[Hashable, int, np.ndarray]] = {}
+    for snapshot in snapshots:
+        for key, frames, background in snapshot:
+            if key not in merged or frames > merged[key][1]:
+                merged[key] = (key, frames, background)
+    return list(merged.values())
+
+class BackgroundModelRegistry:
+    """Background subtractors keyed by (camera_id, shelf_id), each sized to its own ROI.
+
+    Feeding ROIs of different sizes and scenes into one shared MOG2 model makes it
+    re-initialise on every call. The registry keeps one model per shelf, evicts the
+    least recently used ones once ``max_bytes`` is exceeded and can snapshot the
+    learned background images to disk so a restart starts from a warm model.
+    Loaded images seed their model when the shelf is first seen, so a worker
+    process only builds the models of the cameras it analyses.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, history: int = 500,
+                 var_threshold: float = 16, detect_shadows: bool = True):
+        self.max_bytes = max_bytes
+        self.history = history
+        self.var_threshold = var_threshold
+        self.detect_shadows = detect_shadows
+
+        self._models: 'OrderedDict[Hashable, _ModelEntry]' = OrderedDict()
+        # Loaded from a snapshot, not used yet: key -> (frames, background image)
+        self._seeds: Dict[Hashable, Tuple[int, np.ndarray]] = {}
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def _create_model(self) -> Any:
+        return cv2.createBackgroundSubtractorMOG2(
+            history=self.history, varThreshold=self.var_threshold, detectShadows=self.detect_shadows
+        )
+
+    def _evict(self):
+        # Always keep the most recently used model, even if it alone exceeds the cap
+        while self.total_bytes > self.max_bytes and len(self._models) > 1:
+            key, entry = self._models.popitem(last=False)
+            self.total_bytes -= entry.nbytes
+            self.evictions += 1
+            logger.debug(f"Evicted background model {key}")
+
+    def _entry(self, key: Hashable, shape: Tuple[int, ...]) -> _ModelEntry:
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None and entry.shape != shape:
+                # The shelf region was resized; the old model no longer applies
+                self.total_bytes -= entry.nbytes
+                del self._models[key]
+                entry = None
+
+            if entry is None:
+                entry = _ModelEntry(self._create_model(), shape)
+                seed = self._seeds.pop(key, None)
+                if seed is not None and seed[1].shape == shape:
+                    # A learning rate of 1 re-initialises the model to this image in a single step
+                    entry.model.apply(seed[1], learningRate=1.0)
+                    entry.frames = seed[0]
+                self._models[key] = entry
+                self.total_bytes += entry.nbytes
+                self._evict()
+            else:
+                self._models.move_to_end(key)
+            return entry
+
+    def apply(self, key: Hashable, roi: np.ndarray, learning_rate: float = -1) -> np.ndarray:
+        """Update the model for ``key`` with ``roi`` and return its foreground mask"""
+        entry = self._entry(key, roi.shape)
+        mask = entry.model.apply(roi, learningRate=learning_rate)
+        entry.frames += 1
+        return mask
+
+    def discard(self, key: Hashable):
+        """Drop the model for one shelf"""
+        with self._lock:
+            self._seeds.pop(key, None)
+            entry = self._models.pop(key, None)
+            if entry is not None:
+                self.total_bytes -= entry.nbytes
+
+    def clear(self):
+        """Drop all models, e.g. after the camera was moved"""
+        with self._lock:
+            self._models.clear()
+            self._seeds.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'models': len(self._models),
+                'seeds': len(self._seeds),
+                'total_bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._models
+
+    def snapshot(self) -> BackgroundSnapshot:
+        """Learned background image of every trained model, plus loaded images not used yet"""
+        with self._lock:
+            items = list(self._models.items())
+            seeds = [(key, frames, background) for key, (frames, background) in self._seeds.items()]
+
+        snapshot = []
+        for key, entry in items:
+            if entry.frames == 0:
+                continue
+            try:
+                background = entry.model.getBackgroundImage()
+            except cv2.error:
+                continue
+            if background is None:
+                continue
+            snapshot.append((key, entry.frames, background))
+        return snapshot + seeds
+
+    def save(self, path: str) -> int:
+        """Snapshot the learned background image of every model to an .npz file"""
+        return self.write_snapshot(path, self.snapshot())
+
+    @staticmethod
+    def write_snapshot(path: str, snapshot: BackgroundSnapshot) -> int:
+        arrays = {}
+        keys = []
+        for key, frames, background in snapshot:
+            arrays[f"m{len(keys)}"] = background
+            keys.append({'key': list(key) if isinstance(key, tuple) else key, 'frames': frames})
+        arrays['keys'] = np.array(json.dumps(keys))
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+        logger.info(f"Saved {len(keys)} background models to {path}")
+        return len(keys)
+
+    def load(self, path: str) -> int:
+        """Restore models from a snapshot; each is seeded with its saved background image when first used"""
+        if not os.path.exists(path):
+            return 0
+
+        try:
+            with np.load(path) as data:
+                keys = json.loads(str(data['keys']))
+                backgrounds = [data[f"m{i}"] for i in range(len(keys))]
+        except Exception as e:
+            logger.error(f"Failed to load background models from {path}: {str(e)}")
+            return 0
+
+        with self._lock:
+            for item, background in zip(keys, backgrounds):
+                key = item['key']
+                key = tuple(tuple(k) if isinstance(k, list) else k for k in key) if isinstance(key, list) else key
+                if key not in self._models:
+                    self._seeds[key] = (item.get('frames', 1), background)
+
+        logger.info(f"Loaded {len(keys)} background models from {path}")
+        return len(keys)
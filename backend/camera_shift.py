@@ -0,0 +1,119 @@
+import cv2
+import numpy as np
+import threading
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+class ShiftEstimate(NamedTuple):
+    offset: Tuple[int, int]  # (dx, dy) of the scene relative to the reference, in full-resolution pixels
+    moved: bool = False  # True once per excursion past the tracker's moved_threshold
+
+class _CameraReference:
+    def __init__(self, image: np.ndarray, full_size: Tuple[int, int]):
+        self.image = image
+        self.full_size = full_size
+        self.frames = 0
+        self.offset = (0, 0)
+        self.candidate: Optional[Tuple[float, float]] = None
+        self.moved = False
+
+class CameraShiftTracker:
+    """Estimate how far each camera's view has been translated since its reference frame.
+
+    The first frame of a camera becomes its reference. Every ``every`` frames
+    the frame is reduced to a ``width``-pixel gray thumbnail and compared with
+    the reference by ``cv2.phaseCorrelate``. An estimate replaces the current
+    offset only if its correlation response is at least ``min_response`` and
+    two estimates in a row agree within ``tolerance`` full-resolution pixels,
+    so a passing shopper does not move the shelves. Offsets larger than
+    ``moved_threshold`` pixels report ``moved`` once, until the view returns
+    or ``reset`` takes a new reference.
+    """
+
+    def __init__(self, every: int = 10, width: int = 320, min_response: float = 0.1, tolerance: float = 4.0,
+                 moved_threshold: float = 40.0):
+        self.every = every
+        self.width = width
+        self.min_response = min_response
+        self.tolerance = tolerance
+        self.moved_threshold = moved_threshold
+
+        self._references: Dict[Hashable, _CameraReference] = {}
+        self._windows: Dict[Tuple[int, int], np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.estimates = 0
+        self.moves = 0
+
+    def thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        height = max(1, int(round(frame.shape[0] * self.width / frame.shape[1])))
+        small = frame
+        if frame.shape[1] > self.width * 2:
+            # Point-sample down to 2x the thumbnail first; a full INTER_AREA pass costs milliseconds
+            small = cv2.resize(frame, (self.width * 2, height * 2), interpolation=cv2.INTER_NEAREST)
+        small = cv2.resize(small, (self.width, height), interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small.astype(np.float32)
+
+    def update(self, key: Hashable, frame: np.ndarray, frame_scale: float = 1.0) -> ShiftEstimate:
+        """Feed a frame of a camera and return its current offset"""
+        full_size = (int(round(frame.shape[1] / frame_scale)), int(round(frame.shape[0] / frame_scale)))
+        with self._lock:
+            reference = self._references.get(key)
+            if reference is None or reference.full_size != full_size:
+                self._references[key] = _CameraReference(self.thumbnail(frame), full_size)
+                return ShiftEstimate((0, 0))
+            reference.frames += 1
+            if self.every <= 0 or reference.frames % self.every:
+                return ShiftEstimate(reference.offset)
+
+        image = self.thumbnail(frame)
+        window = self._windows.get(image.shape)
+        if window is None:
+            window = self._windows[image.shape] = cv2.createHanningWindow((image.shape[1], image.shape[0]), cv2.CV_32F)
+        (shift_x, shift_y), response = cv2.phaseCorrelate(reference.image, image, window)
+        factor = full_size[0] / float(image.shape[1])
+        estimate = (shift_x * factor, shift_y * factor)
+
+        with self._lock:
+            self.estimates += 1
+            if response < self.min_response:
+                return ShiftEstimate(reference.offset)
+            candidate, reference.candidate = reference.candidate, estimate
+            if candidate is None or max(abs(candidate[0] - estimate[0]), abs(candidate[1] - estimate[1])) > self.tolerance:
+                return ShiftEstimate(reference.offset)
+            reference.offset = (int(round(estimate[0])), int(round(estimate[1])))
+
+            moved = max(abs(reference.offset[0]), abs(reference.offset[1])) > self.moved_threshold
+            report = moved and not reference.moved
+            reference.moved = moved
+            if report:
+                self.moves += 1
+            return ShiftEstimate(reference.offset, report)
+
+    def offset(self, key: Hashable) -> Tuple[int, int]:
+        reference = self._references.get(key)
+        return reference.offset if reference is not None else (0, 0)
+
+    def reset(self, key: Optional[Hashable] = None):
+        """Take the next frame as the new reference, for one camera or all of them"""
+        with self._lock:
+            if key is None:
+                self._references.clear()
+            else:
+                self._references.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            offsets = {str(key): reference.offset for key, reference in self._references.items()
+                       if reference.offset != (0, 0)}
+        return {'cameras': len(self._references), 'estimates': self.estimates, 'moves': self.moves,
+                'offsets': offsets}
+
+def translate_region(region: List[int], offset: Tuple[int, int], frame_size: Tuple[int, int]) -> List[int]:
+    """Shift an [x, y, w, h] region by ``offset`` and clip it to a (width, height) frame"""
+    x, y, w, h = region
+    x0, y0 = max(x + offset[0], 0), max(y + offset[1], 0)
+    x1, y1 = min(x + offset[0] + w, frame_size[0]), min(y + offset[1] + h, frame_size[1])
+    if x1 <= x0 or y1 <= y0:
+        return list(region)
+    return [x0, y0, x1 - x0, y1 - y0]
@@ -0,0 +1,74 @@
+import cv2
+import numpy as np
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+class _GateEntry:
+    def __init__(self, region: List[int], fingerprint: np.ndarray, score: float, timestamp: float):
+        self.region = list(region)
+        self.fingerprint = fingerprint
+        self.score = score
+        self.timestamp = timestamp
+
+class ShelfChangeGate:
+    """Skip re-analysing shelves whose ROI has not visibly changed since the last analysis.
+
+    Each shelf's gray ROI is reduced to a small INTER_AREA thumbnail. If the mean
+    absolute difference to the thumbnail of the last *analysed* frame is within
+    ``tolerance`` gray levels, the previous score is reused. Comparing against the
+    last analysed frame (not the last seen one) means slow drift still triggers a
+    re-analysis once it accumulates, and ``max_age`` forces one periodically.
+    """
+
+    def __init__(self, tolerance: float = 2.0, thumbnail_size: int = 16, max_age: float = 30.0):
+        self.tolerance = tolerance
+        self.thumbnail_size = thumbnail_size
+        self.max_age = max_age
+
+        self._entries: Dict[Hashable, _GateEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, gray_roi: np.ndarray) -> np.ndarray:
+        """Downsampled thumbnail of a gray ROI"""
+        size = (self.thumbnail_size, self.thumbnail_size)
+        return cv2.resize(gray_roi, size, interpolation=cv2.INTER_AREA)
+
+    def lookup(self, key: Hashable, region: List[int], fingerprint: np.ndarray,
+               now: Optional[float] = None) -> Optional[float]:
+        """Return the cached score if the shelf is unchanged, otherwise None"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            entry = self._entries.get(key)
+        if (entry is None or entry.region != list(region) or now - entry.timestamp > self.max_age
+                or entry.fingerprint.shape != fingerprint.shape):
+            self.misses += 1
+            return None
+
+        difference = cv2.norm(fingerprint, entry.fingerprint, cv2.NORM_L1) / fingerprint.size
+        if difference > self.tolerance:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry.score
+
+    def store(self, key: Hashable, region: List[int], fingerprint: np.ndarray, score: float,
+              now: Optional[float] = None):
+        """Remember the fingerprint and score of a freshly analysed shelf"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries[key] = _GateEntry(region, fingerprint, score, now)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Forget one shelf, or every shelf when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'shelves': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,352 @@
+import asyncio
+import os
+import threading
+import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from bg_registry import BackgroundModelRegistry, merge_snapshots
+from cv_processor import CVProcessor
+from frame_ring import FrameRef, FrameRing, StaleFrameError
+from metrics import CV_STEP_SECONDS, REGISTRY, timed
+
+logger = logging.getLogger(__name__)
+
+EXECUTOR_KINDS = ("thread", "process")
+
+class QueueFullError(Exception):
+    """Raised when the CV work queue is at capacity"""
+    pass
+
+class ImageDecodeError(ValueError):
+    """Raised when uploaded bytes are not an image OpenCV or PIL can read"""
+    pass
+
+_REDUCED_DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+}
+
+def decode_image(image_data: Union[bytes, bytearray, memoryview], reduction: int = 1) -> np.ndarray:
+    """Decode encoded image bytes to a 3-channel BGR frame, optionally at 1/2 or 1/4 size.
+
+    cv2.imdecode reads straight from a view of the upload buffer, and JPEGs are
+    DCT-scaled while decoding when ``reduction`` > 1, so a reduced frame never
+    exists at full size. Grayscale, RGBA and 16-bit inputs are converted to
+    8-bit BGR. Formats OpenCV cannot read fall back to PIL; bytes neither can
+    read raise ImageDecodeError.
+    """
+    flag = _REDUCED_DECODE_FLAGS.get(reduction)
+    if flag is None:
+        raise ValueError(f"Unsupported decode reduction: {reduction}")
+    if len(image_data) == 0:
+        raise ImageDecodeError("Empty image")
+    frame = cv2.imdecode(np.frombuffer(image_data, dtype=np.uint8), flag)
+    if frame is not None:
+        return frame
+
+    try:
+        image = Image.open(BytesIO(image_data)).convert("RGB")
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        # UnidentifiedImageError and truncated files are OSErrors
+        raise ImageDecodeError("Not a readable image") from e
+    if reduction != 1:
+        image = image.reduce(reduction)
+    return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+
+# Processor and attached frame rings (least recently used first) owned by each worker process (process pools only)
+_worker_processor: Optional[CVProcessor] = None
+_worker_rings: 'OrderedDict[str, FrameRing]' = OrderedDict()
+_worker_max_rings = 16
+# Ring each camera last published into, so the attachment to a replaced ring can be closed
+_worker_camera_rings: Dict[Hashable, str] = {}
+
+def _init_process_worker(settings: Dict[str, Any], bg_snapshot: Optional[str] = None, max_rings: int = 16):
+    global _worker_processor, _worker_max_rings
+    _worker_max_rings = max_rings
+    _worker_processor = CVProcessor.from_settings(settings)
+    if bg_snapshot and _worker_processor.bg_registry is not None:
+        _worker_processor.bg_registry.load(bg_snapshot)
+
+def _resolve_frame_ref(ref: FrameRef) -> Tuple[FrameRing, np.ndarray]:
+    ring = _worker_rings.get(ref.ring_name)
+    if ring is None:
+        # Cameras stay pinned for the worker's lifetime, so bound the attachments it keeps
+        while _worker_rings and len(_worker_rings) >= _worker_max_rings:
+            _close_worker_ring(next(iter(_worker_rings)))
+        ring = _worker_rings[ref.ring_name] = FrameRing.attach(ref.ring_name)
+    else:
+        _worker_rings.move_to_end(ref.ring_name)
+    return ring, ring.get(ref.seq)
+
+def _close_worker_ring(name: str):
+    ring = _worker_rings.pop(name, None)
+    if ring is None:
+        return
+    try:
+        ring.close()
+    except BufferError:
+        # A frame view is still referenced somewhere; the mapping is released with it
+        logger.debug(f"Frame ring {name} still has views, leaving it to be released later")
+
+def _track_camera_ring(camera_id: Hashable, ring_name: str):
+    """Close the worker's attachment to a camera's previous ring once the camera publishes into a new one"""
+    previous = _worker_camera_rings.get(camera_id)
+    if previous is not None and previous != ring_name:
+        _close_worker_ring(previous)
+    _worker_camera_rings[camera_id] = ring_name
+
+def _close_worker_rings():
+    for name in list(_worker_rings):
+        _close_worker_ring(name)
+    _worker_camera_rings.clear()
+
+def run_processor_method(processor: Optional[CVProcessor], method: str,
+                         image_data: Union[bytes, np.ndarray, FrameRef], reduction: int, *args) -> Any:
+    """Decode an upload (or take an already decoded frame) and call a CVProcessor method on it.
+
+    ``processor`` is None inside worker processes, where the per-process
+    processor created by the pool initializer is used instead. A FrameRef is
+    read as a zero-copy view of the shared frame ring it points into. Uploads
+    decoded with ``reduction`` > 1 pass ``frame_scale`` to the method.
+    """
+    processor = processor if processor is not None else _worker_processor
+    if isinstance(image_data, FrameRef):
+        ring, frame = _resolve_frame_ref(image_data)
+        result = getattr(processor, method)(frame, *args)
+        if not ring.is_current(image_data.seq):
+            raise StaleFrameError(f"Frame {image_data.seq} was overwritten during analysis")
+        return result
+    if isinstance(image_data, np.ndarray):
+        return getattr(processor, method)(image_data, *args)
+    with timed(CV_STEP_SECONDS, "decode"):
+        frame = decode_image(image_data, reduction)
+    if reduction != 1:
+        return getattr(processor, method)(frame, *args, frame_scale=1.0 / reduction)
+    return getattr(processor, method)(frame, *args)
+
+def _run_in_worker_process(camera_id: Hashable, method: str, image_data: Union[bytes, FrameRef], reduction: int,
+                           *args) -> Tuple[Any, Dict]:
+    """run_processor_method in a worker process, returning the worker's timing histograms with the result"""
+    if isinstance(image_data, FrameRef):
+        _track_camera_ring(camera_id, image_data.ring_name)
+    result = run_processor_method(None, method, image_data, reduction, *args)
+    return result, REGISTRY.take_histograms()
+
+def _apply_in_worker_process(fn: Callable, args: tuple) -> Any:
+    return fn(_worker_processor, *args)
+
+class CVWorkerPool:
+    """Bounded executor that keeps CV work off the asyncio event loop.
+
+    ``thread`` pools share the API's CVProcessor; OpenCV releases the GIL, so
+    frames from different cameras run on separate cores. Frames from the same
+    camera are serialised, since background models are not thread-safe.
+
+    ``process`` pools give each worker its own CVProcessor built from the API
+    processor's settings, with background models seeded from ``bg_snapshot``
+    (see ``save_background_models``). Every camera is pinned to one worker, so its
+    background models, change-gate entries, camera-shift reference and scene
+    fingerprint all live in that worker and its frames are serialised there.
+    Settings changes are pushed to the running workers (``reconfigure``)
+    instead of restarting them. Only scoring happens in the workers; alert
+    decisions stay in the API process. Timing
+    histograms observed in a worker travel back with each result and are
+    merged into the API process's metrics registry.
+
+    Decoded frames bound for process workers are written to a per-camera
+    shared-memory FrameRing instead of being pickled; workers only receive a
+    FrameRef. A worker closes its attachment to a camera's ring when that
+    camera moves to a new ring (on a frame shape change), and all of them on
+    ``shutdown``. Each worker keeps at most ``max_worker_rings`` attachments,
+    closing the least recently used one (it is re-attached if that camera
+    sends again).
+
+    At most ``max_queue`` calls may be waiting or running; beyond that
+    ``run`` raises QueueFullError so the API can shed load instead of piling up.
+    """
+
+    def __init__(self, processor: CVProcessor, kind: str = "thread", max_workers: Optional[int] = None,
+                 max_queue: int = 32, ring_slots: int = 8, bg_snapshot: Optional[str] = None,
+                 max_worker_rings: int = 16):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.processor = processor
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.ring_slots = ring_slots
+
+        self._lock = threading.Lock()
+        self._rings: Dict[Hashable, FrameRing] = {}
+        self._camera_locks: Dict[Hashable, threading.Lock] = {}
+        # Process pools: worker index of each camera, and calls waiting or running per worker
+        self._camera_workers: Dict[Hashable, int] = {}
+        self._worker_in_flight = [0] * self.max_workers
+        self.in_flight = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+        if kind == "process":
+            # One single-process executor per worker, so a camera's calls can be sent to the same process
+            settings = self.processor.export_settings()
+            self.executors = [
+                ProcessPoolExecutor(max_workers=1, initializer=_init_process_worker,
+                                    initargs=(settings, bg_snapshot, max_worker_rings))
+                for _ in range(self.max_workers)
+            ]
+        else:
+            self.executors = [ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="cv-worker")]
+
+    def _worker_index(self, camera_id: Hashable) -> int:
+        """Worker a camera is pinned to; new cameras go to the worker with the fewest cameras"""
+        with self._lock:
+            index = self._camera_workers.get(camera_id)
+            if index is None:
+                counts = [0] * self.max_workers
+                for assigned in self._camera_workers.values():
+                    counts[assigned] += 1
+                index = self._camera_workers[camera_id] = counts.index(min(counts))
+            return index
+
+    async def apply_to_workers(self, fn: Callable, *args) -> List[Any]:
+        """Call ``fn(processor, *args)`` on every worker process's CVProcessor, after the calls already queued there
+
+        Returns the results, one per worker. ``fn`` must be picklable, e.g. a
+        CVProcessor method taken from the class. Thread pools share the API's
+        processor, so for them this does nothing and returns [].
+        """
+        if self.kind != "process":
+            return []
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*[
+            loop.run_in_executor(executor, _apply_in_worker_process, fn, args) for executor in self.executors
+        ])
+
+    async def save_background_models(self, path: str) -> int:
+        """Write the background models to one snapshot file: the API processor's, or every worker's merged"""
+        if self.kind != "process":
+            return await asyncio.get_running_loop().run_in_executor(None, self.processor.bg_registry.save, path)
+        snapshots = await self.apply_to_workers(CVProcessor.background_snapshot)
+        return BackgroundModelRegistry.write_snapshot(path, merge_snapshots(snapshots))
+
+    async def reconfigure(self):
+        """Push the API processor's current settings to the process workers, keeping their models and caches"""
+        await self.apply_to_workers(CVProcessor.apply_settings, self.processor.export_settings())
+
+    def _camera_lock(self, camera_id: Hashable) -> threading.Lock:
+        with self._lock:
+            lock = self._camera_locks.get(camera_id)
+            if lock is None:
+                lock = self._camera_locks[camera_id] = threading.Lock()
+            return lock
+
+    def _run_serialized(self, camera_id: Hashable, fn: Callable, args: tuple) -> Any:
+        with self._camera_lock(camera_id):
+            with self._lock:
+                self.running += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    async def run(self, camera_id: Hashable, fn: Callable, *args) -> Any:
+        """Run ``fn(*args)`` on the pool; raises QueueFullError when the queue is at capacity"""
+        with self._lock:
+            if self.in_flight >= self.max_queue:
+                self.rejected += 1
+                raise QueueFullError(f"CV queue is full ({self.max_queue} requests)")
+            self.in_flight += 1
+
+        loop = asyncio.get_running_loop()
+        worker = None
+        try:
+            if self.kind == "thread":
+                result = await loop.run_in_executor(self.executors[0], self._run_serialized, camera_id, fn, args)
+            else:
+                worker = self._worker_index(camera_id)
+                with self._lock:
+                    self._worker_in_flight[worker] += 1
+                result = await loop.run_in_executor(self.executors[worker], fn, *args)
+            with self._lock:
+                self.completed += 1
+            return result
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                if worker is not None:
+                    self._worker_in_flight[worker] -= 1
+
+    def _publish_frame(self, camera_id: Hashable, frame: np.ndarray) -> FrameRef:
+        with self._lock:
+            ring = self._rings.get(camera_id)
+            shape = frame.shape if frame.ndim == 3 else frame.shape + (1,)
+            if ring is None or ring.shape != shape:
+                if ring is not None:
+                    ring.close()
+                ring = self._rings[camera_id] = FrameRing.create(shape, slots=self.ring_slots)
+            return FrameRef(ring.name, ring.write(frame))
+
+    async def run_processor(self, camera_id: Hashable, method: str, image_data: Union[bytes, np.ndarray],
+                            *args, reduction: int = 1) -> Any:
+        """Decode ``image_data`` (bytes or a BGR frame) and call ``CVProcessor.<method>`` on it in a worker
+
+        ``reduction`` decodes uploads at 1/2 or 1/4 size; only methods taking a
+        ``frame_scale`` argument can be used with it.
+        """
+        if self.kind == "thread":
+            return await self.run(camera_id, run_processor_method, self.processor, method, image_data,
+                                  reduction, *args)
+        if isinstance(image_data, np.ndarray):
+            image_data = self._publish_frame(camera_id, image_data)
+        result, timings = await self.run(camera_id, _run_in_worker_process, camera_id, method, image_data,
+                                         reduction, *args)
+        REGISTRY.merge_histograms(timings)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.kind == "thread":
+                running = self.running
+            else:
+                running = sum(1 for calls in self._worker_in_flight if calls)
+            return {
+                'kind': self.kind,
+                'workers': self.max_workers,
+                'max_queue': self.max_queue,
+                'in_flight': self.in_flight,
+                'running': running,
+                'queue_depth': self.in_flight - running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'camera_workers': {str(camera_id): worker for camera_id, worker in self._camera_workers.items()},
+            }
+
+    def shutdown(self):
+        for executor in self.executors:
+            if self.kind == "process":
+                # Runs after the calls already queued there; workers close their ring attachments
+                try:
+                    executor.submit(_close_worker_rings)
+                except RuntimeError:
+                    pass  # already shut down or broken
+            executor.shutdown(wait=False)
+        with self._lock:
+            for ring in self._rings.values():
+                ring.close()
+            self._rings.clear()
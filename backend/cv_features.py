@@ -0,0 +1,216 @@
+import threading
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+import cv2
+import numpy as np
+
+# Planes a feature can read; "foreground" is the shelf's background-subtraction mask
+PLANES = ("color", "gray", "edges", "hsv", "foreground")
+
+class Feature(NamedTuple):
+    """One occupancy metric: reads a crop of ``plane`` and returns a score in [0, 1].
+
+    ``fn(roi, scale)`` gets the crop and the analysis scale it was taken at, so
+    scale-dependent metrics can bring themselves back to full-resolution range.
+    ``cost`` is a relative per-shelf cost; cascades evaluate cheap features first.
+    ``batch_fn(stack, scales)``, when set, computes the same metric for N
+    crops with per-crop scales in one call: edges features get an (N, H, W)
+    stack of equally sized crops, gray features the (N, 256) gray histograms
+    of the crops.
+    """
+    name: str
+    plane: str
+    weight: float
+    fn: Callable[[np.ndarray, float], float]
+    cost: float = 1.0
+    batch_fn: Optional[Callable[[np.ndarray, np.ndarray], np.ndarray]] = None
+
+class FeatureRegistry:
+    """Named occupancy features and named profiles (subsets) of them.
+
+    A profile's score is the weighted mean of its features, so profiles with
+    fewer features stay on the same 0-1 scale as the full set.
+    """
+
+    def __init__(self):
+        self.features: Dict[str, Feature] = {}
+        self.profiles: Dict[str, Tuple[Feature, ...]] = {}
+
+    def register(self, name: str, plane: str, weight: float, fn: Optional[Callable] = None, cost: float = 1.0):
+        """Register a feature; usable directly or as a decorator"""
+        if plane not in PLANES:
+            raise ValueError(f"Unknown plane for feature {name}: {plane}")
+
+        def add(fn: Callable) -> Callable:
+            self.features[name] = Feature(name, plane, weight, fn, cost)
+            return fn
+        return add(fn) if fn is not None else add
+
+    def register_batch(self, name: str, fn: Optional[Callable] = None):
+        """Register the batched form of a registered gray or edges feature; usable directly or as a decorator"""
+        feature = self.features.get(name)
+        if feature is None:
+            raise ValueError(f"Unknown feature: {name}")
+        if feature.plane not in ("gray", "edges"):
+            raise ValueError(f"Only gray and edges features can be batched, {name} reads {feature.plane}")
+
+        def add(fn: Callable) -> Callable:
+            self.features[name] = self.features[name]._replace(batch_fn=fn)
+            return fn
+        return add(fn) if fn is not None else add
+
+    def add_profile(self, name: str, feature_names: Iterable[str]):
+        feature_names = list(feature_names)
+        unknown = [feature for feature in feature_names if feature not in self.features]
+        if unknown:
+            raise ValueError(f"Unknown features in profile {name}: {unknown}")
+        self.profiles[name] = tuple(self.features[feature] for feature in feature_names)
+
+    def resolve(self, profile: str) -> Tuple[Feature, ...]:
+        features = self.profiles.get(profile)
+        if features is None:
+            raise ValueError(f"Unknown metric profile: {profile}")
+        return features
+
+    def planes(self, profile: str) -> Set[str]:
+        """Planes the features of a profile read"""
+        return {feature.plane for feature in self.resolve(profile)}
+
+    def cascade(self, profile: str) -> Tuple[Feature, ...]:
+        """Features of a profile, cheapest first"""
+        return tuple(sorted(self.resolve(profile), key=lambda feature: feature.cost))
+
+    @staticmethod
+    def combine(values: List[Tuple[Feature, float]]) -> float:
+        total_weight = sum(feature.weight for feature, _ in values)
+        if total_weight <= 0:
+            return 0.0
+        return min(sum(feature.weight * value for feature, value in values) / total_weight, 1.0)
+
+    @staticmethod
+    def bounds(values: List[Tuple[Feature, float]], pending: Iterable[Feature]) -> Tuple[float, float]:
+        """Range the combined score can still end up in, given some features are not yet evaluated.
+
+        Every feature value lies in [0, 1], so pending features add between
+        nothing and their full weight.
+        """
+        done_weight = sum(feature.weight for feature, _ in values)
+        pending_weight = sum(feature.weight for feature in pending)
+        total_weight = done_weight + pending_weight
+        if total_weight <= 0:
+            return 0.0, 0.0
+        partial = sum(feature.weight * value for feature, value in values)
+        return min(partial / total_weight, 1.0), min((partial + pending_weight) / total_weight, 1.0)
+
+class CostAccounting:
+    """Cumulative time spent per feature and per plane, optionally also observed into a latency histogram"""
+
+    def __init__(self, histogram: Optional[Any] = None):
+        self._lock = threading.Lock()
+        self._costs: Dict[str, List[float]] = {}
+        self.histogram = histogram
+
+    def record(self, name: str, seconds: float):
+        if self.histogram is not None:
+            self.histogram.observe(seconds, name)
+        with self._lock:
+            entry = self._costs.get(name)
+            if entry is None:
+                self._costs[name] = [seconds, 1]
+            else:
+                entry[0] += seconds
+                entry[1] += 1
+
+    def reset(self):
+        with self._lock:
+            self._costs.clear()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                name: {
+                    'calls': int(calls),
+                    'total_ms': round(seconds * 1000, 3),
+                    'mean_ms': round(seconds * 1000 / calls, 4),
+                }
+                for name, (seconds, calls) in self._costs.items()
+            }
+
+# Gains that bring scale-dependent metrics back to their full-resolution range, as (analysis scale, gain)
+# points. Fitted by benchmarks/bench_analysis_scale.py --calibrate: the median ratio of each raw metric at
+# full resolution to the same metric on INTER_AREA-downscaled stocked-shelf ROIs, left out where either
+# side is zero or the full-resolution value saturates its normaliser.
+SCALE_GAINS: Dict[str, Tuple[Tuple[float, float], ...]] = {
+    "edge_density": ((1.0, 1.0), (0.5, 0.539), (0.25, 0.304), (0.125, 0.196)),
+    "color_variance": ((1.0, 1.0), (0.5, 1.07), (0.25, 1.15), (0.125, 1.28)),
+    "histogram": ((1.0, 1.0), (0.5, 8.49), (0.25, 78.5), (0.125, 1120.0)),
+    "contours": ((1.0, 1.0), (0.5, 2.67), (0.25, 3.5), (0.125, 6.0)),
+}
+
+def scale_gain(name: str, scale):
+    """Gain for a metric measured at ``scale`` (a float or an array of them), 1 for scale-independent metrics
+
+    Interpolates linearly in log-log space between the fitted points of
+    ``SCALE_GAINS`` and extrapolates the nearest segment beyond them.
+    """
+    points = SCALE_GAINS.get(name)
+    if points is None:
+        return np.ones_like(scale, dtype=np.float64) if isinstance(scale, np.ndarray) else 1.0
+    log_scales = np.log([point[0] for point in points])[::-1]
+    log_gains = np.log([point[1] for point in points])[::-1]
+    x = np.log(scale)
+    y = np.interp(x, log_scales, log_gains)
+    low = log_gains[0] + (x - log_scales[0]) * (log_gains[1] - log_gains[0]) / (log_scales[1] - log_scales[0])
+    high = log_gains[-1] + (x - log_scales[-1]) * (log_gains[-1] - log_gains[-2]) / (log_scales[-1] - log_scales[-2])
+    gain = np.exp(np.where(x < log_scales[0], low, np.where(x > log_scales[-1], high, y)))
+    return gain if isinstance(scale, np.ndarray) else float(gain)
+
+# Features of the backend's occupancy score (CVProcessor)
+OCCUPANCY_FEATURES = FeatureRegistry()
+
+# Costs: integral-friendly reductions < histogram < contour tracing < background model update
+@OCCUPANCY_FEATURES.register("edge_density", "edges", 0.25, cost=1.0)
+def edge_density(edges: np.ndarray, scale: float) -> float:
+    return min(cv2.countNonZero(edges) / float(edges.size) * scale_gain("edge_density", scale), 1.0)
+
+@OCCUPANCY_FEATURES.register("color_variance", "gray", 0.25, cost=1.0)
+def color_variance(gray: np.ndarray, scale: float) -> float:
+    _, stddev = cv2.meanStdDev(gray)
+    return min(float(stddev[0, 0]) ** 2 * scale_gain("color_variance", scale) / 1000, 1.0)
+
+@OCCUPANCY_FEATURES.register("histogram", "gray", 0.2, cost=2.0)
+def histogram_variance(gray: np.ndarray, scale: float) -> float:
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256])
+    return min(float(np.var(hist)) * scale_gain("histogram", scale) / 1000000, 1.0)
+
+# Batched forms, used by the "batched" feature backend: edges over (N, H, W) stacks, gray over (N, 256) histograms
+@OCCUPANCY_FEATURES.register_batch("edge_density")
+def edge_density_batch(edges: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    counts = np.count_nonzero(edges.reshape(len(edges), -1), axis=1)
+    return np.minimum(counts / float(edges[0].size) * scale_gain("edge_density", scales), 1.0)
+
+@OCCUPANCY_FEATURES.register_batch("color_variance")
+def color_variance_batch(histograms: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    # E[x^2] - E[x]^2 over the gray levels, weighted by their counts
+    levels = np.arange(256, dtype=np.float64)
+    counts = histograms.sum(axis=1, dtype=np.float64)
+    mean = histograms @ levels / counts
+    variance = histograms @ (levels * levels) / counts - mean * mean
+    return np.minimum(np.maximum(variance, 0.0) * scale_gain("color_variance", scales) / 1000, 1.0)
+
+@OCCUPANCY_FEATURES.register_batch("histogram")
+def histogram_variance_batch(histograms: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return np.minimum(histograms.var(axis=1, dtype=np.float64) * scale_gain("histogram", scales) / 1000000, 1.0)
+
+@OCCUPANCY_FEATURES.register("foreground", "foreground", 0.15, cost=8.0)
+def foreground_ratio(fg_mask: np.ndarray, scale: float) -> float:
+    return cv2.countNonZero(fg_mask) / float(fg_mask.size)
+
+@OCCUPANCY_FEATURES.register("contours", "edges", 0.15, cost=4.0)
+def contour_count(edges: np.ndarray, scale: float) -> float:
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    return min(len(contours) * scale_gain("contours", scale) / 20.0, 1.0)
+
+OCCUPANCY_FEATURES.add_profile("full", ["edge_density", "color_variance", "histogram", "foreground", "contours"])
+OCCUPANCY_FEATURES.add_profile("balanced", ["edge_density", "color_variance", "histogram", "contours"])
+OCCUPANCY_FEATURES.add_profile("fast", ["edge_density", "color_variance"])
@@ -1,104 +1,702 @@
 import cv2
 import numpy as np
-from typing import List, Dict, Any
+from typing import List, Dict, Any, NamedTuple, Optional, Tuple
 import logging
+import threading
+import time
+from collections import Counter
 from datetime import datetime
 
+from bg_registry import BackgroundModelRegistry
+from camera_shift import CameraShiftTracker, translate_region
+from cv_features import CostAccounting, Feature, FeatureRegistry, OCCUPANCY_FEATURES, scale_gain
+from change_gate import ShelfChangeGate
+from dnn_scorer import DnnOccupancyScorer
+from metrics import CV_STEP_SECONDS
+from occupancy_model import OccupancyModel, OccupancyModelRegistry
+from reference_store import ReferenceSnapshotStore
+from scene_cache import SceneFingerprintCache
+import shelf_detection
+from shelf_state import ShelfStateTracker, level_cut_points
+
 logger = logging.getLogger(__name__)
 
+def region_in_frame(frame_shape: Tuple[int, ...], region: List[int]) -> bool:
+    """Check that an [x, y, w, h] region is non-empty and lies inside the frame"""
+    x, y, w, h = region
+    return w > 0 and h > 0 and x >= 0 and y >= 0 and x + w <= frame_shape[1] and y + h <= frame_shape[0]
+
+def union_bounds(frame_shape: Tuple[int, ...], regions: List[List[int]]) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box (x, y, w, h) of all valid regions, or None if there are none"""
+    valid = [r for r in regions if r is not None and region_in_frame(frame_shape, r)]
+    if not valid:
+        return None
+    x0 = min(r[0] for r in valid)
+    y0 = min(r[1] for r in valid)
+    x1 = max(r[0] + r[2] for r in valid)
+    y1 = max(r[1] + r[3] for r in valid)
+    return x0, y0, x1 - x0, y1 - y0
+
+class FramePlanes:
+    """Gray, edge and HSV planes computed once per frame and shared by every shelf.
+    
+    Planes only cover ``bounds`` (the union of the shelf regions) so cameras with a
+    couple of small shelves do not pay for a full-frame Canny pass. Derived planes
+    are computed on first use, so only the planes the enabled features read are
+    ever built, and a frame whose shelves are all unchanged stops after the gray
+    conversion. With ``scale`` < 1 the area is resized with INTER_AREA first and
+    regions are mapped into the smaller planes.
+    
+    ``bounds`` and regions are always in full-resolution coordinates.
+    ``frame_scale`` < 1 means the frame was already decoded at reduced size
+    (see ``decode_image``); the crop is taken from it on its own pixel grid and
+    only resized if ``scale`` is smaller still.
+    """
+    
+    def __init__(self, frame: np.ndarray, bounds: Tuple[int, int, int, int], scale: float = 1.0,
+                 frame_scale: float = 1.0, costs: Optional[CostAccounting] = None):
+        start = time.perf_counter()
+        x, y, w, h = bounds
+        self.bounds = bounds
+        self.scale = scale
+        self.costs = costs
+        if frame_scale == 1.0:
+            self.origin = (x, y)
+            view = frame[y:y+h, x:x+w]
+        else:
+            fx0, fy0 = int(x * frame_scale), int(y * frame_scale)
+            fx1 = max(fx0 + 1, min(int(np.ceil((x + w) * frame_scale)), frame.shape[1]))
+            fy1 = max(fy0 + 1, min(int(np.ceil((y + h) * frame_scale)), frame.shape[0]))
+            self.origin = (fx0 / frame_scale, fy0 / frame_scale)
+            view = frame[fy0:fy1, fx0:fx1]
+        if scale != frame_scale:
+            factor = scale / frame_scale
+            size = (max(1, int(round(view.shape[1] * factor))), max(1, int(round(view.shape[0] * factor))))
+            view = cv2.resize(view, size, interpolation=cv2.INTER_AREA)
+        
+        self.color = view
+        self._gray = None
+        self._edges = None
+        self._hsv = None
+        self._record('plane:color', start)
+    
+    def _record(self, name: str, start: float):
+        if self.costs is not None:
+            self.costs.record(name, time.perf_counter() - start)
+    
+    @property
+    def gray(self) -> np.ndarray:
+        if self._gray is None:
+            start = time.perf_counter()
+            self._gray = cv2.cvtColor(self.color, cv2.COLOR_BGR2GRAY)
+            self._record('plane:gray', start)
+        return self._gray
+    
+    @property
+    def edges(self) -> np.ndarray:
+        if self._edges is None:
+            gray = self.gray
+            start = time.perf_counter()
+            self._edges = cv2.Canny(gray, 50, 150)
+            self._record('plane:edges', start)
+        return self._edges
+    
+    @property
+    def hsv(self) -> np.ndarray:
+        if self._hsv is None:
+            start = time.perf_counter()
+            self._hsv = cv2.cvtColor(self.color, cv2.COLOR_BGR2HSV)
+            self._record('plane:hsv', start)
+        return self._hsv
+    
+    def contains(self, region: List[int]) -> bool:
+        """Check whether a shelf region lies inside the computed planes"""
+        bx, by, bw, bh = self.bounds
+        x, y, w, h = region
+        return w > 0 and h > 0 and x >= bx and y >= by and x + w <= bx + bw and y + h <= by + bh
+    
+    def plane_region(self, region: List[int]) -> Tuple[int, int, int, int]:
+        """Map a region in frame coordinates to (x, y, w, h) inside the planes"""
+        x, y, w, h = region
+        ox, oy = x - self.origin[0], y - self.origin[1]
+        if self.scale == 1.0:
+            return ox, oy, w, h
+        plane_h, plane_w = self.color.shape[:2]
+        px = min(int(round(ox * self.scale)), plane_w - 1)
+        py = min(int(round(oy * self.scale)), plane_h - 1)
+        pw = min(max(1, int(round(w * self.scale))), plane_w - px)
+        ph = min(max(1, int(round(h * self.scale))), plane_h - py)
+        return px, py, pw, ph
+    
+    def crop(self, plane: np.ndarray, region: List[int]) -> Optional[np.ndarray]:
+        """Return a view of ``plane`` for a region given in frame coordinates"""
+        if not self.contains(region):
+            return None
+        px, py, pw, ph = self.plane_region(region)
+        return plane[py:py+ph, px:px+pw]
+    
+    def roi(self, plane: str, region: List[int]) -> Optional[np.ndarray]:
+        """The ``plane`` ("color", "gray", "edges" or "hsv") of a region given in frame coordinates"""
+        return self.crop(getattr(self, plane), region)
+    
+    def measure(self, feature: Feature, region: List[int]) -> float:
+        """Evaluate a feature over a region of the plane it reads"""
+        return feature.fn(self.roi(feature.plane, region), self.scale)
+    
+    def prepare(self, feature: Feature):
+        """Build what ``measure`` will read for a feature, so per-feature timings exclude it"""
+        if feature.plane in ('gray', 'edges', 'hsv'):
+            getattr(self, feature.plane)
+    
+    def expect(self, regions: List[List[int]]):
+        """Announce every region of the frame before the first measurement; backends that batch shelves use it"""
+
+class RoiFramePlanes(FramePlanes):
+    """Planes built per shelf region, for shelves spread thinly over the frame.
+    
+    Converting and edge-detecting the bounding box of all shelves also pays for
+    the empty space between them; when that box is much larger than the shelves
+    themselves (see ``ROI_PLANES_RATIO``) each region gets its own FramePlanes,
+    built on first use. Canny then sees the ROI border instead of the pixels
+    next to it, so edge features can differ slightly from the shared planes.
+    """
+    
+    def __init__(self, frame: np.ndarray, bounds: Tuple[int, int, int, int], scale: float = 1.0,
+                 frame_scale: float = 1.0, costs: Optional[CostAccounting] = None):
+        self.frame = frame
+        self.bounds = bounds
+        self.scale = scale
+        self.frame_scale = frame_scale
+        self.costs = costs
+        self._regions: Dict[Tuple[int, ...], FramePlanes] = {}
+    
+    def region_planes(self, region: List[int]) -> FramePlanes:
+        key = tuple(region)
+        planes = self._regions.get(key)
+        if planes is None:
+            planes = self._regions[key] = FramePlanes(self.frame, key, self.scale, self.frame_scale, self.costs)
+        return planes
+    
+    def roi(self, plane: str, region: List[int]) -> Optional[np.ndarray]:
+        if not self.contains(region):
+            return None
+        planes = self.region_planes(region)
+        return planes.roi(plane, region)
+    
+    def prepare(self, feature: Feature):
+        # Region planes are built by the first measurement of each shelf
+        pass
+
+class IntegralFramePlanes(FramePlanes):
+    """Frame planes plus summed-area tables, so rectangle statistics cost O(1) per shelf.
+    
+    The edge_density and color_variance features are read from
+    ``cv2.integral2``/``cv2.integral`` tables with four lookups each, whatever the
+    ROI size. Counts are exact; the variance is computed as E[x^2] - E[x]^2 in
+    float64, so scores match the "planes" backend to within 1e-6. Other features
+    are not rectangle sums and are still reduced over the ROI view.
+    """
+    
+    def __init__(self, frame: np.ndarray, bounds: Tuple[int, int, int, int], scale: float = 1.0,
+                 frame_scale: float = 1.0, costs: Optional[CostAccounting] = None):
+        super().__init__(frame, bounds, scale, frame_scale, costs)
+        self._tables = None
+    
+    def _integral_tables(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._tables is None:
+            gray, edges = self.gray, self.edges
+            start = time.perf_counter()
+            gray_sum, gray_sqsum = cv2.integral2(gray, sdepth=cv2.CV_64F, sqdepth=cv2.CV_64F)
+            edge_sum = cv2.integral(cv2.compare(edges, 0, cv2.CMP_GT) // 255, sdepth=cv2.CV_32S)
+            self._tables = (gray_sum, gray_sqsum, edge_sum)
+            self._record('plane:integral', start)
+        return self._tables
+    
+    @staticmethod
+    def _rect_sum(table: np.ndarray, rect: Tuple[int, int, int, int]) -> float:
+        px, py, pw, ph = rect
+        return float(table[py + ph, px + pw] - table[py, px + pw] - table[py + ph, px] + table[py, px])
+    
+    def measure(self, feature: Feature, region: List[int]) -> float:
+        """Edge density and gray variance come from the integral tables; other features from the ROI"""
+        if feature.name not in ('edge_density', 'color_variance'):
+            return super().measure(feature, region)
+        rect = self.plane_region(region)
+        area = float(rect[2] * rect[3])
+        gray_sum, gray_sqsum, edge_sum = self._integral_tables()
+        
+        if feature.name == 'edge_density':
+            return min(self._rect_sum(edge_sum, rect) / area * scale_gain('edge_density', self.scale), 1.0)
+        mean = self._rect_sum(gray_sum, rect) / area
+        variance = max(self._rect_sum(gray_sqsum, rect) / area - mean * mean, 0.0)
+        return min(variance * scale_gain('color_variance', self.scale) / 1000, 1.0)
+
+# Canonical ROI shapes of the "batched" backend: a fixed height and a few aspect ratios (width / height)
+BATCH_HEIGHT = 32
+BATCH_ASPECTS = (0.5, 1.0, 2.0, 4.0, 8.0)
+
+# Per-shelf feature values as returned by BatchedFramePlanes.feature_array (one float field per feature)
+BATCH_REGION_DTYPE = [('x', np.int32), ('y', np.int32), ('w', np.int32), ('h', np.int32)]
+
+def canonical_resize(roi: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """Resize an ROI to (width, height) ``size``: INTER_AREA by the whole factor, INTER_LINEAR for the rest
+    
+    INTER_AREA is several times slower with fractional factors, so the ROI is
+    trimmed by under one step to an exact multiple and area-averaged by the
+    integer part; the remaining factor is below 2, where linear interpolation
+    does not alias.
+    """
+    fx, fy = max(1, roi.shape[1] // size[0]), max(1, roi.shape[0] // size[1])
+    if fx > 1 or fy > 1:
+        w, h = roi.shape[1] // fx, roi.shape[0] // fy
+        roi = cv2.resize(roi[:h * fy, :w * fx], (w, h), interpolation=cv2.INTER_AREA)
+    return cv2.resize(roi, size, interpolation=cv2.INTER_LINEAR)
+
+class BatchedFramePlanes(FramePlanes):
+    """Frame planes that compute the batchable features of all shelves at once.
+    
+    Features with a ``batch_fn`` are reduced for every shelf announced through
+    ``expect`` in one call. Gray features read an (N, 256) array of the gray
+    histograms of the unresized ROIs, so they match the "planes" backend. For
+    edges features the ROIs are resized (``canonical_resize``) to a canonical
+    shape (``BATCH_HEIGHT`` high, the nearest aspect ratio in ``BATCH_ASPECTS``),
+    each shape group is stacked into one contiguous (N, H, W) array and edges
+    come from one Canny pass per stack (with replicated separator rows, so
+    stacked ROIs do not see each other). Other features, and regions that were
+    not announced, are measured per ROI as in the "planes" backend.
+    
+    Edge density differs from the "planes" backend because ROIs are resampled
+    (up to about 0.02 on bench_batched_features.py); the per-ROI resampling
+    factor is folded into the scale passed to its batch function. Every
+    announced shelf is measured, including ones the change gate ends up
+    skipping.
+    """
+    
+    def __init__(self, frame: np.ndarray, bounds: Tuple[int, int, int, int], scale: float = 1.0,
+                 frame_scale: float = 1.0, costs: Optional[CostAccounting] = None):
+        super().__init__(frame, bounds, scale, frame_scale, costs)
+        self._regions: Dict[Tuple[int, ...], int] = {}
+        self._groups: Optional[List[Tuple[np.ndarray, np.ndarray, np.ndarray]]] = None
+        self._histograms: Optional[np.ndarray] = None
+        self._edge_stacks: Dict[int, np.ndarray] = {}
+        self._values: Dict[str, np.ndarray] = {}
+    
+    def expect(self, regions: List[List[int]]):
+        if self._groups is not None or self._histograms is not None:
+            raise RuntimeError("Regions must be announced before the first batched measurement")
+        for region in regions:
+            key = tuple(region)
+            if key not in self._regions and self.contains(region):
+                self._regions[key] = len(self._regions)
+    
+    def _stacks(self) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """(region indices, (N, H, W) gray stack, per-ROI scales) for each canonical shape"""
+        if self._groups is None:
+            gray = self.gray
+            start = time.perf_counter()
+            rects = [self.plane_region(list(key)) for key in self._regions]
+            shapes: Dict[float, List[int]] = {}
+            for index, (_, _, pw, ph) in enumerate(rects):
+                aspect = min(BATCH_ASPECTS, key=lambda candidate: abs(np.log(pw / ph / candidate)))
+                shapes.setdefault(aspect, []).append(index)
+            
+            self._groups = []
+            for aspect, indices in shapes.items():
+                size = (max(1, int(round(BATCH_HEIGHT * aspect))), BATCH_HEIGHT)
+                stack = np.empty((len(indices), size[1], size[0]), dtype=np.uint8)
+                scales = np.empty(len(indices))
+                for row, index in enumerate(indices):
+                    px, py, pw, ph = rects[index]
+                    stack[row] = canonical_resize(gray[py:py+ph, px:px+pw], size)
+                    scales[row] = self.scale * np.sqrt(size[0] * size[1] / float(pw * ph))
+                self._groups.append((np.array(indices), stack, scales))
+            self._record('plane:batch', start)
+        return self._groups
+    
+    def _gray_histograms(self) -> np.ndarray:
+        """(N, 256) gray histograms of the announced ROIs at their plane size, in announcement order"""
+        if self._histograms is None:
+            gray = self.gray
+            start = time.perf_counter()
+            histograms = np.empty((len(self._regions), 256), dtype=np.float32)
+            for index, key in enumerate(self._regions):
+                px, py, pw, ph = self.plane_region(list(key))
+                histograms[index] = cv2.calcHist([gray[py:py+ph, px:px+pw]], [0], None, [256], [0, 256]).ravel()
+            self._histograms = histograms
+            self._record('plane:batch_histograms', start)
+        return self._histograms
+    
+    def _edge_stack(self, group: int) -> np.ndarray:
+        if group not in self._edge_stacks:
+            _, stack, _ = self._stacks()[group]
+            start = time.perf_counter()
+            n, h, w = stack.shape
+            padded = np.pad(stack, ((0, 0), (1, 1), (0, 0)), mode='edge')
+            edges = cv2.Canny(padded.reshape(n * (h + 2), w), 50, 150).reshape(n, h + 2, w)
+            self._edge_stacks[group] = np.ascontiguousarray(edges[:, 1:-1])
+            self._record('plane:batch_edges', start)
+        return self._edge_stacks[group]
+    
+    def batch_values(self, feature: Feature) -> np.ndarray:
+        """A batchable feature's values for every announced region, in announcement order"""
+        values = self._values.get(feature.name)
+        if values is None:
+            if feature.plane == 'gray':
+                values = feature.batch_fn(self._gray_histograms(), np.full(len(self._regions), self.scale))
+            else:
+                values = np.empty(len(self._regions))
+                for group, (indices, _, scales) in enumerate(self._stacks()):
+                    values[indices] = feature.batch_fn(self._edge_stack(group), scales)
+            self._values[feature.name] = values
+        return values
+    
+    def prepare(self, feature: Feature):
+        if feature.batch_fn is None or not self._regions:
+            super().prepare(feature)
+            return
+        if feature.plane == 'gray':
+            self._gray_histograms()
+            return
+        for group in range(len(self._stacks())):
+            self._edge_stack(group)
+    
+    def measure(self, feature: Feature, region: List[int]) -> float:
+        """Batchable features are read from the per-frame batch; other features from the ROI"""
+        index = self._regions.get(tuple(region))
+        if feature.batch_fn is None or index is None:
+            return super().measure(feature, region)
+        return float(self.batch_values(feature)[index])
+    
+    def feature_array(self, features: List[Feature]) -> np.ndarray:
+        """Structured array with the region and the values of batchable ``features`` for every announced shelf"""
+        dtype = BATCH_REGION_DTYPE + [(feature.name, np.float64) for feature in features]
+        table = np.empty(len(self._regions), dtype=dtype)
+        if self._regions:
+            regions = np.array(list(self._regions), dtype=np.int32)
+            for column, field in enumerate(('x', 'y', 'w', 'h')):
+                table[field] = regions[:, column]
+        for feature in features:
+            table[feature.name] = self.batch_values(feature)
+        return table
+
+# The default backend builds planes per shelf when the shelves' bounding box is more than
+# this many times their summed area (bench_frame_planes.py)
+ROI_PLANES_RATIO = 2.0
+
+# Reduced JPEG decode factors, largest first (cv2.IMREAD_REDUCED_COLOR_4 / _2)
+DECODE_REDUCTIONS = (4, 2)
+
+# Feature backends selectable through CVProcessor(feature_backend=...)
+FEATURE_BACKENDS = {
+    'planes': FramePlanes,
+    'integral': IntegralFramePlanes,
+    'batched': BatchedFramePlanes,
+}
+
+# Shelf scoring modes: the weighted feature blend, differencing against a reference snapshot, or a CNN
+SCORING_MODES = ('features', 'reference', 'cnn')
+
+class ShelfSpec(NamedTuple):
+    """Plain, picklable copy of the shelf fields the CV pipeline reads"""
+    id: int
+    name: str
+    region: List[int]
+    empty_threshold: float = 0.15
+    camera_id: Optional[int] = None
+    product_category: Optional[str] = None
+    store_id: Optional[int] = None
+    
+    @classmethod
+    def from_shelf(cls, shelf: Any) -> 'ShelfSpec':
+        # store_id and product_category select the shelf's learned occupancy model
+        camera = getattr(shelf, 'camera', None)
+        return cls(shelf.id, shelf.name, list(shelf.region), shelf.empty_threshold,
+                   getattr(shelf, 'camera_id', None), getattr(shelf, 'product_category', None),
+                   getattr(camera, 'store_id', None))
+
+class ShelfScore(NamedTuple):
+    occupancy_score: float
+    from_cache: bool = False
+    error: Optional[str] = None
+    decided_by: Optional[str] = None  # cascade stage (feature) that settled the stock level, "reference", "model" or "cnn"
+    region: Optional[List[int]] = None  # region actually analysed, when the camera has shifted
+    region_offset: Tuple[int, int] = (0, 0)
+    camera_moved: bool = False
+
+# Row layout of CVProcessor.score_frame_array; decided_by is truncated to 16 characters
+SHELF_SCORE_DTYPE = np.dtype([
+    ('shelf_id', np.int64), ('occupancy_score', np.float64), ('from_cache', np.bool_), ('error', np.bool_),
+    ('decided_by', 'U16'), ('offset_x', np.int32), ('offset_y', np.int32), ('camera_moved', np.bool_),
+])
+
 class CVProcessor:
-    def __init__(self):
-        self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
-            history=500, varThreshold=16, detectShadows=True
-        )
-        self.alert_cooldown = {}
-        self.alert_duration = 300  # 5 minutes
+    def __init__(self, feature_backend: str = 'planes', bg_registry: Optional[BackgroundModelRegistry] = None,
+                 change_gate: Optional[ShelfChangeGate] = None, shelf_states: Optional[ShelfStateTracker] = None,
+                 scene_cache: Optional[SceneFingerprintCache] = None,
+                 camera_shift: Optional[CameraShiftTracker] = None,
+                 reference_store: Optional[ReferenceSnapshotStore] = None,
+                 occupancy_models: Optional[OccupancyModelRegistry] = None,
+                 dnn_scorer: Optional[DnnOccupancyScorer] = None):
+        if feature_backend not in FEATURE_BACKENDS:
+            raise ValueError(f"Unknown feature backend: {feature_backend}")
+        self.feature_backend = feature_backend
+        # One background model per (camera_id, shelf_id), sized to the shelf ROI
+        self.bg_registry = bg_registry if bg_registry is not None else BackgroundModelRegistry()
+        # Reuses the previous score for shelves whose ROI has not changed; None disables it
+        self.change_gate = change_gate if change_gate is not None else ShelfChangeGate()
+        # Smoothed per-shelf stock levels; only their transitions raise alerts
+        self.shelf_states = shelf_states if shelf_states is not None else ShelfStateTracker()
+        # Reuses shelf detections per camera while the scene layout is unchanged; None disables it
+        self.scene_cache = scene_cache if scene_cache is not None else SceneFingerprintCache()
+        # Translates shelf regions when a camera's view shifts; None disables it
+        self.camera_shift = camera_shift if camera_shift is not None else CameraShiftTracker()
+        # Reference snapshots of shelves in "reference" scoring mode, retaken after a confirmed restock
+        self.reference_store = reference_store if reference_store is not None else ReferenceSnapshotStore()
+        # Learned weights per store or product category (see train_occupancy.py); without models
+        # the metric profile's hand-tuned weights apply
+        self.occupancy_models = occupancy_models if occupancy_models is not None else OccupancyModelRegistry()
+        # CNN for shelves in "cnn" scoring mode; there is no default model, so None leaves the mode unavailable
+        self.dnn_scorer = dnn_scorer
         
-    def detect_shelves(self, frame: np.ndarray) -> List[Dict[str, Any]]:
-        """Automatically detect shelf regions using edge detection and contours"""
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        # Shelf detection: candidates of each detector are merged when they overlap by more than detection_iou
+        self.shelf_detectors = shelf_detection.DETECTORS
+        self.detection_iou = 0.4
         
-        # Apply Gaussian blur
-        blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+        # Scoring mode: shelf setting, then the default
+        self.scoring_mode = 'features'
+        self.shelf_modes: Dict[Any, str] = {}
         
-        # Edge detection
-        edges = cv2.Canny(blurred, 50, 150)
+        # Analysis scale: shelf setting, then camera setting, then the default
+        self.analysis_scale = 1.0
+        self.camera_scales: Dict[Any, float] = {}
+        self.shelf_scales: Dict[Any, float] = {}
         
-        # Find contours
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Metric profile: camera setting, then the default; costs are per feature and plane
+        self.features: FeatureRegistry = OCCUPANCY_FEATURES
+        self.metric_profile = 'full'
+        self.camera_profiles: Dict[Any, str] = {}
+        self.costs = CostAccounting(CV_STEP_SECONDS)
         
-        potential_shelves = []
+        # Cascade: evaluate features cheapest first and stop once the stock level is settled
+        self.cascade = False
+        self.cascade_margin = 0.02
+        self.cascade_stages: Counter = Counter()
+        self._cascade_lock = threading.Lock()
+        self.alert_cooldown = {}
+        self.alert_duration = 300  # 5 minutes
         
-        for contour in contours:
-            # Calculate contour area and bounding rectangle
-            area = cv2.contourArea(contour)
-            if area < 5000:  # Filter small contours
-                continue
-                
-            x, y, w, h = cv2.boundingRect(contour)
-            
-            # Filter based on aspect ratio (shelves are typically wider than tall)
-            aspect_ratio = w / h
-            if aspect_ratio > 1.5 and w > 100 and h > 50:
-                potential_shelves.append({
-                    'region': [x, y, w, h],
-                    'area': area,
-                    'aspect_ratio': aspect_ratio,
-                    'confidence': min(area / 10000, 1.0)
-                })
+    def detect_shelves(self, frame: np.ndarray, camera_id: Any = None, refresh: bool = False) -> List[Dict[str, Any]]:
+        """Automatically detect shelf regions, reusing the camera's last detections while its scene is unchanged"""
+        if self.scene_cache is None or camera_id is None:
+            return self.detect_shelves_uncached(frame)
         
-        return potential_shelves
+        if refresh:
+            self.scene_cache.invalidate(camera_id)
+        detections, fingerprint = self.scene_cache.lookup(camera_id, frame)
+        if detections is None:
+            detections = self.detect_shelves_uncached(frame)
+            self.scene_cache.store(camera_id, frame, fingerprint, detections)
+        return detections
+    
+    def detect_shelves_uncached(self, frame: np.ndarray) -> List[Dict[str, Any]]:
+        """Detect shelf regions with the configured detectors (contours, Hough lines) merged by NMS"""
+        return shelf_detection.detect_shelves(frame, self.shelf_detectors, self.detection_iou)
     
-    def analyze_shelf_occupancy(self, frame: np.ndarray, shelf_region: List[int]) -> float:
+    def set_shelf_detectors(self, detectors: List[str], iou_threshold: Optional[float] = None):
+        """Choose the shelf detectors to run and the IoU above which their boxes are merged"""
+        unknown = [name for name in detectors if name not in shelf_detection.DETECTORS]
+        if unknown or not detectors:
+            raise ValueError(f"Shelf detectors must be a non-empty subset of {shelf_detection.DETECTORS}, got {detectors}")
+        self.shelf_detectors = tuple(detectors)
+        if iou_threshold is not None:
+            self.detection_iou = iou_threshold
+        if self.scene_cache is not None:
+            self.scene_cache.invalidate()
+    
+    def set_analysis_scale(self, scale: float, camera_id: Any = None, shelf_id: Any = None):
+        """Set the ROI downscale factor (0 < scale <= 1) for a shelf, a camera, or the default"""
+        if not 0.0 < scale <= 1.0:
+            raise ValueError(f"Analysis scale must be in (0, 1], got {scale}")
+        if shelf_id is not None:
+            self.shelf_scales[shelf_id] = scale
+        elif camera_id is not None:
+            self.camera_scales[camera_id] = scale
+        else:
+            self.analysis_scale = scale
+        if self.change_gate is not None:
+            self.change_gate.invalidate()
+    
+    def get_analysis_scale(self, shelf: Any) -> float:
+        """Analysis scale that applies to a shelf"""
+        if shelf.id in self.shelf_scales:
+            return self.shelf_scales[shelf.id]
+        return self.camera_scales.get(getattr(shelf, 'camera_id', None), self.analysis_scale)
+    
+    def set_metric_profile(self, profile: str, camera_id: Any = None):
+        """Choose which registered features score a camera's shelves (or the default)"""
+        self.features.resolve(profile)
+        if camera_id is not None:
+            self.camera_profiles[camera_id] = profile
+        else:
+            self.metric_profile = profile
+        if self.change_gate is not None:
+            self.change_gate.invalidate()
+    
+    def get_metric_profile(self, shelf: Any) -> str:
+        """Metric profile that applies to a shelf"""
+        return self.camera_profiles.get(getattr(shelf, 'camera_id', None), self.metric_profile)
+    
+    def set_scoring_mode(self, mode: str, shelf_id: Any = None):
+        """Choose how a shelf (or, by default, every shelf) is scored, one of SCORING_MODES"""
+        if mode not in SCORING_MODES:
+            raise ValueError(f"Unknown scoring mode: {mode}")
+        if mode == 'cnn' and self.dnn_scorer is None:
+            raise ValueError("The cnn scoring mode needs a DNN model (CV_DNN_MODEL)")
+        if shelf_id is not None:
+            self.shelf_modes[shelf_id] = mode
+        else:
+            self.scoring_mode = mode
+        if self.change_gate is not None:
+            self.change_gate.invalidate()
+    
+    def get_scoring_mode(self, shelf: Any) -> str:
+        """Scoring mode that applies to a shelf; modes whose component is disabled fall back to features"""
+        mode = self.shelf_modes.get(shelf.id, self.scoring_mode)
+        if (mode == 'reference' and self.reference_store is None) or (mode == 'cnn' and self.dnn_scorer is None):
+            return 'features'
+        return mode
+    
+    def set_cascade(self, enabled: bool, margin: Optional[float] = None):
+        """Turn cascade scoring on or off; ``margin`` is the minimum distance of the score bounds from a cut point"""
+        if margin is not None:
+            if margin < 0:
+                raise ValueError(f"Cascade margin must be >= 0, got {margin}")
+            self.cascade_margin = margin
+        self.cascade = enabled
+    
+    def decode_reduction(self, shelves: List[Any]) -> int:
+        """Largest decode reduction (1, 2 or 4) that no shelf's analysis scale would need to undo"""
+        max_scale = max((self.get_analysis_scale(shelf) for shelf in shelves), default=1.0)
+        for reduction in DECODE_REDUCTIONS:
+            if max_scale <= 1.0 / reduction:
+                return reduction
+        return 1
+    
+    def compute_frame_planes(self, frame: np.ndarray, shelf_regions: List[List[int]],
+                             scale: float = 1.0, frame_scale: float = 1.0) -> Optional['FramePlanes']:
+        """Compute the shared gray/edge planes over the area covered by all shelves, or per shelf when they are sparse"""
+        frame_shape = frame.shape
+        if frame_scale != 1.0:
+            frame_shape = (int(round(frame.shape[0] / frame_scale)), int(round(frame.shape[1] / frame_scale)))
+        bounds = union_bounds(frame_shape, shelf_regions)
+        if bounds is None:
+            return None
+        backend = FEATURE_BACKENDS[self.feature_backend]
+        if backend is FramePlanes:
+            area = sum(r[2] * r[3] for r in shelf_regions if r is not None and region_in_frame(frame_shape, r))
+            if bounds[2] * bounds[3] > ROI_PLANES_RATIO * area:
+                backend = RoiFramePlanes
+        planes = backend(frame, bounds, scale, frame_scale, self.costs)
+        planes.expect(shelf_regions)
+        return planes
+    
+    def foreground_mask(self, roi: np.ndarray, model_key: Any) -> Optional[np.ndarray]:
+        """Foreground mask of an ROI from that shelf's background model, or None without one"""
+        if self.bg_registry is None or model_key is None or roi is None or roi.size == 0:
+            return None
+        try:
+            return self.bg_registry.apply(model_key, roi)
+        except Exception:
+            return None
+    
+    def analyze_shelf_occupancy(self, frame: np.ndarray, shelf_region: List[int], model_key: Any = None,
+                                scale: float = 1.0) -> float:
         """Analyze shelf occupancy using multiple computer vision techniques"""
         x, y, w, h = shelf_region
         
         # Validate region
         if x < 0 or y < 0 or x + w > frame.shape[1] or y + h > frame.shape[0]:
             return 0.0
-            
-        shelf_roi = frame[y:y+h, x:x+w]
         
-        if shelf_roi.size == 0:
+        if w <= 0 or h <= 0:
             return 0.0
         
-        # Convert to different color spaces for analysis
-        gray_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2GRAY)
-        hsv_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2HSV)
+        # A single-shelf frame pass is the ROI itself
+        planes = FramePlanes(frame, (x, y, w, h), scale, costs=self.costs)
+        if model_key is None:
+            model_key = ('region', tuple(shelf_region))
+        return self.score_region(planes, shelf_region, model_key)
+    
+    def score_region(self, planes: 'FramePlanes', shelf_region: List[int], model_key: Any = None,
+                     profile: Optional[str] = None) -> float:
+        """Evaluate a metric profile's features over one shelf region and blend them into an occupancy score
         
-        # Method 1: Edge density analysis
-        edges = cv2.Canny(gray_roi, 50, 150)
-        edge_density = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
+        The foreground feature uses the background model under ``model_key``
+        and counts as 0 without one.
+        """
+        if not planes.contains(shelf_region):
+            return 0.0
+        values = [(feature, self.evaluate_feature(planes, feature, shelf_region, model_key))
+                  for feature in self.features.resolve(profile or self.metric_profile)]
+        return self.features.combine(values)
+    
+    def evaluate_feature(self, planes: 'FramePlanes', feature: Feature, shelf_region: List[int],
+                         model_key: Any = None) -> float:
+        """Evaluate one feature over a shelf region, recording its cost"""
+        # Build the frame-wide plane first so the feature timing excludes it
+        planes.prepare(feature)
         
-        # Method 2: Color variance analysis
-        color_variance = np.var(gray_roi)
+        start = time.perf_counter()
+        if feature.plane == 'foreground':
+            fg_mask = self.foreground_mask(planes.roi('color', shelf_region), model_key)
+            value = feature.fn(fg_mask, planes.scale) if fg_mask is not None else 0.0
+        else:
+            value = planes.measure(feature, shelf_region)
+        self.costs.record(feature.name, time.perf_counter() - start)
+        return value
+    
+    def cascade_region(self, planes: 'FramePlanes', shelf_region: List[int], model_key: Any = None,
+                       profile: Optional[str] = None, empty_threshold: float = 0.15) -> Tuple[float, Optional[str]]:
+        """Score a shelf region with the cheapest features first, stopping once its stock level is settled
         
-        # Method 3: Histogram analysis
-        hist = cv2.calcHist([gray_roi], [0], None, [256], [0, 256])
-        hist_variance = np.var(hist)
+        After each feature the full score is bounded by the weights of the
+        pending features, each of which lies in [0, 1]. When those bounds are
+        at least ``cascade_margin`` away from every level cut point the level
+        is proven, the remaining features are skipped and the weighted mean of
+        the evaluated features, clamped to the bounds, is returned; it is off
+        the full score by at most the pending features' share of the weight.
+        Shelves near a boundary run every feature. Returns (score, name of the
+        deciding feature).
         
-        # Method 4: Background subtraction
-        try:
-            fg_mask = self.bg_subtractor.apply(shelf_roi)
-            foreground_ratio = np.sum(fg_mask > 0) / (fg_mask.shape[0] * fg_mask.shape[1])
-        except:
-            foreground_ratio = 0.0
-        
-        # Method 5: Contour analysis
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        contour_count = len(contours)
-        contour_score = min(contour_count / 20.0, 1.0)
-        
-        # Combine metrics to determine occupancy
-        occupancy_score = (
-            edge_density * 0.25 +
-            min(color_variance / 1000, 1.0) * 0.25 +
-            min(hist_variance / 1000000, 1.0) * 0.2 +
-            foreground_ratio * 0.15 +
-            contour_score * 0.15
-        )
-        
-        return min(occupancy_score, 1.0)
+        A skipped foreground feature does not update the shelf's background
+        model for that frame.
+        """
+        if not planes.contains(shelf_region):
+            return 0.0, None
+        profile = profile or self.metric_profile
+        cut_points = level_cut_points(empty_threshold)
+        margin = self.cascade_margin
+        features = self.features.cascade(profile)
+        
+        values = []
+        for stage, feature in enumerate(features[:-1]):
+            values.append((feature, self.evaluate_feature(planes, feature, shelf_region, model_key)))
+            lower, upper = self.features.bounds(values, features[stage + 1:])
+            if all(lower >= cut + margin or upper < cut - margin for cut in cut_points):
+                estimate = self.features.combine(values)
+                self.record_cascade_stage(feature.name)
+                return min(max(estimate, lower), upper), feature.name
+        
+        if features:
+            values.append((features[-1], self.evaluate_feature(planes, features[-1], shelf_region, model_key)))
+        occupancy_score = self.features.combine(values)
+        stage_name = features[-1].name if features else None
+        self.record_cascade_stage(stage_name)
+        return occupancy_score, stage_name
+    
+    def record_cascade_stage(self, stage: Optional[str]):
+        with self._cascade_lock:
+            self.cascade_stages[stage] += 1
     
     def classify_stock_level(self, occupancy_score: float, empty_threshold: float = 0.15) -> str:
         """Classify stock level based on occupancy score"""
@@ -128,23 +726,209 @@ class CVProcessor:
         self.alert_cooldown[shelf_id] = current_time
         return True
     
-    def process_frame(self, frame: np.ndarray, shelves: List[Any]) -> List[Dict[str, Any]]:
-        """Process a frame and analyze all shelves"""
-        results = []
+    def score_shelf(self, planes: Optional['FramePlanes'], shelf: Any) -> 'ShelfScore':
+        """Occupancy score of one shelf, whether it was served from the change gate and the deciding cascade stage"""
+        shelf_region = shelf.region
+        if planes is None or not planes.contains(shelf_region):
+            return ShelfScore(0.0)
+        model_key = (getattr(shelf, 'camera_id', None), shelf.id)
+        
+        if self.get_scoring_mode(shelf) == 'reference':
+            # One absdiff and countNonZero per ROI; skips the change gate, which would cost more
+            start = time.perf_counter()
+            occupancy_score, _ = self.reference_store.score(model_key, planes.roi('gray', shelf_region))
+            self.costs.record('reference', time.perf_counter() - start)
+            return ShelfScore(occupancy_score, False, decided_by='reference')
         
+        fingerprint = None
+        if self.change_gate is not None:
+            fingerprint = self.change_gate.fingerprint(planes.roi('gray', shelf_region))
+            cached_score = self.change_gate.lookup(shelf.id, shelf_region, fingerprint)
+            if cached_score is not None:
+                return ShelfScore(cached_score, True)
+        
+        # The foreground feature runs on the shelf's own background model
+        profile = self.get_metric_profile(shelf)
+        decided_by = None
+        if self.cascade:
+            occupancy_score, decided_by = self.cascade_region(planes, shelf_region, model_key, profile,
+                                                              shelf.empty_threshold)
+        else:
+            occupancy_score = self.score_region(planes, shelf_region, model_key, profile)
+        
+        if fingerprint is not None:
+            self.change_gate.store(shelf.id, shelf_region, fingerprint, occupancy_score)
+        return ShelfScore(occupancy_score, False, decided_by=decided_by)
+    
+    def score_frame(self, frame: np.ndarray, shelves: List[Any], frame_scale: float = 1.0) -> List['ShelfScore']:
+        """Score every shelf in a frame; no alerting state is touched, so this can run in a worker
+        
+        ``frame_scale`` is the size of ``frame`` relative to the camera's full
+        resolution, for frames decoded at reduced size; shelf regions stay in
+        full-resolution coordinates. When the camera's view has shifted since
+        its reference frame, shelf regions are translated by the estimated
+        offset before scoring.
+        """
+        scores = []
+        shelves, shift = self.shift_shelves(frame, shelves, frame_scale)
+        
+        # Frame-level pass: convert and edge-detect once per analysis scale for all shelves
+        shelf_scales = {shelf.id: min(self.get_analysis_scale(shelf), frame_scale) for shelf in shelves}
+        planes_by_scale = {}
+        for scale in set(shelf_scales.values()):
+            try:
+                planes_by_scale[scale] = self.compute_frame_planes(
+                    frame, [shelf.region for shelf in shelves if shelf_scales[shelf.id] == scale], scale, frame_scale
+                )
+            except Exception as e:
+                logger.error(f"Error computing frame planes: {str(e)}")
+                planes_by_scale[scale] = None
+        
+        # Shelves with a learned model are collected per model and scored in one matrix product,
+        # shelves in cnn mode in one forward pass
+        batches: Dict[int, Tuple[OccupancyModel, List[Tuple[int, np.ndarray, Any]]]] = {}
+        cnn_rois: List[Tuple[int, np.ndarray, Any]] = []
+        for index, shelf in enumerate(shelves):
+            try:
+                planes = planes_by_scale[shelf_scales[shelf.id]]
+                model = self.learned_model(shelf)
+                if model is None and self.get_scoring_mode(shelf) == 'cnn':
+                    score, fingerprint = self.gated_score(planes, shelf)
+                    if score is None:
+                        cnn_rois.append((index, planes.roi('color', shelf.region), fingerprint))
+                elif model is None:
+                    score = self.score_shelf(planes, shelf)
+                else:
+                    score, row, fingerprint = self.feature_row(planes, shelf, model)
+                    if score is None:
+                        batches.setdefault(id(model), (model, []))[1].append((index, row, fingerprint))
+                scores.append(score)
+            except Exception as e:
+                logger.error(f"Error processing shelf {shelf.id}: {str(e)}")
+                scores.append(ShelfScore(0.0, False, str(e)))
+        
+        for model, rows in batches.values():
+            predictions = model.predict(np.stack([row for _, row, _ in rows]))
+            self.store_batch(shelves, scores, rows, predictions, 'model')
+        if cnn_rois:
+            start = time.perf_counter()
+            try:
+                predictions = self.dnn_scorer.score([roi for _, roi, _ in cnn_rois])
+                self.store_batch(shelves, scores, cnn_rois, predictions, 'cnn')
+            except Exception as e:
+                logger.error(f"Error running the DNN occupancy model: {str(e)}")
+                for index, _, _ in cnn_rois:
+                    scores[index] = ShelfScore(0.0, False, str(e))
+            self.costs.record('cnn', time.perf_counter() - start)
+        
+        if shift is not None:
+            scores = [score._replace(region=list(shelf.region), region_offset=shift.offset, camera_moved=shift.moved)
+                      for shelf, score in zip(shelves, scores)]
+        return scores
+    
+    def score_frame_array(self, frame: np.ndarray, shelves: List[Any], frame_scale: float = 1.0) -> np.ndarray:
+        """``score_frame`` as a structured array (``SHELF_SCORE_DTYPE``), one row per shelf in ``shelves`` order"""
+        scores = self.score_frame(frame, shelves, frame_scale)
+        table = np.zeros(len(scores), dtype=SHELF_SCORE_DTYPE)
+        table['shelf_id'] = [shelf.id for shelf in shelves]
+        table['occupancy_score'] = [score.occupancy_score for score in scores]
+        table['from_cache'] = [score.from_cache for score in scores]
+        table['error'] = [score.error is not None for score in scores]
+        table['decided_by'] = [score.decided_by or '' for score in scores]
+        table['offset_x'] = [score.region_offset[0] for score in scores]
+        table['offset_y'] = [score.region_offset[1] for score in scores]
+        table['camera_moved'] = [score.camera_moved for score in scores]
+        return table
+    
+    def learned_model(self, shelf: Any) -> Optional[OccupancyModel]:
+        """Learned occupancy model that replaces the feature weights for a shelf, if any"""
+        if self.occupancy_models is None or self.get_scoring_mode(shelf) != 'features':
+            return None
+        return self.occupancy_models.model_for(shelf)
+    
+    def gated_score(self, planes: Optional['FramePlanes'], shelf: Any) -> Tuple[Optional['ShelfScore'], Any]:
+        """(score, None) when the shelf is outside the planes or unchanged, else (None, change gate fingerprint)"""
+        if planes is None or not planes.contains(shelf.region):
+            return ShelfScore(0.0), None
+        fingerprint = None
+        if self.change_gate is not None:
+            fingerprint = self.change_gate.fingerprint(planes.roi('gray', shelf.region))
+            cached_score = self.change_gate.lookup(shelf.id, shelf.region, fingerprint)
+            if cached_score is not None:
+                return ShelfScore(cached_score, True), None
+        return None, fingerprint
+    
+    def store_batch(self, shelves: List[Any], scores: List[Optional['ShelfScore']],
+                    rows: List[Tuple[int, Any, Any]], predictions: np.ndarray, decided_by: str):
+        """Fill in the scores of a batch of (shelf index, input, gate fingerprint) rows"""
+        for (index, _, fingerprint), prediction in zip(rows, predictions.tolist()):
+            if fingerprint is not None:
+                self.change_gate.store(shelves[index].id, shelves[index].region, fingerprint, prediction)
+            scores[index] = ShelfScore(prediction, False, decided_by=decided_by)
+    
+    def feature_row(self, planes: Optional['FramePlanes'], shelf: Any,
+                    model: OccupancyModel) -> Tuple[Optional['ShelfScore'], Optional[np.ndarray], Any]:
+        """(finished score, None, None) when the shelf needs no evaluation, else (None, feature row, gate fingerprint)"""
+        score, fingerprint = self.gated_score(planes, shelf)
+        if score is not None:
+            return score, None, None
+        
+        shelf_region = shelf.region
+        model_key = (getattr(shelf, 'camera_id', None), shelf.id)
+        row = np.empty(len(model.features))
+        for column, name in enumerate(model.features):
+            feature = self.features.features.get(name)
+            if feature is None:
+                raise ValueError(f"Occupancy model uses unknown feature: {name}")
+            row[column] = self.evaluate_feature(planes, feature, shelf_region, model_key)
+        return None, row, fingerprint
+    
+    def shift_shelves(self, frame: np.ndarray, shelves: List[Any], frame_scale: float = 1.0) -> Tuple[List[Any], Any]:
+        """Shelves with regions translated by their camera's current offset, and the shift estimate (None if unshifted)"""
+        camera_id = getattr(shelves[0], 'camera_id', None) if shelves else None
+        if self.camera_shift is None or camera_id is None:
+            return shelves, None
+        shift = self.camera_shift.update(camera_id, frame, frame_scale)
+        if shift.offset == (0, 0) and not shift.moved:
+            return shelves, None
+        
+        frame_size = (int(round(frame.shape[1] / frame_scale)), int(round(frame.shape[0] / frame_scale)))
+        shifted = []
         for shelf in shelves:
+            spec = shelf if isinstance(shelf, ShelfSpec) else ShelfSpec.from_shelf(shelf)
+            shifted.append(spec._replace(region=translate_region(spec.region, shift.offset, frame_size)))
+        return shifted, shift
+    
+    def build_results(self, shelves: List[Any], scores: List['ShelfScore']) -> List[Dict[str, Any]]:
+        """Classify scored shelves and decide alerts
+        
+        ``stock_level`` is the shelf's smoothed, stable level; ``state_changed``
+        marks the results where it changed, and only a change to EMPTY can alert.
+        """
+        results = []
+        
+        for shelf, score in zip(shelves, scores):
             try:
-                shelf_region = shelf.region
-                occupancy_score = self.analyze_shelf_occupancy(frame, shelf_region)
-                stock_level = self.classify_stock_level(occupancy_score, shelf.empty_threshold)
+                if score.error is not None:
+                    raise RuntimeError(score.error)
+                shelf_region = score.region if score.region is not None else shelf.region
+                occupancy_score = score.occupancy_score
+                smoothed_score, stock_level, transition = self.shelf_states.update(
+                    shelf.id, occupancy_score, shelf.empty_threshold
+                )
+                
+                # A confirmed restock retakes the reference snapshot from the next frame
+                if transition is not None and transition.restocked and self.get_scoring_mode(shelf) == 'reference':
+                    self.reference_store.invalidate((getattr(shelf, 'camera_id', None), shelf.id))
                 
                 # Determine if alert is needed
-                needs_alert = self.should_alert(shelf.id, occupancy_score, shelf.empty_threshold)
+                needs_alert = (transition is not None and stock_level == "EMPTY" and
+                               self.should_alert(shelf.id, smoothed_score, shelf.empty_threshold))
                 
                 # Determine priority
-                if occupancy_score < 0.05:
+                if smoothed_score < 0.05:
                     priority = "HIGH"
-                elif occupancy_score < shelf.empty_threshold:
+                elif smoothed_score < shelf.empty_threshold:
                     priority = "MEDIUM"
                 else:
                     priority = "LOW"
@@ -159,11 +943,18 @@ class CVProcessor:
                     'shelf_id': shelf.id,
                     'shelf_name': shelf.name,
                     'occupancy_score': occupancy_score,
+                    'smoothed_score': smoothed_score,
                     'stock_level': stock_level,
+                    'state_changed': transition is not None,
+                    'previous_level': transition.previous_level if transition is not None else stock_level,
                     'needs_alert': needs_alert,
                     'priority': priority,
                     'message': message,
-                    'region': shelf_region
+                    'region': shelf_region,
+                    'from_cache': score.from_cache,
+                    'decided_by': score.decided_by,
+                    'region_offset': list(score.region_offset),
+                    'camera_moved': score.camera_moved
                 }
                 
                 results.append(result)
@@ -175,15 +966,125 @@ class CVProcessor:
                     'shelf_name': shelf.name,
                     'error': str(e),
                     'occupancy_score': 0.0,
+                    'smoothed_score': 0.0,
                     'stock_level': 'ERROR',
+                    'state_changed': False,
+                    'previous_level': None,
                     'needs_alert': False,
                     'priority': 'LOW',
                     'message': f"Error processing {shelf.name}",
-                    'region': shelf.region
+                    'region': shelf.region,
+                    'from_cache': False,
+                    'decided_by': None,
+                    'region_offset': [0, 0],
+                    'camera_moved': False
                 })
         
         return results
     
+    def process_frame(self, frame: np.ndarray, shelves: List[Any]) -> List[Dict[str, Any]]:
+        """Process a frame and analyze all shelves"""
+        return self.build_results(shelves, self.score_frame(frame, shelves))
+    
+    def export_settings(self) -> Dict[str, Any]:
+        """Picklable snapshot of the analysis settings, used to configure worker processes"""
+        return {
+            'feature_backend': self.feature_backend,
+            'bg_max_bytes': self.bg_registry.max_bytes if self.bg_registry is not None else None,
+            'analysis_scale': self.analysis_scale,
+            'camera_scales': dict(self.camera_scales),
+            'shelf_scales': dict(self.shelf_scales),
+            'metric_profile': self.metric_profile,
+            'camera_profiles': dict(self.camera_profiles),
+            'cascade': self.cascade,
+            'cascade_margin': self.cascade_margin,
+            'shift_every': self.camera_shift.every if self.camera_shift is not None else None,
+            'shift_moved_threshold': self.camera_shift.moved_threshold if self.camera_shift is not None else None,
+            'shelf_detectors': list(self.shelf_detectors),
+            'detection_iou': self.detection_iou,
+            'scoring_mode': self.scoring_mode,
+            'shelf_modes': dict(self.shelf_modes),
+            'reference_dir': self.reference_store.directory if self.reference_store is not None else None,
+            'reference_threshold': self.reference_store.diff_threshold if self.reference_store is not None else None,
+            'reference_empty_change': self.reference_store.empty_change if self.reference_store is not None else None,
+            'occupancy_model_dir': self.occupancy_models.directory if self.occupancy_models is not None else None,
+            'dnn_model': self.dnn_scorer.model_path if self.dnn_scorer is not None else None,
+            'dnn_input_size': self.dnn_scorer.input_size if self.dnn_scorer is not None else None,
+            'dnn_max_batch': self.dnn_scorer.max_batch if self.dnn_scorer is not None else None,
+        }
+    
+    @classmethod
+    def from_settings(cls, settings: Dict[str, Any]) -> 'CVProcessor':
+        """Build a processor configured like the one ``export_settings`` was called on"""
+        bg_registry = None
+        if settings.get('bg_max_bytes') is not None:
+            bg_registry = BackgroundModelRegistry(max_bytes=settings['bg_max_bytes'])
+        camera_shift = None
+        if settings.get('shift_every') is not None:
+            camera_shift = CameraShiftTracker(every=settings['shift_every'],
+                                              moved_threshold=settings['shift_moved_threshold'])
+        reference_store = None
+        if settings.get('reference_threshold') is not None:
+            reference_store = ReferenceSnapshotStore(settings.get('reference_dir'), settings['reference_threshold'],
+                                                     settings['reference_empty_change'])
+        processor = cls(feature_backend=settings.get('feature_backend', 'planes'), bg_registry=bg_registry)
+        processor.camera_shift = camera_shift
+        processor.reference_store = reference_store
+        processor.occupancy_models = OccupancyModelRegistry(settings.get('occupancy_model_dir'))
+        if settings.get('dnn_model') is not None:
+            processor.dnn_scorer = DnnOccupancyScorer(settings['dnn_model'], settings['dnn_input_size'],
+                                                     max_batch=settings['dnn_max_batch'])
+        processor.apply_settings(settings)
+        return processor
+    
+    def apply_settings(self, settings: Dict[str, Any]):
+        """Take over the runtime-tunable settings of ``export_settings`` (scales, profiles, modes, cascade, detectors)
+        
+        Background models, caches and loaded models are kept; the change gate
+        and scene cache are only invalidated when a setting their entries
+        depend on actually changed.
+        """
+        scoring = (self.analysis_scale, self.camera_scales, self.shelf_scales, self.metric_profile,
+                   self.camera_profiles, self.scoring_mode, self.shelf_modes)
+        detection = (self.shelf_detectors, self.detection_iou)
+        
+        self.analysis_scale = settings.get('analysis_scale', 1.0)
+        self.camera_scales = dict(settings.get('camera_scales', {}))
+        self.shelf_scales = dict(settings.get('shelf_scales', {}))
+        self.metric_profile = settings.get('metric_profile', 'full')
+        self.camera_profiles = dict(settings.get('camera_profiles', {}))
+        self.scoring_mode = settings.get('scoring_mode', 'features')
+        self.shelf_modes = dict(settings.get('shelf_modes', {}))
+        self.set_cascade(settings.get('cascade', False), settings.get('cascade_margin'))
+        self.shelf_detectors = tuple(settings.get('shelf_detectors', shelf_detection.DETECTORS))
+        if settings.get('detection_iou') is not None:
+            self.detection_iou = settings['detection_iou']
+        
+        if self.change_gate is not None and scoring != (
+                self.analysis_scale, self.camera_scales, self.shelf_scales, self.metric_profile,
+                self.camera_profiles, self.scoring_mode, self.shelf_modes):
+            self.change_gate.invalidate()
+        if self.scene_cache is not None and detection != (self.shelf_detectors, self.detection_iou):
+            self.scene_cache.invalidate()
+    
+    def background_snapshot(self) -> List[Tuple[Any, int, np.ndarray]]:
+        """Learned background images of this processor's models, for a snapshot written by another process"""
+        return self.bg_registry.snapshot() if self.bg_registry is not None else []
+    
+    def reset_camera(self, camera_id: Any):
+        """Forget a camera's reference view and cached shelf detections, e.g. after its shelves were re-drawn"""
+        if self.camera_shift is not None:
+            self.camera_shift.reset(camera_id)
+        if self.scene_cache is not None:
+            self.scene_cache.invalidate(camera_id)
+    
+    def reload_occupancy_models(self) -> int:
+        """Re-read the occupancy model directory; cached scores of the old models are dropped"""
+        loaded = self.occupancy_models.reload() if self.occupancy_models is not None else 0
+        if self.change_gate is not None:
+            self.change_gate.invalidate()
+        return loaded
+    
     def draw_analysis_overlay(self, frame: np.ndarray, results: List[Dict[str, Any]]) -> np.ndarray:
         """Draw analysis overlay on frame"""
         overlay_frame = frame.copy()
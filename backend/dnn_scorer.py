@@ -0,0 +1,103 @@
+import cv2
+import numpy as np
+import os
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class DnnModelCache:
+    """Loaded cv2.dnn networks keyed by model path, reloaded when the file changes.
+
+    A ``cv2.dnn.Net`` is not safe to run from several threads at once, so each
+    cached network comes with its own lock.
+    """
+
+    def __init__(self):
+        self._nets: Dict[str, Tuple[int, Any, threading.Lock]] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+
+    def get(self, path: str) -> Tuple[Any, threading.Lock]:
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._nets.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1], cached[2]
+            # Default backend and target: OpenCV's own implementation on the CPU
+            net = cv2.dnn.readNet(path)
+            self._nets[path] = (mtime, net, threading.Lock())
+            self.loads += 1
+            logger.info(f"Loaded DNN occupancy model {path}")
+            return net, self._nets[path][2]
+
+    def clear(self):
+        with self._lock:
+            self._nets.clear()
+
+# One cache per process, shared by every scorer
+MODEL_CACHE = DnnModelCache()
+
+class DnnOccupancyScorer:
+    """Scores shelf ROIs with a small CNN through cv2.dnn on the CPU.
+
+    The ROIs of a frame are resized to ``input_size`` (width, height) and scored
+    in ``blobFromImages`` batches of at most ``max_batch`` ROIs, one forward
+    pass each. Larger blobs stop paying off: on bench_dnn.py batches of 16 are
+    1.2-1.8x faster than one pass per ROI at 32 px and about even at 64 px,
+    where a single pass over 50-200 ROIs is 0.8-0.9x. The model must output an
+    (N, 1) occupancy in [0, 1], or (N, 2) logits of (empty, stocked). Networks
+    are loaded lazily through ``MODEL_CACHE``, so a scorer is cheap to create
+    and to send to worker processes.
+    """
+
+    def __init__(self, model_path: str, input_size: Tuple[int, int] = (64, 64), scale: float = 1 / 255.0,
+                 mean: Sequence[float] = (0.0, 0.0, 0.0), swap_rb: bool = False, max_batch: int = 16):
+        if max_batch < 1:
+            raise ValueError(f"DNN max batch must be at least 1, got {max_batch}")
+        self.model_path = model_path
+        self.input_size = tuple(input_size)
+        self.scale = scale
+        self.mean = tuple(mean)
+        self.swap_rb = swap_rb
+        self.max_batch = max_batch
+        self.batches = 0
+        self.rois = 0
+
+    def score(self, rois: List[np.ndarray]) -> np.ndarray:
+        """Occupancy scores for a list of BGR ROIs"""
+        if not rois:
+            return np.zeros(0)
+        net, lock = MODEL_CACHE.get(self.model_path)
+        outputs = []
+        for start in range(0, len(rois), self.max_batch):
+            chunk = rois[start:start + self.max_batch]
+            blob = cv2.dnn.blobFromImages(chunk, self.scale, self.input_size, self.mean, self.swap_rb, crop=False)
+            with lock:
+                net.setInput(blob)
+                outputs.append(net.forward().reshape(len(chunk), -1))
+            self.batches += 1
+        output = np.concatenate(outputs)
+        self.rois += len(rois)
+
+        if output.shape[1] == 1:
+            return np.clip(output[:, 0], 0.0, 1.0).astype(np.float64)
+        if output.shape[1] == 2:
+            logits = output - output.max(axis=1, keepdims=True)
+            probabilities = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+            return probabilities[:, 1].astype(np.float64)
+        raise ValueError(f"DNN occupancy model must output 1 or 2 values per ROI, got {output.shape[1]}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {'model': self.model_path, 'input_size': list(self.input_size), 'max_batch': self.max_batch,
+                'batches': self.batches,
+                'rois': self.rois, 'model_loads': MODEL_CACHE.loads}
+
+def parse_input_size(value: str) -> Tuple[int, int]:
+    """Parse an input size given as "64" or "96x48" into (width, height)"""
+    width, _, height = value.lower().partition("x")
+    size = (int(width), int(height or width))
+    if min(size) < 3:
+        raise ValueError(f"DNN input size must be at least 3x3, got {value}")
+    return size
@@ -0,0 +1,261 @@
+import argparse
+import os
+import threading
+import time
+import logging
+from multiprocessing import resource_tracker, shared_memory
+from typing import NamedTuple, Optional, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RING_URL_PREFIX = "shm://"
+
+_MAGIC = 0x474E4952  # "RING"
+_HEADER_SIZE = 8  # int64 fields: magic, slots, height, width, channels, write_seq, reserved x2
+_WRITING = -1
+_attach_lock = threading.Lock()
+
+class StaleFrameError(Exception):
+    """Raised when a ring slot was overwritten before the reader was done with it"""
+    pass
+
+class FrameRef(NamedTuple):
+    """Picklable handle to a frame in a FrameRing; a few bytes instead of the frame itself"""
+    ring_name: str
+    seq: int
+
+def _open_shared_memory(name: str) -> shared_memory.SharedMemory:
+    """Attach without registering the segment with this process's resource tracker.
+
+    Readers must not unlink the segment when they exit; only the creating
+    process owns it.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    # Python < 3.13 always registers the segment (bpo-39959). Unregistering
+    # afterwards is not an option: pool workers share the creator's tracker,
+    # so it would drop the creator's registration too.
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+class FrameRing:
+    """Fixed-size ring of frame slots in shared memory, for one writer and any number of readers.
+
+    Layout: an int64 header, one int64 sequence number and one float64
+    timestamp per slot, then ``slots`` frames of ``shape`` uint8 pixels. The
+    writer marks a slot as being written before copying into it and stamps it
+    with the frame's sequence number afterwards, so readers can take zero-copy
+    views and check with ``is_current`` that the slot was not reused while they
+    worked on it. A reader has ``slots - 1`` writes' worth of time per frame.
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+
+        header = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        if header[0] != _MAGIC:
+            raise ValueError(f"Shared memory segment {shm.name} is not a frame ring")
+        self.slots = int(header[1])
+        self.shape = (int(header[2]), int(header[3]), int(header[4]))
+
+        offset = header.nbytes
+        self._header = header
+        self._slot_seq = np.ndarray((self.slots,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        offset += self._slot_seq.nbytes
+        self._slot_time = np.ndarray((self.slots,), dtype=np.float64, buffer=shm.buf, offset=offset)
+        offset += self._slot_time.nbytes
+        self._data = np.ndarray((self.slots,) + self.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)
+
+    @staticmethod
+    def nbytes(shape: Tuple[int, int, int], slots: int) -> int:
+        return 8 * (_HEADER_SIZE + 2 * slots) + slots * int(np.prod(shape))
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...], slots: int = 8, name: Optional[str] = None) -> "FrameRing":
+        """Allocate a new ring for frames of ``shape`` (gray frames get one channel)"""
+        if len(shape) == 2:
+            shape = (shape[0], shape[1], 1)
+        if slots < 2:
+            raise ValueError("A frame ring needs at least 2 slots")
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.nbytes(shape, slots))
+        header = np.ndarray((_HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        header[:] = [_MAGIC, slots, shape[0], shape[1], shape[2], 0, 0, 0]
+        np.ndarray((slots,), dtype=np.int64, buffer=shm.buf, offset=header.nbytes)[:] = 0
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "FrameRing":
+        """Open an existing ring by name (as published by another process)"""
+        return cls(_open_shared_memory(name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def latest_seq(self) -> int:
+        return int(self._header[5])
+
+    def write(self, frame: np.ndarray, timestamp: Optional[float] = None) -> int:
+        """Copy a frame into the next slot and return its sequence number"""
+        if frame.ndim == 2:
+            frame = frame[:, :, None]
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match ring shape {self.shape}")
+
+        seq = self.latest_seq + 1
+        slot = seq % self.slots
+        self._slot_seq[slot] = _WRITING
+        np.copyto(self._data[slot], frame)
+        self._slot_time[slot] = time.time() if timestamp is None else timestamp
+        self._slot_seq[slot] = seq
+        self._header[5] = seq
+        return seq
+
+    def is_current(self, seq: int) -> bool:
+        """Whether the slot holding ``seq`` still contains that frame"""
+        return seq > 0 and int(self._slot_seq[seq % self.slots]) == seq
+
+    def get(self, seq: int) -> np.ndarray:
+        """Zero-copy, read-only view of frame ``seq``; re-check ``is_current`` after using it"""
+        if not self.is_current(seq):
+            raise StaleFrameError(f"Frame {seq} is no longer in ring {self.name}")
+        view = self._data[seq % self.slots]
+        if self.shape[2] == 1:
+            view = view[:, :, 0]
+        view = view.view()
+        view.flags.writeable = False
+        return view
+
+    def latest(self, after_seq: int = 0) -> Optional[Tuple[int, np.ndarray]]:
+        """Newest frame as (seq, view), or None if nothing newer than ``after_seq`` was written"""
+        seq = self.latest_seq
+        if seq <= after_seq:
+            return None
+        try:
+            return seq, self.get(seq)
+        except StaleFrameError:
+            return None
+
+    def timestamp(self, seq: int) -> float:
+        return float(self._slot_time[seq % self.slots])
+
+    def close(self):
+        self._header = self._slot_seq = self._slot_time = self._data = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class FrameRingCapture:
+    """cv2.VideoCapture-style reader over a FrameRing, so capture code can consume shared frames.
+
+    ``read()`` returns a private copy, because display code draws on the frame
+    it gets back; analysis code that only reads should use ``read_view()``.
+    """
+
+    def __init__(self, name: str, timeout: float = 5.0, poll_interval: float = 0.002):
+        if name.startswith(RING_URL_PREFIX):
+            name = name[len(RING_URL_PREFIX):]
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.last_seq = 0
+        try:
+            self.ring: Optional[FrameRing] = FrameRing.attach(name)
+        except (FileNotFoundError, ValueError) as e:
+            logger.error(f"Failed to attach frame ring {name}: {str(e)}")
+            self.ring = None
+
+    def isOpened(self) -> bool:
+        return self.ring is not None
+
+    def read_view(self) -> Tuple[bool, Optional[np.ndarray]]:
+        """Wait for the next frame and return a zero-copy view of it"""
+        if self.ring is None:
+            return False, None
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            latest = self.ring.latest(self.last_seq)
+            if latest is not None:
+                self.last_seq, view = latest
+                return True, view
+            time.sleep(self.poll_interval)
+        return False, None
+
+    def read(self) -> Tuple[bool, Optional[np.ndarray]]:
+        ret, view = self.read_view()
+        return ret, (view.copy() if ret else None)
+
+    def get(self, prop_id: int) -> float:
+        if self.ring is None:
+            return 0.0
+        if prop_id == cv2.CAP_PROP_FRAME_WIDTH:
+            return float(self.ring.shape[1])
+        if prop_id == cv2.CAP_PROP_FRAME_HEIGHT:
+            return float(self.ring.shape[0])
+        return 0.0
+
+    def set(self, prop_id: int, value: float) -> bool:
+        # Resolution and frame rate belong to the publishing process
+        return False
+
+    def release(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+def open_capture(source):
+    """Open a ``shm://<name>`` frame ring or anything cv2.VideoCapture accepts"""
+    if isinstance(source, str) and source.startswith(RING_URL_PREFIX):
+        return FrameRingCapture(source)
+    return cv2.VideoCapture(source)
+
+def publish(source, name: str, slots: int = 8):
+    """Capture from ``source`` and publish every frame into a ring named ``name``"""
+    cap = cv2.VideoCapture(int(source) if str(source).isdigit() else source)
+    if not cap.isOpened():
+        raise ValueError(f"Failed to open camera source: {source}")
+
+    # Play video files back at their native frame rate rather than as fast as they decode
+    frame_interval = 0.0
+    if os.path.exists(str(source)):
+        fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+        frame_interval = 1.0 / fps if fps > 0 else 1.0 / 30
+
+    ring = None
+    try:
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if ring is None:
+                ring = FrameRing.create(frame.shape, slots=slots, name=name)
+                logger.info(f"Publishing {source} to {RING_URL_PREFIX}{ring.name} ({ring.shape}, {slots} slots)")
+            ring.write(frame)
+            if frame_interval:
+                time.sleep(frame_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cap.release()
+        if ring is not None:
+            ring.close()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Publish a camera stream into a shared-memory frame ring")
+    parser.add_argument("source", help="Camera index, RTSP/HTTP URL or video file")
+    parser.add_argument("--name", required=True, help="Ring name; readers open shm://<name>")
+    parser.add_argument("--slots", type=int, default=8)
+    args = parser.parse_args()
+    publish(args.source, args.name, args.slots)
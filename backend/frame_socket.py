@@ -0,0 +1,91 @@
+import asyncio
+import json
+import struct
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from fastapi import WebSocket
+
+logger = logging.getLogger(__name__)
+
+# Binary frame messages: a big-endian uint32 camera id, then the encoded (JPEG) image
+FRAME_HEADER = struct.Struct(">I")
+
+def parse_frame_message(data: bytes) -> Tuple[int, bytes]:
+    """Split a binary frame message into (camera_id, image bytes)"""
+    if len(data) <= FRAME_HEADER.size:
+        raise ValueError("Frame messages must be a 4-byte big-endian camera id followed by the image")
+    (camera_id,) = FRAME_HEADER.unpack_from(data)
+    return camera_id, data[FRAME_HEADER.size:]
+
+class FrameSocketSession:
+    """One client's frame upload socket: binary frames in, analysis results out.
+
+    Each camera has a latest-frame-wins slot: a frame that arrives while the
+    previous one of that camera is still waiting replaces it, so a client that
+    sends faster than frames are analysed gets results for its newest frames
+    instead of a growing backlog. Frames are analysed one at a time per
+    socket, oldest waiting camera first, and ``analyze(camera_id, image)``'s
+    result is sent back on the same socket as a "results" message.
+    """
+
+    def __init__(self, websocket: WebSocket, analyze: Callable[[int, bytes], Awaitable[Dict[str, Any]]],
+                 max_frame_bytes: int = 8 * 1024 * 1024):
+        self.websocket = websocket
+        self.analyze = analyze
+        self.max_frame_bytes = max_frame_bytes
+        self.pending: Dict[int, Tuple[int, bytes]] = {}
+        self._ready = asyncio.Event()
+        self.received = 0
+        self.analysed = 0
+        self.dropped = 0
+
+    async def send(self, message: Dict[str, Any]):
+        await self.websocket.send_text(json.dumps(message))
+
+    async def run(self):
+        """Receive frames until the client disconnects"""
+        worker = asyncio.create_task(self._analyze_loop())
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                data = message.get("bytes")
+                if data is None:
+                    # Text messages are keep-alives
+                    await self.send({"type": "pong"})
+                    continue
+                try:
+                    if len(data) > self.max_frame_bytes + FRAME_HEADER.size:
+                        raise ValueError(f"Frame larger than {self.max_frame_bytes} bytes")
+                    camera_id, image = parse_frame_message(data)
+                except ValueError as e:
+                    await self.send({"type": "error", "detail": str(e)})
+                    continue
+                self.received += 1
+                if camera_id in self.pending:
+                    self.dropped += 1
+                self.pending[camera_id] = (self.received, image)
+                self._ready.set()
+        finally:
+            worker.cancel()
+
+    async def _analyze_loop(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+            while self.pending:
+                camera_id = next(iter(self.pending))
+                frame, image = self.pending.pop(camera_id)
+                try:
+                    response = await self.analyze(camera_id, image)
+                except Exception as e:
+                    await self.send({"type": "error", "camera_id": camera_id, "frame": frame, "detail": str(e)})
+                    continue
+                self.analysed += 1
+                await self.send({"type": "results", "camera_id": camera_id, "frame": frame,
+                                 "dropped": self.dropped, **response})
+
+    def stats(self) -> Dict[str, int]:
+        return {'received': self.received, 'analysed': self.analysed, 'dropped': self.dropped}
@@ -0,0 +1,250 @@
+import asyncio
+import os
+import threading
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from frame_ring import open_capture
+from sampling_scheduler import SamplingScheduler
+
+logger = logging.getLogger(__name__)
+
+class LatestFrameSlot:
+    """Single-frame slot where the newest frame always wins; readers never see a backlog"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frame: Optional[np.ndarray] = None
+        self.seq = 0
+        self.timestamp = 0.0
+
+    def put(self, frame: np.ndarray):
+        with self._lock:
+            self._frame = frame
+            self.seq += 1
+            self.timestamp = time.monotonic()
+
+    def get(self, after_seq: int = 0) -> Optional[Tuple[int, np.ndarray]]:
+        """Return (seq, frame) if a frame newer than ``after_seq`` is available"""
+        with self._lock:
+            if self._frame is None or self.seq <= after_seq:
+                return None
+            return self.seq, self._frame
+
+class CameraIngestor:
+    """Capture thread for one camera stream, reconnecting with exponential backoff.
+
+    Frames are read as fast as the source delivers them and written to a
+    LatestFrameSlot; sampling for analysis happens elsewhere. Local video files
+    are paced at their native frame rate and looped, which makes file-based
+    streams usable for local testing. ``shm://<name>`` reads from a frame ring
+    published by a separate capture process.
+    """
+
+    def __init__(self, camera_id: int, url: str, on_status: Optional[Callable[[int, str], None]] = None,
+                 min_backoff: float = 1.0, max_backoff: float = 60.0,
+                 capture_factory: Callable[[str], Any] = open_capture):
+        self.camera_id = camera_id
+        self.url = url
+        self.on_status = on_status
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.capture_factory = capture_factory
+
+        self.slot = LatestFrameSlot()
+        self.status = "starting"
+        self.reconnects = 0
+        self.frames_read = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"ingest-{camera_id}", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _set_status(self, status: str):
+        if status == self.status:
+            return
+        self.status = status
+        logger.info(f"Camera {self.camera_id} stream {status}")
+        if self.on_status is not None:
+            try:
+                self.on_status(self.camera_id, status)
+            except Exception as e:
+                logger.error(f"Error updating status for camera {self.camera_id}: {str(e)}")
+
+    def _run(self):
+        backoff = self.min_backoff
+        is_file = os.path.exists(self.url)
+
+        while not self._stop.is_set():
+            cap = self.capture_factory(self.url)
+            if cap is None or not cap.isOpened():
+                self._set_status("offline")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                self.reconnects += 1
+                continue
+
+            self._set_status("active")
+            backoff = self.min_backoff
+            frame_interval = 0.0
+            if is_file:
+                fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+                frame_interval = 1.0 / fps if fps > 0 else 1.0 / 30
+
+            try:
+                while not self._stop.is_set():
+                    ret, frame = cap.read()
+                    if not ret:
+                        break
+                    self.slot.put(frame)
+                    self.frames_read += 1
+                    if frame_interval:
+                        self._stop.wait(frame_interval)
+            finally:
+                cap.release()
+
+            if not self._stop.is_set() and not is_file:
+                # Stream dropped; files simply loop from the start
+                self._set_status("offline")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                self.reconnects += 1
+
+class IngestionSupervisor:
+    """Runs one CameraIngestor per active camera and samples their latest frames into the CV pipeline.
+
+    ``analyze`` is an async callable ``(camera_id, frame)``. Each camera is
+    sampled at most once per ``sample_interval`` seconds, and a camera whose
+    previous sample is still being analysed is skipped rather than queued.
+    When ``list_cameras`` is given, the set of streams is re-synced from it every
+    ``refresh_interval`` seconds.
+
+    With a ``scheduler`` (see ``SamplingScheduler``) a camera is only sampled
+    once one of its shelves is due, the most overdue cameras go first, and each
+    sample has to fit the scheduler's global frame budget.
+    """
+
+    def __init__(self, analyze: Callable[[int, np.ndarray], Awaitable[Any]], sample_interval: float = 1.0,
+                 on_status: Optional[Callable[[int, str], None]] = None,
+                 list_cameras: Optional[Callable[[], List[Tuple[int, str]]]] = None,
+                 refresh_interval: float = 30.0, tick: float = 0.05,
+                 scheduler: Optional[SamplingScheduler] = None):
+        self.analyze = analyze
+        self.sample_interval = sample_interval
+        self.on_status = on_status
+        self.list_cameras = list_cameras
+        self.refresh_interval = refresh_interval
+        self.tick = tick
+        self.scheduler = scheduler
+
+        self.ingestors: Dict[int, CameraIngestor] = {}
+        self._last_seq: Dict[int, int] = {}
+        self._last_sample: Dict[int, float] = {}
+        self._busy: set = set()
+        self._task: Optional[asyncio.Task] = None
+        self.samples = 0
+        self.skipped_busy = 0
+
+    def sync(self, cameras: List[Tuple[int, str]]):
+        """Start ingestors for new (camera_id, url) pairs and stop those no longer listed"""
+        wanted = {camera_id: url for camera_id, url in cameras if url}
+        for camera_id in list(self.ingestors):
+            if wanted.get(camera_id) != self.ingestors[camera_id].url:
+                self.ingestors.pop(camera_id).stop(timeout=0)
+                self._last_seq.pop(camera_id, None)
+                if self.scheduler is not None:
+                    self.scheduler.discard_camera(camera_id)
+        for camera_id, url in wanted.items():
+            if camera_id not in self.ingestors:
+                ingestor = CameraIngestor(camera_id, url, on_status=self.on_status)
+                self.ingestors[camera_id] = ingestor
+                ingestor.start()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._sample_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for ingestor in self.ingestors.values():
+            ingestor.stop(timeout=0)
+        self.ingestors.clear()
+
+    async def _analyze(self, camera_id: int, frame: np.ndarray):
+        try:
+            await self.analyze(camera_id, frame)
+        except Exception as e:
+            logger.error(f"Error analysing ingested frame for camera {camera_id}: {str(e)}")
+        finally:
+            self._busy.discard(camera_id)
+
+    async def _sample_loop(self):
+        loop = asyncio.get_running_loop()
+        last_refresh = None
+        while True:
+            now = time.monotonic()
+            if self.list_cameras is not None and (last_refresh is None or now - last_refresh >= self.refresh_interval):
+                last_refresh = now
+                try:
+                    self.sync(self.list_cameras())
+                except Exception as e:
+                    logger.error(f"Error refreshing ingested cameras: {str(e)}")
+            candidates = []
+            for camera_id, ingestor in list(self.ingestors.items()):
+                if now - self._last_sample.get(camera_id, 0.0) < self.sample_interval:
+                    continue
+                due = self.scheduler.camera_due(camera_id) if self.scheduler is not None else 0.0
+                if due > now:
+                    continue
+                latest = ingestor.slot.get(self._last_seq.get(camera_id, 0))
+                if latest is None:
+                    continue
+                if camera_id in self._busy:
+                    self.skipped_busy += 1
+                    continue
+                candidates.append((due, camera_id, latest))
+
+            # Most overdue first, so a tight frame budget goes where it is needed most
+            candidates.sort(key=lambda candidate: candidate[0])
+            for _, camera_id, (seq, frame) in candidates:
+                if self.scheduler is not None:
+                    if not self.scheduler.try_acquire(now):
+                        break
+                    self.scheduler.sampled_camera(camera_id, now)
+                self._last_seq[camera_id] = seq
+                self._last_sample[camera_id] = now
+                self._busy.add(camera_id)
+                self.samples += 1
+                loop.create_task(self._analyze(camera_id, frame))
+            await asyncio.sleep(self.tick)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'cameras': {
+                camera_id: {
+                    'status': ingestor.status,
+                    'frames_read': ingestor.frames_read,
+                    'reconnects': ingestor.reconnects,
+                }
+                for camera_id, ingestor in self.ingestors.items()
+            },
+            'samples': self.samples,
+            'skipped_busy': self.skipped_busy,
+            'scheduler': self.scheduler.stats() if self.scheduler is not None else None,
+        }
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple, Union
+
+import cv2
+import numpy as np
+
+from cv_executor import decode_image
+
+logger = logging.getLogger(__name__)
+
+MJPEG_BOUNDARY = "frame"
+
+class CameraStream:
+    """Newest annotated frame of one camera, already framed as a multipart part"""
+
+    def __init__(self):
+        self.part: Optional[bytes] = None
+        self.seq = 0
+        self.viewers = 0
+        self.replaced = 0
+        self.skipped = 0
+        # Set and swapped for a fresh event whenever a new part is stored
+        self.updated = asyncio.Event()
+        # Frame waiting for the encoder while the previous one is still being encoded
+        self.pending: Optional[Tuple[Union[bytes, np.ndarray], List[Dict[str, Any]]]] = None
+        self.encoding = False
+
+class LiveStreamHub:
+    """Annotated MJPEG streams of analysed frames, encoded once per frame and shared by every viewer.
+
+    ``publish`` is a no-op for cameras nobody is watching. Otherwise the
+    analysis overlay is drawn and the frame JPEG-encoded once, off the event
+    loop, and stored as the camera's latest multipart part. Each viewer sends
+    whatever part is latest whenever its connection is ready for more, so a
+    slow viewer skips frames instead of queueing them, and ten viewers of one
+    camera cost one encode. Frames published while the previous one is still
+    being encoded replace each other; only the newest is encoded.
+    """
+
+    def __init__(self, draw: Callable[[np.ndarray, List[Dict[str, Any]]], np.ndarray], quality: int = 80,
+                 max_width: int = 1280, keepalive: float = 5.0):
+        self.draw = draw
+        self.quality = quality
+        self.max_width = max_width
+        self.keepalive = keepalive
+        self.streams: Dict[Any, CameraStream] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _stream(self, camera_id: Any) -> CameraStream:
+        stream = self.streams.get(camera_id)
+        if stream is None:
+            stream = self.streams[camera_id] = CameraStream()
+        return stream
+
+    def viewers(self, camera_id: Any) -> int:
+        stream = self.streams.get(camera_id)
+        return stream.viewers if stream is not None else 0
+
+    def publish(self, camera_id: Any, image: Union[bytes, np.ndarray], results: List[Dict[str, Any]]):
+        """Queue an analysed frame (encoded bytes or a BGR frame) and its results for the camera's viewers"""
+        stream = self.streams.get(camera_id)
+        if stream is None or stream.viewers == 0:
+            return
+        if stream.pending is not None:
+            stream.replaced += 1
+        stream.pending = (image, results)
+        if not stream.encoding:
+            stream.encoding = True
+            task = asyncio.get_running_loop().create_task(self._encode_pending(camera_id, stream))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _encode_pending(self, camera_id: Any, stream: CameraStream):
+        loop = asyncio.get_running_loop()
+        try:
+            while stream.pending is not None and stream.viewers > 0:
+                image, results = stream.pending
+                stream.pending = None
+                try:
+                    part = await loop.run_in_executor(None, self.encode_part, image, results)
+                except Exception as e:
+                    logger.error(f"Error encoding live stream frame for camera {camera_id}: {str(e)}")
+                    continue
+                stream.part = part
+                stream.seq += 1
+                updated, stream.updated = stream.updated, asyncio.Event()
+                updated.set()
+        finally:
+            stream.pending = None
+            stream.encoding = False
+
+    def encode_part(self, image: Union[bytes, np.ndarray], results: List[Dict[str, Any]]) -> bytes:
+        """Overlay, downscale and JPEG-encode a frame into one multipart/x-mixed-replace part"""
+        frame = decode_image(image) if not isinstance(image, np.ndarray) else image
+        frame = self.draw(frame, results)
+        if self.max_width and frame.shape[1] > self.max_width:
+            height = max(1, int(round(frame.shape[0] * self.max_width / frame.shape[1])))
+            frame = cv2.resize(frame, (self.max_width, height), interpolation=cv2.INTER_AREA)
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        header = f"--{MJPEG_BOUNDARY}\r\nContent-Type: image/jpeg\r\nContent-Length: {len(jpeg)}\r\n\r\n"
+        return header.encode() + jpeg.tobytes() + b"\r\n"
+
+    async def parts(self, camera_id: Any, is_disconnected: Callable[[], Awaitable[bool]]) -> AsyncIterator[bytes]:
+        """Multipart parts for one viewer: the latest part whenever a newer one is stored
+
+        Without new frames the viewer is checked for a disconnect every
+        ``keepalive`` seconds, so idle streams do not pin a viewer slot.
+        """
+        stream = self._stream(camera_id)
+        stream.viewers += 1
+        sent_seq = 0
+        try:
+            while True:
+                if stream.seq > sent_seq:
+                    if sent_seq:
+                        stream.skipped += stream.seq - sent_seq - 1
+                    sent_seq = stream.seq
+                    yield stream.part
+                    continue
+                try:
+                    await asyncio.wait_for(stream.updated.wait(), self.keepalive)
+                except asyncio.TimeoutError:
+                    if await is_disconnected():
+                        return
+        finally:
+            stream.viewers -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            camera_id: {'viewers': stream.viewers, 'encodes': stream.seq, 'replaced': stream.replaced,
+                        'skipped': stream.skipped, 'part_bytes': len(stream.part) if stream.part else 0}
+            for camera_id, stream in self.streams.items()
+        }
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, WebSocket, WebSocketDisconnect, UploadFile, File, Form
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict
@@ -9,17 +10,32 @@ import json
 import cv2
 import numpy as np
 from datetime import datetime, timedelta
+from email.utils import formatdate
 import base64
 from io import BytesIO
 from PIL import Image
 import os
 import logging
 
-from database import get_db, engine
+from database import get_db, engine, SessionLocal
 from models import *
 from schemas import *
-from auth import create_access_token, verify_token, get_current_user, hash_password, verify_password
-from cv_processor import CVProcessor
+from auth import (create_access_token, verify_token, get_current_user, get_user_from_header_or_query, get_user_from_token,
+                  hash_password, verify_password)
+from cv_processor import CVProcessor, ShelfSpec
+from cv_executor import CVWorkerPool, ImageDecodeError, QueueFullError
+from bg_registry import BackgroundModelRegistry
+from camera_shift import CameraShiftTracker
+from dnn_scorer import DnnOccupancyScorer, parse_input_size
+from occupancy_model import OccupancyModelRegistry
+from reference_store import ReferenceSnapshotStore
+from frame_socket import FrameSocketSession
+from ingestion import IngestionSupervisor
+from live_stream import LiveStreamHub, MJPEG_BOUNDARY
+from metrics import CONTENT_TYPE, FRAME_RATE, FRAME_SECONDS, FRAMES, REGISTRY, STAGE_SECONDS, timed
+from sampling_scheduler import SamplingScheduler
+from snapshot_cache import SnapshotCache
+from shelf_state import ShelfStateTracker
 from notification_system import NotificationSystem
 
 # Configure logging
@@ -44,8 +60,59 @@ app.add_middleware(
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 # Initialize systems
-cv_processor = CVProcessor()
+bg_registry = BackgroundModelRegistry(max_bytes=int(os.getenv("CV_BG_MAX_MB", "256")) * 1024 * 1024)
+shelf_states = ShelfStateTracker(
+    alpha=float(os.getenv("CV_STATE_ALPHA", "0.3")),
+    hysteresis=float(os.getenv("CV_STATE_HYSTERESIS", "0.03")),
+    min_dwell=float(os.getenv("CV_STATE_DWELL", "10"))
+)
+camera_shift = CameraShiftTracker(
+    every=int(os.getenv("CV_SHIFT_EVERY", "10")),
+    moved_threshold=float(os.getenv("CV_SHIFT_MOVED_PX", "40"))
+)
+# Reference snapshots are files, so they survive restarts and are shared with worker processes
+reference_store = ReferenceSnapshotStore(
+    directory=os.getenv("CV_REFERENCE_DIR", "reference_snapshots"),
+    diff_threshold=int(os.getenv("CV_REFERENCE_DIFF", "50")),
+    empty_change=float(os.getenv("CV_REFERENCE_EMPTY_CHANGE", "0.6"))
+)
+# Learned occupancy models written by train_occupancy.py
+occupancy_models = OccupancyModelRegistry(os.getenv("CV_MODEL_DIR", "occupancy_models"))
+# Optional CNN (e.g. written by tiny_occupancy_cnn.py) for shelves in the "cnn" scoring mode
+dnn_scorer = None
+if os.getenv("CV_DNN_MODEL"):
+    dnn_scorer = DnnOccupancyScorer(os.getenv("CV_DNN_MODEL"), parse_input_size(os.getenv("CV_DNN_INPUT_SIZE", "64")),
+                                    max_batch=int(os.getenv("CV_DNN_MAX_BATCH", "16")))
+    if not os.path.exists(dnn_scorer.model_path):
+        logger.warning(f"DNN occupancy model {dnn_scorer.model_path} does not exist")
+cv_processor = CVProcessor(feature_backend=os.getenv("CV_FEATURE_BACKEND", "planes"), bg_registry=bg_registry,
+                           shelf_states=shelf_states, camera_shift=camera_shift, reference_store=reference_store,
+                           occupancy_models=occupancy_models, dnn_scorer=dnn_scorer)
+cv_processor.set_analysis_scale(float(os.getenv("CV_ANALYSIS_SCALE", "1.0")))
+cv_processor.set_metric_profile(os.getenv("CV_METRIC_PROFILE", "full"))
+cv_processor.set_scoring_mode(os.getenv("CV_SCORING_MODE", "features"))
+cv_processor.set_cascade(os.getenv("CV_CASCADE", "0") == "1", float(os.getenv("CV_CASCADE_MARGIN", "0.02")))
+cv_processor.set_shelf_detectors(os.getenv("CV_SHELF_DETECTORS", "contours,lines").split(","),
+                                 float(os.getenv("CV_DETECTION_IOU", "0.4")))
+# Background model snapshots, so a restart does not need ~500 frames of warm-up
+BG_SNAPSHOT_PATH = os.getenv("CV_BG_SNAPSHOT", "bg_models.npz")
+cv_pool = CVWorkerPool(
+    cv_processor,
+    kind=os.getenv("CV_EXECUTOR", "thread"),
+    max_workers=int(os.getenv("CV_WORKERS", "0")) or None,
+    max_queue=int(os.getenv("CV_QUEUE_SIZE", "32")),
+    bg_snapshot=BG_SNAPSHOT_PATH,
+    max_worker_rings=int(os.getenv("CV_WORKER_MAX_RINGS", "16"))
+)
 notification_system = NotificationSystem()
+# Annotated MJPEG streams; frames are only drawn and encoded for cameras with viewers
+live_streams = LiveStreamHub(
+    cv_processor.draw_analysis_overlay,
+    quality=int(os.getenv("STREAM_JPEG_QUALITY", "80")),
+    max_width=int(os.getenv("STREAM_MAX_WIDTH", "1280"))
+)
+# Last received or ingested frame per camera, for dashboard previews
+snapshot_cache = SnapshotCache(max_bytes=int(os.getenv("SNAPSHOT_CACHE_MB", "64")) * 1024 * 1024)
 
 # Security
 security = HTTPBearer()
@@ -74,6 +141,22 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+@app.on_event("startup")
+async def load_background_models():
+    # Process workers load the snapshot themselves and own the models
+    if cv_pool.kind == "thread":
+        bg_registry.load(BG_SNAPSHOT_PATH)
+
+@app.on_event("shutdown")
+async def save_background_models():
+    if ingestion is not None:
+        await ingestion.stop()
+    try:
+        await cv_pool.save_background_models(BG_SNAPSHOT_PATH)
+    except Exception as e:
+        logger.error(f"Failed to save background models: {str(e)}")
+    cv_pool.shutdown()
+
 # Authentication endpoints
 @app.post("/api/auth/register", response_model=UserResponse)
 async def register(user: UserCreate, db: Session = Depends(get_db)):
@@ -172,6 +255,41 @@ async def update_camera_status(camera_id: int, status: str, db: Session = Depend
     db.commit()
     return {"message": "Camera status updated"}
 
+@app.put("/api/cameras/{camera_id}/cv-settings")
+async def update_camera_cv_settings(camera_id: int, settings: CameraCVSettings, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    camera = db.query(Camera).join(Store).filter(
+        Camera.id == camera_id, 
+        Store.owner_id == current_user.id
+    ).first()
+    if not camera:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    
+    try:
+        if settings.analysis_scale is not None:
+            cv_processor.set_analysis_scale(settings.analysis_scale, camera_id=camera_id)
+        if settings.metric_profile is not None:
+            cv_processor.set_metric_profile(settings.metric_profile, camera_id=camera_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await cv_pool.reconfigure()
+    if sampling_scheduler is not None:
+        sampling_scheduler.wake(camera_id=camera_id)
+    return {"message": "Camera CV settings updated"}
+
+@app.post("/api/cameras/{camera_id}/reset-reference")
+async def reset_camera_reference(camera_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Take the camera's next frame as its new reference view, e.g. after its shelf regions were re-drawn"""
+    camera = db.query(Camera).join(Store).filter(
+        Camera.id == camera_id, 
+        Store.owner_id == current_user.id
+    ).first()
+    if not camera:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    
+    cv_processor.reset_camera(camera_id)
+    await cv_pool.apply_to_workers(CVProcessor.reset_camera, camera_id)
+    return {"message": "Camera reference reset"}
+
 # Shelf endpoints
 @app.post("/api/shelves", response_model=ShelfResponse)
 async def create_shelf(shelf: ShelfCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -187,6 +305,8 @@ async def create_shelf(shelf: ShelfCreate, db: Session = Depends(get_db), curren
     db.add(db_shelf)
     db.commit()
     db.refresh(db_shelf)
+    if sampling_scheduler is not None:
+        sampling_scheduler.wake(camera_id=shelf.camera_id)
     return db_shelf
 
 @app.get("/api/shelves", response_model=List[ShelfResponse])
@@ -208,8 +328,48 @@ async def delete_shelf(shelf_id: int, db: Session = Depends(get_db), current_use
     
     db.delete(shelf)
     db.commit()
+    shelf_states.discard(shelf_id)
+    reference_store.discard_shelf(shelf_id)
+    if sampling_scheduler is not None:
+        sampling_scheduler.discard(shelf_id)
     return {"message": "Shelf deleted"}
 
+@app.put("/api/shelves/{shelf_id}/cv-settings")
+async def update_shelf_cv_settings(shelf_id: int, settings: ShelfCVSettings, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    shelf = db.query(Shelf).join(Camera).join(Store).filter(
+        Shelf.id == shelf_id, 
+        Store.owner_id == current_user.id
+    ).first()
+    if not shelf:
+        raise HTTPException(status_code=404, detail="Shelf not found")
+    
+    try:
+        if settings.analysis_scale is not None:
+            cv_processor.set_analysis_scale(settings.analysis_scale, shelf_id=shelf_id)
+        if settings.scoring_mode is not None:
+            cv_processor.set_scoring_mode(settings.scoring_mode, shelf_id=shelf_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await cv_pool.reconfigure()
+    if sampling_scheduler is not None:
+        sampling_scheduler.wake(shelf_id=shelf_id)
+    return {"message": "Shelf CV settings updated"}
+
+@app.delete("/api/shelves/{shelf_id}/reference")
+async def reset_shelf_reference(shelf_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Retake the shelf's reference snapshot from its next frame, e.g. once it is fully stocked"""
+    shelf = db.query(Shelf).join(Camera).join(Store).filter(
+        Shelf.id == shelf_id, 
+        Store.owner_id == current_user.id
+    ).first()
+    if not shelf:
+        raise HTTPException(status_code=404, detail="Shelf not found")
+    
+    reference_store.invalidate((shelf.camera_id, shelf_id))
+    if sampling_scheduler is not None:
+        sampling_scheduler.wake(shelf_id=shelf_id)
+    return {"message": "Shelf reference snapshot reset"}
+
 # Alert endpoints
 @app.get("/api/alerts", response_model=List[AlertResponse])
 async def get_alerts(
@@ -304,7 +464,164 @@ async def get_dashboard_analytics(
     }
 
 # Computer Vision endpoints
+def add_alerts(db: Session, results: List[Dict]) -> bool:
+    """Stage a StockLevel row for every stock-level transition and an Alert row for every
+    result that needs one; returns whether any rows were added"""
+    added = False
+    for result in results:
+        if result.get('state_changed'):
+            db.add(StockLevel(
+                shelf_id=result['shelf_id'],
+                occupancy_score=result['smoothed_score'],
+                stock_status=result['stock_level']
+            ))
+            added = True
+        if result['needs_alert']:
+            alert = Alert(
+                shelf_id=result['shelf_id'],
+                priority=result['priority'],
+                message=result['message'],
+                occupancy_score=result['occupancy_score']
+            )
+            db.add(alert)
+            added = True
+    return added
+
+def state_message(camera_id: int, results: List[Dict]) -> Optional[Dict]:
+    """Websocket message for the shelves whose stock level changed, or None if none did"""
+    changed = [result for result in results if result.get('state_changed')]
+    if not changed:
+        return None
+    return {
+        "type": "alert" if any(result['needs_alert'] for result in changed) else "shelf_status",
+        "camera_id": camera_id,
+        "results": changed
+    }
+
+def camera_moved_message(camera_id: int, results: List[Dict]) -> Optional[Dict]:
+    """Websocket message for a camera whose view just shifted past CV_SHIFT_MOVED_PX, or None"""
+    moved = [result for result in results if result.get('camera_moved')]
+    if not moved:
+        return None
+    offset = moved[0]['region_offset']
+    logger.warning(f"Camera {camera_id} view shifted by {offset}; shelf regions are being translated")
+    return {
+        "type": "camera_moved",
+        "camera_id": camera_id,
+        "offset": offset,
+        "message": f"Camera {camera_id} has moved by {offset[0]}, {offset[1]} px; please check its shelf regions"
+    }
+
+# Server-side stream ingestion: cameras with an rtsp_url are read directly instead of via uploads
+INGEST_STATUSES = ("active", "offline")
+
+def update_stream_status(camera_id: int, status: str):
+    """Record a stream status change; called from capture threads"""
+    db = SessionLocal()
+    try:
+        values = {"status": status}
+        if status == "active":
+            values["last_seen"] = datetime.utcnow()
+        # Leave cameras an operator has switched to inactive/maintenance alone
+        db.query(Camera).filter(
+            Camera.id == camera_id,
+            Camera.status.in_(INGEST_STATUSES)
+        ).update(values, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+async def cache_snapshot(camera_id: int, image):
+    """Keep a frame (bytes or BGR) as the camera's snapshot; hashing and encoding run off the event loop"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, snapshot_cache.put, camera_id, image)
+    except Exception as e:
+        logger.error(f"Error caching snapshot for camera {camera_id}: {str(e)}")
+
+def count_frame(camera_id: int, source: str):
+    """Frames analysed per camera: a Prometheus counter plus a one-minute frames/sec gauge"""
+    FRAMES.inc(camera_id, source)
+    FRAME_RATE.mark(camera_id)
+
+@timed(FRAME_SECONDS, "ingest")
+async def analyze_ingested_frame(camera_id: int, frame: np.ndarray):
+    with timed(STAGE_SECONDS, "snapshot"):
+        await cache_snapshot(camera_id, frame)
+    db = SessionLocal()
+    try:
+        with timed(STAGE_SECONDS, "shelf_query"):
+            shelves = [ShelfSpec.from_shelf(shelf) for shelf in db.query(Shelf).filter(Shelf.camera_id == camera_id).all()]
+        if sampling_scheduler is not None:
+            # Stable shelves are skipped until the scheduler says they are worth another look
+            shelves = sampling_scheduler.due_shelves(shelves)
+            if not shelves:
+                return
+        try:
+            with timed(STAGE_SECONDS, "score"):
+                scores = await cv_pool.run_processor(camera_id, "score_frame", frame, shelves)
+        except QueueFullError:
+            # Drop this sample; the next one is taken from the latest frame anyway
+            return
+        with timed(STAGE_SECONDS, "build_results"):
+            results = cv_processor.build_results(shelves, scores)
+        count_frame(camera_id, "ingest")
+        live_streams.publish(camera_id, frame, results)
+        if sampling_scheduler is not None:
+            for shelf, result in zip(shelves, results):
+                if 'error' not in result:
+                    sampling_scheduler.observe(camera_id, shelf.id, result['occupancy_score'], shelf.empty_threshold)
+        
+        with timed(STAGE_SECONDS, "alerts"):
+            add_alerts(db, results)
+            db.query(Camera).filter(Camera.id == camera_id).update(
+                {"last_seen": datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+        
+        with timed(STAGE_SECONDS, "broadcast"):
+            for message in (state_message(camera_id, results), camera_moved_message(camera_id, results)):
+                if message is not None:
+                    await manager.broadcast(json.dumps(message))
+    finally:
+        db.close()
+
+def list_streaming_cameras() -> List:
+    db = SessionLocal()
+    try:
+        return db.query(Camera.id, Camera.rtsp_url).filter(
+            Camera.rtsp_url.isnot(None),
+            Camera.status.in_(INGEST_STATUSES)
+        ).all()
+    finally:
+        db.close()
+
+INGEST_ENABLED = os.getenv("INGEST_ENABLED", "0") == "1"
+INGEST_SAMPLE_INTERVAL = float(os.getenv("INGEST_SAMPLE_INTERVAL", "1.0"))
+
+# Per-shelf sampling intervals between INGEST_SAMPLE_INTERVAL and INGEST_MAX_INTERVAL,
+# with INGEST_FPS_BUDGET frames per second shared by all cameras (0 = unlimited)
+sampling_scheduler = SamplingScheduler(
+    min_interval=INGEST_SAMPLE_INTERVAL,
+    max_interval=max(INGEST_SAMPLE_INTERVAL, float(os.getenv("INGEST_MAX_INTERVAL", "300"))),
+    fps_budget=float(os.getenv("INGEST_FPS_BUDGET", "0"))
+) if INGEST_ENABLED else None
+
+ingestion = IngestionSupervisor(
+    analyze_ingested_frame,
+    sample_interval=INGEST_SAMPLE_INTERVAL,
+    on_status=update_stream_status,
+    list_cameras=list_streaming_cameras,
+    refresh_interval=float(os.getenv("INGEST_REFRESH_INTERVAL", "30")),
+    scheduler=sampling_scheduler
+) if INGEST_ENABLED else None
+
+@app.on_event("startup")
+async def start_ingestion():
+    if ingestion is not None:
+        ingestion.start()
+
 @app.post("/api/cv/process-frame")
+@timed(FRAME_SECONDS, "upload")
 async def process_frame(
     camera_id: int = Form(...),
     file: UploadFile = File(...),
@@ -320,42 +637,133 @@ async def process_frame(
         raise HTTPException(status_code=404, detail="Camera not found")
     
     # Read image
-    image_data = await file.read()
-    image = Image.open(BytesIO(image_data))
-    frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    with timed(STAGE_SECONDS, "upload_read"):
+        image_data = await file.read()
     
+    try:
+        return await analyze_uploaded_frame(db, camera_id, image_data)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+async def analyze_uploaded_frame(db: Session, camera_id: int, image_data: bytes, source: str = "upload") -> Dict:
+    """Score an uploaded frame of an owned camera, record and broadcast its alerts; raises QueueFullError when busy"""
     # Get shelves for this camera
-    shelves = db.query(Shelf).filter(Shelf.camera_id == camera_id).all()
+    with timed(STAGE_SECONDS, "shelf_query"):
+        shelves = [ShelfSpec.from_shelf(shelf) for shelf in db.query(Shelf).filter(Shelf.camera_id == camera_id).all()]
     
-    # Process frame
-    results = cv_processor.process_frame(frame, shelves)
+    # Decode and score off the event loop; alert decisions stay here
+    with timed(STAGE_SECONDS, "score"):
+        scores = await cv_pool.run_processor(camera_id, "score_frame", image_data, shelves,
+                                             reduction=cv_processor.decode_reduction(shelves))
+    # Only frames that decoded become the camera's snapshot
+    with timed(STAGE_SECONDS, "snapshot"):
+        await cache_snapshot(camera_id, image_data)
+    with timed(STAGE_SECONDS, "build_results"):
+        results = cv_processor.build_results(shelves, scores)
+    count_frame(camera_id, source)
+    live_streams.publish(camera_id, image_data, results)
     
-    # Save alerts if any
-    for result in results:
-        if result['needs_alert']:
-            alert = Alert(
-                shelf_id=result['shelf_id'],
-                priority=result['priority'],
-                message=result['message'],
-                occupancy_score=result['occupancy_score']
-            )
-            db.add(alert)
+    # Save alerts and stock-level transitions, if any
+    with timed(STAGE_SECONDS, "alerts"):
+        notify = add_alerts(db, results)
+        if notify:
+            db.commit()
+    with timed(STAGE_SECONDS, "broadcast"):
+        if notify:
+            # Send real-time notification
+            await manager.broadcast(json.dumps(state_message(camera_id, results)))
+        moved_message = camera_moved_message(camera_id, results)
+        if moved_message is not None:
+            await manager.broadcast(json.dumps(moved_message))
     
-    if any(result['needs_alert'] for result in results):
-        db.commit()
-        # Send real-time notification
-        await manager.broadcast(json.dumps({
-            "type": "alert",
+    return {
+        "results": results,
+        "cached_shelves": sum(1 for result in results if result.get('from_cache'))
+    }
+
+@app.post("/api/cv/process-frames")
+@timed(FRAME_SECONDS, "batch")
+async def process_frames(
+    camera_ids: List[int] = Form(...),
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Analyse one frame per (camera_id, file) pair in a single request"""
+    if len(camera_ids) != len(files):
+        raise HTTPException(status_code=400, detail="camera_ids and files must have the same length")
+    
+    # Verify ownership of every camera in one query
+    requested_ids = set(camera_ids)
+    owned_ids = {
+        camera_id for (camera_id,) in db.query(Camera.id).join(Store).filter(
+            Camera.id.in_(requested_ids),
+            Store.owner_id == current_user.id
+        ).all()
+    }
+    missing_ids = sorted(requested_ids - owned_ids)
+    if missing_ids:
+        raise HTTPException(status_code=404, detail=f"Camera not found: {missing_ids}")
+    
+    # Get shelves for all cameras in one query
+    shelves_by_camera: Dict[int, List[ShelfSpec]] = {camera_id: [] for camera_id in requested_ids}
+    for shelf in db.query(Shelf).filter(Shelf.camera_id.in_(requested_ids)).all():
+        shelves_by_camera[shelf.camera_id].append(ShelfSpec.from_shelf(shelf))
+    
+    # Read images and score all frames in parallel on the CV pool
+    with timed(STAGE_SECONDS, "upload_read"):
+        images = [await file.read() for file in files]
+    with timed(STAGE_SECONDS, "score"):
+        scored = await asyncio.gather(*[
+            cv_pool.run_processor(camera_id, "score_frame", image_data, shelves_by_camera[camera_id],
+                                  reduction=cv_processor.decode_reduction(shelves_by_camera[camera_id]))
+            for camera_id, image_data in zip(camera_ids, images)
+        ], return_exceptions=True)
+    
+    frames = []
+    needs_commit = False
+    for camera_id, image_data, scores in zip(camera_ids, images, scored):
+        if isinstance(scores, Exception):
+            logger.error(f"Error processing frame for camera {camera_id}: {str(scores)}")
+            frames.append({"camera_id": camera_id, "error": str(scores), "results": []})
+            continue
+        with timed(STAGE_SECONDS, "snapshot"):
+            await cache_snapshot(camera_id, image_data)
+        with timed(STAGE_SECONDS, "build_results"):
+            results = cv_processor.build_results(shelves_by_camera[camera_id], scores)
+        count_frame(camera_id, "batch")
+        live_streams.publish(camera_id, image_data, results)
+        needs_commit = add_alerts(db, results) or needs_commit
+        frames.append({
             "camera_id": camera_id,
-            "results": results
-        }))
+            "results": results,
+            "cached_shelves": sum(1 for result in results if result.get('from_cache'))
+        })
     
-    return {"results": results}
+    # One transaction and one broadcast for the whole batch
+    if needs_commit:
+        with timed(STAGE_SECONDS, "alerts"):
+            db.commit()
+    messages = [message for frame in frames for message in (
+        state_message(frame["camera_id"], frame["results"]),
+        camera_moved_message(frame["camera_id"], frame["results"])
+    ) if message is not None]
+    if messages:
+        with timed(STAGE_SECONDS, "broadcast"):
+            await manager.broadcast(json.dumps({
+                "type": "batch",
+                "messages": messages
+            }))
+    
+    return {"frames": frames}
 
 @app.post("/api/cv/detect-shelves")
 async def detect_shelves(
     camera_id: int = Form(...),
     file: UploadFile = File(...),
+    refresh: bool = Form(False),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -369,14 +777,106 @@ async def detect_shelves(
     
     # Read image
     image_data = await file.read()
-    image = Image.open(BytesIO(image_data))
-    frame = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
     
-    # Detect shelves
-    detected_shelves = cv_processor.detect_shelves(frame)
+    # Detect shelves; refresh forces a full detection instead of the cached one
+    try:
+        detected_shelves = await cv_pool.run_processor(camera_id, "detect_shelves", image_data, camera_id, refresh)
+    except ImageDecodeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     
     return {"detected_shelves": detected_shelves}
 
+@app.get("/api/cameras/{camera_id}/snapshot")
+async def get_camera_snapshot(
+    camera_id: int,
+    request: Request,
+    size: Optional[int] = Query(None, gt=0, description="Thumbnail width; the smallest cached level at least this wide"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_user_from_header_or_query)
+):
+    """Last analysed frame of a camera as a JPEG, 304 when the client's ETag still matches"""
+    camera = db.query(Camera).join(Store).filter(
+        Camera.id == camera_id,
+        Store.owner_id == current_user.id
+    ).first()
+    if not camera:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    
+    # The first thumbnail of a frame decodes and encodes its pyramid; keep that off the event loop
+    snapshot = await asyncio.get_running_loop().run_in_executor(None, snapshot_cache.get, camera_id, size)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="No frame received from this camera yet")
+    
+    headers = {
+        "ETag": snapshot.etag,
+        "Cache-Control": "no-cache",
+        "Last-Modified": formatdate(snapshot.timestamp, usegmt=True)
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match.strip() == "*" or snapshot.etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=snapshot.jpeg, media_type="image/jpeg", headers=headers)
+
+@app.get("/api/cameras/{camera_id}/stream")
+async def stream_camera(camera_id: int, request: Request, token: str):
+    """Annotated MJPEG stream of a camera's analysed frames, for an <img> tag
+    
+    Browsers cannot send an Authorization header from an <img> tag, so the
+    access token comes as a query parameter.
+    """
+    # No request-scoped session: the response lives as long as the viewer watches
+    db = SessionLocal()
+    try:
+        current_user = get_user_from_token(token, db)
+        camera = db.query(Camera).join(Store).filter(
+            Camera.id == camera_id,
+            Store.owner_id == current_user.id
+        ).first()
+    finally:
+        db.close()
+    if not camera:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    
+    return StreamingResponse(
+        live_streams.parts(camera_id, request.is_disconnected),
+        media_type=f"multipart/x-mixed-replace; boundary={MJPEG_BOUNDARY}",
+        headers={"Cache-Control": "no-cache, no-store", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/cv/models/reload")
+async def reload_occupancy_models(current_user: User = Depends(get_current_user)):
+    """Pick up occupancy models newly written by train_occupancy.py"""
+    loaded = cv_processor.reload_occupancy_models()
+    await cv_pool.apply_to_workers(CVProcessor.reload_occupancy_models)
+    return {"message": f"Loaded {loaded} occupancy models", "models": occupancy_models.stats()["models"]}
+
+@app.get("/api/cv/stats")
+async def get_cv_stats(current_user: User = Depends(get_current_user)):
+    return {
+        "executor": cv_pool.stats(),
+        "background_models": bg_registry.stats(),
+        "change_gate": cv_processor.change_gate.stats() if cv_processor.change_gate is not None else None,
+        "scene_cache": cv_processor.scene_cache.stats() if cv_processor.scene_cache is not None else None,
+        "camera_shift": camera_shift.stats(),
+        "reference_store": reference_store.stats(),
+        "occupancy_models": occupancy_models.stats(),
+        "dnn": dnn_scorer.stats() if dnn_scorer is not None else None,
+        "shelf_states": shelf_states.stats(),
+        "live_streams": live_streams.stats(),
+        "snapshots": snapshot_cache.stats(),
+        "frame_sockets": {"connections": len(frame_sessions),
+                          **{key: sum(session.stats()[key] for session in frame_sessions)
+                             for key in ("received", "analysed", "dropped")}},
+        "metric_profiles": {name: [feature.name for feature in features]
+                            for name, features in cv_processor.features.profiles.items()},
+        "feature_costs": cv_processor.costs.snapshot(),
+        "cascade": {"enabled": cv_processor.cascade, "margin": cv_processor.cascade_margin,
+                    "decided_by": {str(stage): count for stage, count in cv_processor.cascade_stages.items()}},
+        "ingestion": ingestion.stats() if ingestion is not None else None
+    }
+
 # WebSocket endpoint for real-time updates
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -389,6 +889,76 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
+# Binary frame uploads: one persistent socket per client instead of a multipart POST per frame
+WS_MAX_FRAME_BYTES = int(os.getenv("WS_MAX_FRAME_MB", "8")) * 1024 * 1024
+frame_sessions: List[FrameSocketSession] = []
+
+@app.websocket("/ws/frames")
+async def frame_socket(websocket: WebSocket, token: str = ""):
+    """Binary frames (4-byte big-endian camera id + JPEG) in, JSON analysis results out
+    
+    Browsers cannot set headers on a WebSocket, so the access token comes as
+    a query parameter.
+    """
+    db = SessionLocal()
+    try:
+        current_user = get_user_from_token(token, db)
+    except HTTPException:
+        db.close()
+        await websocket.close(code=1008)
+        return
+    
+    owned_ids = set()
+    
+    async def analyze(camera_id: int, image_data: bytes) -> Dict:
+        if camera_id not in owned_ids:
+            # Cameras created after the socket opened are picked up here
+            camera = db.query(Camera.id).join(Store).filter(
+                Camera.id == camera_id,
+                Store.owner_id == current_user.id
+            ).first()
+            if not camera:
+                raise ValueError("Camera not found")
+            owned_ids.add(camera_id)
+        try:
+            with timed(FRAME_SECONDS, "websocket"):
+                return await analyze_uploaded_frame(db, camera_id, image_data, source="websocket")
+        finally:
+            # Fresh shelf rows for the next frame
+            db.expire_all()
+    
+    await websocket.accept()
+    session = FrameSocketSession(websocket, analyze, WS_MAX_FRAME_BYTES)
+    frame_sessions.append(session)
+    try:
+        await session.run()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        frame_sessions.remove(session)
+        db.close()
+
+# Prometheus gauges, read from the live objects at scrape time
+def cv_queue_depths() -> Dict:
+    stats = cv_pool.stats()
+    return {("queued",): stats['queue_depth'], ("running",): stats['running']}
+
+REGISTRY.gauge("stock_monitor_cv_queue", "CV pool calls waiting for or running on a worker", cv_queue_depths, ["state"])
+REGISTRY.gauge("stock_monitor_cv_queue_capacity", "Maximum CV pool calls in flight before requests are shed",
+               lambda: cv_pool.max_queue)
+REGISTRY.gauge("stock_monitor_websocket_clients", "Open WebSocket connections per endpoint",
+               lambda: {("/ws",): len(manager.active_connections), ("/ws/frames",): len(frame_sessions)}, ["endpoint"])
+REGISTRY.gauge("stock_monitor_frame_socket_pending", "Frames waiting for analysis on frame upload sockets",
+               lambda: sum(len(session.pending) for session in frame_sessions))
+REGISTRY.gauge("stock_monitor_stream_viewers", "MJPEG viewers per camera",
+               lambda: {(camera_id,): stream.viewers for camera_id, stream in live_streams.streams.items()},
+               ["camera_id"])
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text format; unauthenticated like /health, so scrapers need no token"""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
 # Health check
 @app.get("/health")
 async def health_check():
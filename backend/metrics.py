@@ -0,0 +1,270 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Hashable, List, Sequence, Tuple
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds in seconds; from sub-millisecond CV steps to multi-second requests
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """Latency histogram with fixed buckets, one series per tuple of label values.
+
+    ``observe`` is a bisect and a few additions under a lock, cheap enough for
+    per-shelf, per-feature calls.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, *labelvalues: Any):
+        key = tuple(map(str, labelvalues))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def time(self, *labelvalues: Any) -> 'timed':
+        return timed(self, *labelvalues)
+
+    def take(self) -> Dict[Tuple[str, ...], Tuple[List[int], float]]:
+        """Return and clear the recorded series, for shipping them to another process"""
+        with self._lock:
+            series, self._series = self._series, {}
+        return {key: (counts, total) for key, (counts, total) in series.items()}
+
+    def merge(self, series: Dict[Tuple[str, ...], Tuple[List[int], float]]):
+        with self._lock:
+            for key, (counts, total) in series.items():
+                mine = self._series.get(key)
+                if mine is None:
+                    self._series[key] = [list(counts), total]
+                    continue
+                for index, count in enumerate(counts):
+                    mine[0][index] += count
+                mine[1] += total
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in sorted(self._series.items())]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+class Counter:
+    """Monotonic counter, one series per tuple of label values"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues: Any, amount: float = 1.0):
+        key = tuple(map(str, labelvalues))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines.extend(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values)
+        return lines
+
+class Gauge:
+    """Gauge read from a callback at scrape time.
+
+    ``callback`` returns a number, or for labelled gauges a mapping of label
+    value tuples to numbers; it is called on every scrape, so the live objects
+    (queues, socket lists) are the source of truth and nothing is updated on
+    the hot path.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Any], labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        value = self.callback()
+        if not self.labelnames:
+            lines.append(f"{self.name} {_number(value)}")
+            return lines
+        for key, item in sorted(value.items(), key=lambda pair: tuple(str(label) for label in pair[0])):
+            lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(item)}")
+        return lines
+
+class RateMeter:
+    """Events per second over a sliding window, per key (e.g. frames per camera)"""
+
+    def __init__(self, window: float = 60.0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._events: Dict[Hashable, Deque[float]] = {}
+
+    def mark(self, key: Hashable):
+        now = time.monotonic()
+        with self._lock:
+            events = self._events.get(key)
+            if events is None:
+                events = self._events[key] = deque()
+            events.append(now)
+            while events[0] < now - self.window:
+                events.popleft()
+
+    def rates(self) -> Dict[Tuple[str], float]:
+        now = time.monotonic()
+        with self._lock:
+            rates = {}
+            for key, events in list(self._events.items()):
+                while events and events[0] < now - self.window:
+                    events.popleft()
+                if not events:
+                    del self._events[key]
+                    continue
+                rates[(str(key),)] = round(len(events) / self.window, 4)
+            return rates
+
+class MetricsRegistry:
+    """Named metrics rendered together in Prometheus text format"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+
+    def _add(self, metric: Any) -> Any:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, callback: Callable[[], Any],
+              labelnames: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, documentation, callback, labelnames))
+
+    def take_histograms(self) -> Dict[str, Dict[Tuple[str, ...], Tuple[List[int], float]]]:
+        """Drain every histogram; worker processes ship this back to the API process"""
+        taken = {name: metric.take() for name, metric in self.metrics.items() if isinstance(metric, Histogram)}
+        return {name: series for name, series in taken.items() if series}
+
+    def merge_histograms(self, taken: Dict[str, Dict[Tuple[str, ...], Tuple[List[int], float]]]):
+        for name, series in taken.items():
+            metric = self.metrics.get(name)
+            if isinstance(metric, Histogram):
+                metric.merge(series)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+class timed:
+    """Record the elapsed time of a block or of every call of a function into a histogram
+
+        with timed(STAGE_SECONDS, "shelf_query"):
+            ...
+
+        @timed(FRAME_SECONDS, "upload")
+        async def process_frame(...):
+            ...
+    """
+
+    __slots__ = ("histogram", "labelvalues", "_start")
+
+    def __init__(self, histogram: Histogram, *labelvalues: Any):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+        self._start = 0.0
+
+    def __enter__(self) -> 'timed':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self._start, *self.labelvalues)
+
+    def __call__(self, fn: Callable) -> Callable:
+        histogram, labelvalues = self.histogram, self.labelvalues
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def timed_coroutine(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, *labelvalues)
+            return timed_coroutine
+
+        @functools.wraps(fn)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, *labelvalues)
+        return timed_function
+
+# One registry per process; worker processes send their histogram observations back with each result
+REGISTRY = MetricsRegistry()
+
+FRAME_SECONDS = REGISTRY.histogram(
+    "stock_monitor_frame_seconds", "End-to-end latency of frame analysis per entry point", ["source"])
+STAGE_SECONDS = REGISTRY.histogram(
+    "stock_monitor_stage_seconds", "Latency of frame-analysis stages in the API process", ["stage"])
+CV_STEP_SECONDS = REGISTRY.histogram(
+    "stock_monitor_cv_step_seconds", "Time per decode, frame plane and occupancy feature (per shelf)", ["step"])
+FRAMES = REGISTRY.counter(
+    "stock_monitor_frames_total", "Frames analysed per camera", ["camera_id", "source"])
+FRAME_RATE = RateMeter(window=60.0)
+REGISTRY.gauge("stock_monitor_camera_fps", "Frames analysed per second per camera over the last minute",
+               FRAME_RATE.rates, ["camera_id"])
@@ -44,7 +44,7 @@ class Camera(Base):
     location = Column(String)
     rtsp_url = Column(String)
     ip_address = Column(String)
-    status = Column(String, default="active")  # active, inactive, maintenance
+    status = Column(String, default="active")  # active, inactive, maintenance, offline
     store_id = Column(Integer, ForeignKey("stores.id"))
     created_at = Column(DateTime, default=datetime.utcnow)
     last_seen = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,158 @@
+import json
+import os
+import re
+import threading
+import logging
+from typing import Any, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MODEL_KINDS = ("linear", "logistic")
+
+class OccupancyModel(NamedTuple):
+    """Learned replacement for the hand-tuned feature weights.
+
+    ``weights`` and ``bias`` apply to raw feature values in ``features``
+    order (standardisation is folded in at training time), so scoring any
+    number of shelves is one matrix-vector product.
+    """
+    kind: str
+    features: Sequence[str]
+    weights: np.ndarray
+    bias: float
+    metadata: Dict[str, Any] = {}
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Occupancy scores in [0, 1] for an (n_shelves, n_features) matrix"""
+        z = X @ self.weights + self.bias
+        if self.kind == "logistic":
+            return 1.0 / (1.0 + np.exp(-np.clip(z, -30.0, 30.0)))
+        return np.clip(z, 0.0, 1.0)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'features': list(self.features), 'weights': self.weights.tolist(),
+                'bias': self.bias, 'metadata': self.metadata}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> 'OccupancyModel':
+        if data.get('kind') not in MODEL_KINDS:
+            raise ValueError(f"Unknown occupancy model kind: {data.get('kind')}")
+        weights = np.asarray(data['weights'], dtype=np.float64)
+        if weights.shape != (len(data['features']),):
+            raise ValueError(f"Expected {len(data['features'])} weights, got {weights.shape}")
+        return cls(data['kind'], tuple(data['features']), weights, float(data['bias']), data.get('metadata', {}))
+
+def _standardize(X: np.ndarray):
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale < 1e-9] = 1.0
+    return (X - mean) / scale, mean, scale
+
+def _fold(weights: np.ndarray, bias: float, mean: np.ndarray, scale: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Weights and bias for raw features from ones fitted on standardised features"""
+    return weights / scale, float(bias - np.sum(weights * mean / scale))
+
+def fit_linear(X: np.ndarray, y: np.ndarray, l2: float = 1e-3) -> Tuple[np.ndarray, float]:
+    """Ridge regression of occupancy on standardised features; returns raw-feature (weights, bias)"""
+    Z, mean, scale = _standardize(X)
+    A = np.hstack([Z, np.ones((len(Z), 1))])
+    penalty = l2 * len(Z) * np.eye(A.shape[1])
+    penalty[-1, -1] = 0.0
+    solution = np.linalg.solve(A.T @ A + penalty, A.T @ y)
+    return _fold(solution[:-1], solution[-1], mean, scale)
+
+def fit_logistic(X: np.ndarray, y: np.ndarray, l2: float = 1e-3, iterations: int = 50,
+                 tol: float = 1e-8) -> Tuple[np.ndarray, float]:
+    """Logistic regression by Newton's method; ``y`` may be soft labels in [0, 1]"""
+    Z, mean, scale = _standardize(X)
+    A = np.hstack([Z, np.ones((len(Z), 1))])
+    penalty = l2 * len(Z) * np.eye(A.shape[1])
+    penalty[-1, -1] = 0.0
+    theta = np.zeros(A.shape[1])
+    for _ in range(iterations):
+        p = 1.0 / (1.0 + np.exp(-np.clip(A @ theta, -30.0, 30.0)))
+        gradient = A.T @ (p - y) + penalty @ theta
+        hessian = (A * (p * (1.0 - p))[:, None]).T @ A + penalty + 1e-9 * np.eye(A.shape[1])
+        step = np.linalg.solve(hessian, gradient)
+        theta -= step
+        if np.max(np.abs(step)) < tol:
+            break
+    return _fold(theta[:-1], theta[-1], mean, scale)
+
+def fit_model(kind: str, features: Sequence[str], X: np.ndarray, y: np.ndarray, l2: float = 1e-3,
+              metadata: Optional[Dict[str, Any]] = None) -> OccupancyModel:
+    if kind not in MODEL_KINDS:
+        raise ValueError(f"Unknown occupancy model kind: {kind}")
+    fit = fit_logistic if kind == "logistic" else fit_linear
+    weights, bias = fit(np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64), l2)
+    return OccupancyModel(kind, tuple(features), weights, bias, dict(metadata or {}))
+
+def model_filename(store_id: Any = None, category: Optional[str] = None) -> str:
+    """File name of the model for a product category, a store, or the default model"""
+    if category is not None:
+        return f"category-{re.sub(r'[^A-Za-z0-9_.-]+', '_', str(category)).lower()}.json"
+    if store_id is not None:
+        return f"store-{store_id}.json"
+    return "default.json"
+
+class OccupancyModelRegistry:
+    """Learned occupancy models loaded from a directory of JSON files.
+
+    A shelf uses the model of its product category (``category-<name>.json``),
+    else its store's (``store-<id>.json``), else ``default.json``; with none
+    of them it keeps the hand-tuned feature weights.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._models: Dict[str, OccupancyModel] = {}
+        self._lock = threading.Lock()
+        self.reload()
+
+    def reload(self) -> int:
+        """(Re)read every model in the directory; returns the number loaded"""
+        models = {}
+        if self.directory and os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if not name.endswith(".json"):
+                    continue
+                try:
+                    with open(os.path.join(self.directory, name)) as f:
+                        models[name] = OccupancyModel.from_json(json.load(f))
+                except Exception as e:
+                    logger.error(f"Failed to load occupancy model {name}: {str(e)}")
+        with self._lock:
+            self._models = models
+        if models:
+            logger.info(f"Loaded {len(models)} occupancy models from {self.directory}")
+        return len(models)
+
+    def save(self, model: OccupancyModel, store_id: Any = None, category: Optional[str] = None) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, model_filename(store_id, category))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(model.to_json(), f, indent=2)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._models[os.path.basename(path)] = model
+        return path
+
+    def model_for(self, shelf: Any) -> Optional[OccupancyModel]:
+        """The model that applies to a shelf (with optional ``product_category`` and ``store_id``)"""
+        models = self._models
+        if not models:
+            return None
+        category = getattr(shelf, 'product_category', None)
+        store_id = getattr(shelf, 'store_id', None)
+        for name in (model_filename(category=category) if category else None,
+                     model_filename(store_id=store_id) if store_id is not None else None,
+                     model_filename()):
+            if name is not None and name in models:
+                return models[name]
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {'directory': self.directory, 'models': sorted(self._models)}
@@ -0,0 +1,141 @@
+import cv2
+import numpy as np
+import os
+import threading
+import logging
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class _Reference:
+    def __init__(self, image: np.ndarray, mtime: Optional[int]):
+        self.image = image
+        self.mtime = mtime
+
+class ReferenceSnapshotStore:
+    """Gray reference snapshots of stocked shelves, keyed by (camera_id, shelf_id).
+
+    A shelf in "reference" scoring mode is scored by how many of its pixels
+    differ from its snapshot by more than ``diff_threshold`` gray levels; at
+    ``empty_change`` (share of changed pixels) or more it scores 0. A shelf
+    without a snapshot captures its current ROI, so ``invalidate`` makes the
+    next frame the new reference. A snapshot taken at another ROI size (e.g.
+    before the analysis scale changed) is resized to the ROI, never retaken.
+
+    With a ``directory`` every snapshot is also written there as a PNG. That
+    makes snapshots survive restarts and keeps worker processes in step: a
+    snapshot whose file was replaced or deleted by another process is reloaded
+    or recaptured on its next lookup.
+    """
+
+    def __init__(self, directory: Optional[str] = None, diff_threshold: int = 50, empty_change: float = 0.6):
+        if not 0.0 < empty_change <= 1.0:
+            raise ValueError(f"empty_change must be in (0, 1], got {empty_change}")
+        self.directory = directory
+        self.diff_threshold = diff_threshold
+        self.empty_change = empty_change
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._references: Dict[Hashable, _Reference] = {}
+        self._lock = threading.Lock()
+        self.captures = 0
+        self.invalidations = 0
+
+    def path(self, key: Hashable) -> Optional[str]:
+        if not self.directory:
+            return None
+        name = "_".join(str(part) for part in key) if isinstance(key, tuple) else str(key)
+        return os.path.join(self.directory, f"{name}.png")
+
+    def get(self, key: Hashable) -> Optional[np.ndarray]:
+        """The snapshot for ``key``, or None if it has none"""
+        path = self.path(key)
+        with self._lock:
+            reference = self._references.get(key)
+        if path is None:
+            return reference.image if reference is not None else None
+
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            if reference is not None:
+                with self._lock:
+                    self._references.pop(key, None)
+            return None
+        if reference is not None and reference.mtime == mtime:
+            return reference.image
+
+        image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            logger.error(f"Failed to read reference snapshot {path}")
+            return None
+        with self._lock:
+            self._references[key] = _Reference(image, mtime)
+        return image
+
+    def capture(self, key: Hashable, roi: np.ndarray):
+        """Make a gray ROI the snapshot for ``key``"""
+        image = roi.copy()
+        mtime = None
+        path = self.path(key)
+        if path is not None:
+            ok, encoded = cv2.imencode(".png", image)
+            if ok:
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(encoded.tobytes())
+                os.replace(tmp_path, path)
+                mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            self._references[key] = _Reference(image, mtime)
+            self.captures += 1
+
+    def invalidate(self, key: Hashable):
+        """Drop a snapshot so the shelf's next frame is captured as the new one"""
+        with self._lock:
+            self._references.pop(key, None)
+            self.invalidations += 1
+        path = self.path(key)
+        if path is not None:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def discard_shelf(self, shelf_id: Hashable):
+        """Drop the snapshots of a deleted shelf, whichever camera they were taken on"""
+        with self._lock:
+            for key in [key for key in self._references if isinstance(key, tuple) and key[-1] == shelf_id]:
+                del self._references[key]
+        if not self.directory:
+            return
+        for name in os.listdir(self.directory):
+            stem, extension = os.path.splitext(name)
+            if extension == ".png" and stem.rsplit("_", 1)[-1] == str(shelf_id):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def score(self, key: Hashable, gray_roi: np.ndarray) -> Tuple[float, bool]:
+        """(occupancy score, whether the ROI was captured as a new snapshot)
+
+        Costs one absdiff, an in-place threshold and one countNonZero, plus a
+        resize while the snapshot and the ROI differ in size.
+        """
+        reference = self.get(key)
+        if reference is None:
+            self.capture(key, gray_roi)
+            return 1.0, True
+        if reference.shape != gray_roi.shape:
+            height, width = gray_roi.shape[:2]
+            reference = cv2.resize(reference, (width, height), interpolation=cv2.INTER_AREA)
+        diff = cv2.absdiff(reference, gray_roi)
+        cv2.threshold(diff, self.diff_threshold, 255, cv2.THRESH_BINARY, dst=diff)
+        changed = cv2.countNonZero(diff) / float(diff.size)
+        return max(0.0, 1.0 - changed / self.empty_change), False
+
+    def stats(self) -> Dict[str, Any]:
+        return {'references': len(self._references), 'captures': self.captures,
+                'invalidations': self.invalidations, 'directory': self.directory}
@@ -0,0 +1,164 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Hashable, Iterable, List, Optional, Set
+
+from shelf_state import level_cut_points
+
+class _ShelfSchedule:
+    def __init__(self, camera_id: Hashable, window: int):
+        self.camera_id = camera_id
+        self.scores: Deque[float] = deque(maxlen=window)
+        self.interval = 0.0
+        self.next_due = 0.0
+
+class SamplingScheduler:
+    """Decides when each shelf is next worth analysing, under a global frames-per-second budget.
+
+    After every score a shelf's next-due time is pushed out by an interval
+    between ``min_interval`` and ``max_interval``. The interval grows with the
+    distance of the shelf's recent mean score from the nearest stock-level cut
+    point (``distance_scale`` is "far") and shrinks with the standard deviation
+    of its recent scores (``volatility_scale`` is "noisy"), so a shelf that has
+    sat at HIGH for hours is sampled every few minutes while one hovering
+    around ``empty_threshold`` is sampled every ``min_interval``. Until a
+    shelf has ``window`` scores its interval stays short.
+
+    A camera is due when any of its shelves is; shelves the scheduler has not
+    seen yet are always due. Frames are handed out from a token bucket refilled
+    at ``fps_budget`` frames per second across all cameras (0 = unlimited).
+    """
+
+    def __init__(self, min_interval: float = 1.0, max_interval: float = 300.0, fps_budget: float = 0.0,
+                 window: int = 20, distance_scale: float = 0.2, volatility_scale: float = 0.05):
+        if not 0.0 < min_interval <= max_interval:
+            raise ValueError(f"Need 0 < min_interval <= max_interval, got {min_interval}, {max_interval}")
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fps_budget = fps_budget
+        self.window = window
+        self.distance_scale = distance_scale
+        self.volatility_scale = volatility_scale
+
+        self._shelves: Dict[Hashable, _ShelfSchedule] = {}
+        self._camera_shelves: Dict[Hashable, Set[Hashable]] = {}
+        self._camera_wake: Dict[Hashable, float] = {}
+        self._lock = threading.Lock()
+        self._tokens = max(1.0, fps_budget)
+        self._refilled_at: Optional[float] = None
+        self.granted = 0
+        self.denied = 0
+
+    def interval_for(self, scores: Iterable[float], empty_threshold: float = 0.15) -> float:
+        """Sampling interval for a shelf with these recent scores"""
+        scores = list(scores)
+        if not scores:
+            return self.min_interval
+        mean = sum(scores) / len(scores)
+        stddev = math.sqrt(sum((score - mean) ** 2 for score in scores) / len(scores))
+        distance = min(abs(mean - cut) for cut in level_cut_points(empty_threshold))
+
+        # All factors are 1 for a calm shelf far from any boundary with a full score
+        # history; squaring keeps borderline shelves close to min_interval
+        closeness = min(distance / self.distance_scale, 1.0)
+        calm = 1.0 / (1.0 + stddev / self.volatility_scale)
+        history = min(len(scores) / self.window, 1.0)
+        return self.min_interval + (self.max_interval - self.min_interval) * (closeness * calm * history) ** 2
+
+    def observe(self, camera_id: Hashable, shelf_id: Hashable, score: float, empty_threshold: float = 0.15,
+                now: Optional[float] = None) -> float:
+        """Record a shelf score and return the shelf's next-due time"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            schedule = self._shelves.get(shelf_id)
+            if schedule is None or schedule.camera_id != camera_id:
+                self._forget(shelf_id)
+                schedule = self._shelves[shelf_id] = _ShelfSchedule(camera_id, self.window)
+                self._camera_shelves.setdefault(camera_id, set()).add(shelf_id)
+            schedule.scores.append(score)
+            schedule.interval = self.interval_for(schedule.scores, empty_threshold)
+            schedule.next_due = now + schedule.interval
+            return schedule.next_due
+
+    def due_shelves(self, shelves: List[Any], now: Optional[float] = None) -> List[Any]:
+        """The shelves (objects with ``id``) that are due for analysis"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return [shelf for shelf in shelves
+                    if shelf.id not in self._shelves or self._shelves[shelf.id].next_due <= now]
+
+    def camera_due(self, camera_id: Hashable) -> float:
+        """Earliest next-due time of a camera's shelves; 0 if it has none the scheduler knows"""
+        with self._lock:
+            dues = [self._shelves[shelf_id].next_due for shelf_id in self._camera_shelves.get(camera_id, ())]
+            wake = self._camera_wake.get(camera_id)
+        if wake is not None:
+            dues.append(wake)
+        return min(dues) if dues else 0.0
+
+    def sampled_camera(self, camera_id: Hashable, now: Optional[float] = None):
+        """Note that a camera was sampled, so a camera without shelves waits ``max_interval``"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._camera_wake[camera_id] = now + self.max_interval
+
+    def wake(self, camera_id: Hashable = None, shelf_id: Hashable = None):
+        """Make a shelf, or every shelf of a camera, due now (e.g. after its settings changed)"""
+        with self._lock:
+            if shelf_id is not None and shelf_id in self._shelves:
+                self._shelves[shelf_id].next_due = 0.0
+            if camera_id is not None:
+                self._camera_wake[camera_id] = 0.0
+                for shelf_id in self._camera_shelves.get(camera_id, ()):
+                    self._shelves[shelf_id].next_due = 0.0
+
+    def _forget(self, shelf_id: Hashable):
+        schedule = self._shelves.pop(shelf_id, None)
+        if schedule is not None:
+            shelves = self._camera_shelves.get(schedule.camera_id)
+            shelves.discard(shelf_id)
+            if not shelves:
+                del self._camera_shelves[schedule.camera_id]
+
+    def discard(self, shelf_id: Hashable):
+        with self._lock:
+            self._forget(shelf_id)
+
+    def discard_camera(self, camera_id: Hashable):
+        with self._lock:
+            self._camera_wake.pop(camera_id, None)
+            for shelf_id in list(self._camera_shelves.get(camera_id, ())):
+                self._forget(shelf_id)
+
+    def try_acquire(self, now: Optional[float] = None) -> bool:
+        """Take one frame from the global budget"""
+        if self.fps_budget <= 0:
+            self.granted += 1
+            return True
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._refilled_at is not None:
+                elapsed = max(now - self._refilled_at, 0.0)
+                self._tokens = min(max(1.0, self.fps_budget), self._tokens + elapsed * self.fps_budget)
+            self._refilled_at = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                self.granted += 1
+                return True
+            self.denied += 1
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            intervals = [schedule.interval for schedule in self._shelves.values()]
+            overdue = sum(1 for schedule in self._shelves.values() if schedule.next_due <= now)
+        return {
+            'shelves': len(intervals),
+            'due': overdue,
+            'mean_interval': round(sum(intervals) / len(intervals), 2) if intervals else None,
+            'fps_budget': self.fps_budget,
+            'frames_granted': self.granted,
+            'frames_denied': self.denied,
+        }
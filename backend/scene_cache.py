@@ -0,0 +1,87 @@
+import copy
+import cv2
+import numpy as np
+import threading
+import time
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+class _SceneEntry:
+    def __init__(self, shape: Tuple[int, ...], fingerprint: int, detections: List[Dict[str, Any]], timestamp: float):
+        self.shape = shape
+        self.fingerprint = fingerprint
+        self.detections = detections
+        self.timestamp = timestamp
+
+class SceneFingerprintCache:
+    """Per-camera cache of shelf detections, reused while the scene's edge layout stays the same.
+
+    The fingerprint is a bit per cell of a ``grid`` (width, height) thumbnail:
+    whether the cell's gradient magnitude is above the thumbnail's median. It
+    ignores lighting level and sensor noise but flips when shelves,
+    fixtures or the camera move. Detections are reused while the share of bits
+    that differ from the fingerprint of the last full detection stays within
+    ``max_drift``; comparing against the last detection (not the last lookup)
+    means slow drift still triggers a re-detection once it accumulates, and
+    ``max_age`` forces one periodically.
+    """
+
+    def __init__(self, grid: Tuple[int, int] = (32, 18), max_drift: float = 0.08, max_age: float = 3600.0):
+        self.grid = grid
+        self.max_drift = max_drift
+        self.max_age = max_age
+
+        self._entries: Dict[Hashable, _SceneEntry] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprint(self, frame: np.ndarray) -> int:
+        """Edge-layout hash of a BGR or gray frame, as an int of grid width * height bits"""
+        # Point-sample 8x8 pixels per cell first; averaging the full frame would cost milliseconds
+        width, height = self.grid
+        small = cv2.resize(frame, (width * 8, height * 8), interpolation=cv2.INTER_NEAREST)
+        small = cv2.resize(small, self.grid, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        small = small.astype(np.float32)
+        magnitude = cv2.magnitude(cv2.Sobel(small, cv2.CV_32F, 1, 0), cv2.Sobel(small, cv2.CV_32F, 0, 1))
+        bits = np.packbits(magnitude > np.median(magnitude))
+        return int.from_bytes(bits.tobytes(), 'big')
+
+    def drift(self, a: int, b: int) -> float:
+        """Share of fingerprint bits that differ"""
+        # bin().count rather than int.bit_count, which needs Python 3.10
+        return bin(a ^ b).count("1") / float(self.grid[0] * self.grid[1])
+
+    def lookup(self, key: Hashable, frame: np.ndarray,
+               now: Optional[float] = None) -> Tuple[Optional[List[Dict[str, Any]]], int]:
+        """Return (cached detections or None, fingerprint of ``frame``)"""
+        now = time.monotonic() if now is None else now
+        fingerprint = self.fingerprint(frame)
+        with self._lock:
+            entry = self._entries.get(key)
+        if (entry is None or entry.shape != frame.shape[:2] or now - entry.timestamp > self.max_age
+                or self.drift(fingerprint, entry.fingerprint) > self.max_drift):
+            self.misses += 1
+            return None, fingerprint
+
+        self.hits += 1
+        return copy.deepcopy(entry.detections), fingerprint
+
+    def store(self, key: Hashable, frame: np.ndarray, fingerprint: int, detections: List[Dict[str, Any]],
+              now: Optional[float] = None):
+        """Remember the detections of a full detection pass"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._entries[key] = _SceneEntry(frame.shape[:2], fingerprint, copy.deepcopy(detections), now)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Forget one camera, or every camera when no key is given"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {'cameras': len(self._entries), 'hits': self.hits, 'misses': self.misses}
@@ -81,6 +81,15 @@ class ShelfResponse(ShelfBase):
     class Config:
         from_attributes = True
 
+# Computer vision settings schemas (held in memory by the CV processor)
+class CameraCVSettings(BaseModel):
+    analysis_scale: Optional[float] = None
+    metric_profile: Optional[str] = None  # "full", "balanced" or "fast"
+
+class ShelfCVSettings(BaseModel):
+    analysis_scale: Optional[float] = None
+    scoring_mode: Optional[str] = None  # "features", "reference" or "cnn"
+
 # Alert schemas
 class AlertBase(BaseModel):
     priority: str
@@ -0,0 +1,176 @@
+import cv2
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Candidate arrays: boxes are float64 (N, 4) [x, y, w, h], scores float64 (N,)
+Candidates = Tuple[np.ndarray, np.ndarray]
+
+DETECTORS = ("contours", "lines")
+
+def _empty() -> Candidates:
+    return np.zeros((0, 4)), np.zeros(0)
+
+def edge_map(frame: np.ndarray) -> np.ndarray:
+    """Canny edges of the blurred gray frame, shared by the detectors"""
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+    return cv2.Canny(cv2.GaussianBlur(gray, (5, 5), 0), 50, 150)
+
+def contour_candidates(edges: np.ndarray, min_area: float = 5000, min_aspect: float = 1.5,
+                       min_width: int = 100, min_height: int = 50) -> Candidates:
+    """Wide bounding boxes of large external contours; confidence grows with contour area"""
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    boxes, scores = [], []
+    for contour in contours:
+        area = cv2.contourArea(contour)
+        if area < min_area:
+            continue
+        x, y, w, h = cv2.boundingRect(contour)
+        if w / h > min_aspect and w > min_width and h > min_height:
+            boxes.append((x, y, w, h))
+            scores.append(min(area / 10000, 1.0))
+    if not boxes:
+        return _empty()
+    return np.array(boxes, dtype=np.float64), np.array(scores, dtype=np.float64)
+
+def horizontal_segments(edges: np.ndarray, threshold: int = 50, min_length: int = 100,
+                        max_gap: int = 20, max_angle: float = 10.0) -> np.ndarray:
+    """Near-horizontal HoughLinesP segments as an (N, 3) array of [x_left, x_right, y_mid]"""
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold, minLineLength=min_length, maxLineGap=max_gap)
+    if lines is None:
+        return np.zeros((0, 3))
+    x1, y1, x2, y2 = lines.reshape(-1, 4).astype(np.float64).T
+    angle = np.degrees(np.abs(np.arctan2(y2 - y1, x2 - x1)))
+    keep = (angle < max_angle) | (angle > 180 - max_angle)
+    return np.stack([np.minimum(x1, x2), np.maximum(x1, x2), (y1 + y2) / 2], axis=1)[keep]
+
+def merge_rows(segments: np.ndarray, y_tolerance: float = 6.0) -> np.ndarray:
+    """Merge segments lying on the same shelf edge into rows of [x_left, x_right, y, covered length].
+
+    One sorted sweep over y: a segment more than ``y_tolerance`` below the
+    first segment of the current row starts a new row. Measuring from the
+    row's first segment rather than the previous one keeps dense clutter from
+    chaining every edge of the frame into a single row.
+    """
+    if len(segments) == 0:
+        return np.zeros((0, 4))
+    segments = segments[np.argsort(segments[:, 2], kind='stable')]
+    row_ids = np.empty(len(segments), dtype=np.intp)
+    row, row_y = 0, segments[0, 2]
+    for index, y in enumerate(segments[:, 2].tolist()):
+        if y - row_y > y_tolerance:
+            row, row_y = row + 1, y
+        row_ids[index] = row
+    rows = row + 1
+    lengths = segments[:, 1] - segments[:, 0]
+    left = np.full(rows, np.inf)
+    right = np.full(rows, -np.inf)
+    np.minimum.at(left, row_ids, segments[:, 0])
+    np.maximum.at(right, row_ids, segments[:, 1])
+    covered = np.bincount(row_ids, weights=lengths, minlength=rows)
+    y = np.bincount(row_ids, weights=segments[:, 2] * lengths, minlength=rows) / np.maximum(covered, 1e-9)
+    return np.stack([left, right, y, covered], axis=1)
+
+def pair_rows(rows: np.ndarray, min_height: float = 80, max_height: float = 150, padding: int = 5) -> Candidates:
+    """Pair each shelf edge with the nearest edge ``min_height``..``max_height`` below it.
+
+    Rows are sorted by y, so the partner is found with a binary search instead
+    of scanning every later row. As in the original Hough detector, a bottom
+    edge becomes the top edge of the next shelf. Confidence is the share of
+    the box width covered by the two edges.
+    """
+    if len(rows) < 2:
+        return _empty()
+    ys = rows[:, 2]
+    partners = np.searchsorted(ys, ys + min_height, side='left')
+    boxes, scores = [], []
+    top = 0
+    while top < len(rows) - 1:
+        bottom = partners[top]
+        if bottom < len(rows) and ys[bottom] - ys[top] <= max_height:
+            x = min(rows[top, 0], rows[bottom, 0])
+            w = max(rows[top, 1], rows[bottom, 1]) - x
+            h = ys[bottom] - ys[top] - 2 * padding
+            if w > 0 and h > 0:
+                boxes.append((x, ys[top] + padding, w, h))
+                scores.append(min((rows[top, 3] + rows[bottom, 3]) / (2 * w), 1.0))
+            top = bottom
+        else:
+            top += 1
+    if not boxes:
+        return _empty()
+    return np.round(np.array(boxes, dtype=np.float64)), np.array(scores, dtype=np.float64)
+
+def line_candidates(edges: np.ndarray, min_height: float = 80, max_height: float = 150) -> Candidates:
+    """Shelf boxes between pairs of horizontal Hough edges"""
+    return pair_rows(merge_rows(horizontal_segments(edges)), min_height, max_height)
+
+def box_iou(box: np.ndarray, boxes: np.ndarray) -> np.ndarray:
+    """IoU of one [x, y, w, h] box against an (N, 4) array"""
+    x0 = np.maximum(box[0], boxes[:, 0])
+    y0 = np.maximum(box[1], boxes[:, 1])
+    x1 = np.minimum(box[0] + box[2], boxes[:, 0] + boxes[:, 2])
+    y1 = np.minimum(box[1] + box[3], boxes[:, 1] + boxes[:, 3])
+    intersection = np.clip(x1 - x0, 0, None) * np.clip(y1 - y0, 0, None)
+    union = box[2] * box[3] + boxes[:, 2] * boxes[:, 3] - intersection
+    return intersection / np.maximum(union, 1e-9)
+
+def non_max_suppression(boxes: np.ndarray, scores: np.ndarray,
+                        iou_threshold: float = 0.4) -> List[Tuple[int, np.ndarray]]:
+    """Greedy NMS; returns (kept index, indices it suppressed, itself included) in score order.
+
+    Each step compares the best remaining box with all others in one
+    vectorised IoU computation.
+    """
+    order = np.argsort(-scores, kind='stable')
+    kept = []
+    while order.size:
+        best = order[0]
+        overlaps = box_iou(boxes[best], boxes[order])
+        cluster = overlaps > iou_threshold
+        cluster[0] = True
+        kept.append((int(best), order[cluster]))
+        order = order[~cluster]
+    return kept
+
+def detect_shelves(frame: np.ndarray, detectors: Sequence[str] = DETECTORS, iou_threshold: float = 0.4,
+                   max_results: Optional[int] = None, line_heights: Tuple[float, float] = (80, 150)) -> List[Dict[str, Any]]:
+    """Run the shelf detectors and merge their candidates with NMS.
+
+    Every kept box gets a confidence of ``1 - prod(1 - c)`` over the best
+    candidate of each detector in its cluster, so boxes found by both the
+    contour and the line detector rank above boxes only one of them found.
+    """
+    unknown = [name for name in detectors if name not in DETECTORS]
+    if unknown or not detectors:
+        raise ValueError(f"Shelf detectors must be a non-empty subset of {DETECTORS}, got {list(detectors)}")
+    edges = edge_map(frame)
+
+    found = []
+    if "contours" in detectors:
+        found.append(("contours",) + contour_candidates(edges))
+    if "lines" in detectors:
+        found.append(("lines",) + line_candidates(edges, *line_heights))
+    boxes = np.concatenate([boxes for _, boxes, _ in found])
+    scores = np.concatenate([scores for _, _, scores in found])
+    sources = np.concatenate([np.full(len(scores), index) for index, (_, _, scores) in enumerate(found)])
+    if len(scores) == 0:
+        return []
+
+    shelves = []
+    for best, cluster in non_max_suppression(boxes, scores, iou_threshold):
+        best_by_detector = {}
+        for index in cluster:
+            source = int(sources[index])
+            best_by_detector[source] = max(best_by_detector.get(source, 0.0), float(scores[index]))
+        confidence = 1.0 - float(np.prod([1.0 - score for score in best_by_detector.values()]))
+        x, y, w, h = (int(value) for value in boxes[best])
+        shelves.append({
+            'region': [x, y, w, h],
+            'area': float(w * h),
+            'aspect_ratio': w / h,
+            'confidence': confidence,
+            'detectors': [found[source][0] for source in sorted(best_by_detector)],
+        })
+
+    shelves.sort(key=lambda shelf: shelf['confidence'], reverse=True)
+    return shelves[:max_results] if max_results is not None else shelves
@@ -0,0 +1,116 @@
+import threading
+import time
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+# Stock levels in ascending order, as produced by CVProcessor.classify_stock_level
+STOCK_LEVELS = ("EMPTY", "LOW", "MEDIUM", "HIGH")
+
+def level_cut_points(empty_threshold: float = 0.15) -> List[float]:
+    """Score boundaries between consecutive stock levels"""
+    return [empty_threshold, max(0.3, empty_threshold), max(0.7, empty_threshold)]
+
+class ShelfTransition(NamedTuple):
+    previous_level: Optional[str]
+    level: str
+    smoothed_score: float
+
+    @property
+    def restocked(self) -> bool:
+        """A move from EMPTY or LOW up to MEDIUM or HIGH"""
+        return (self.previous_level is not None and STOCK_LEVELS.index(self.previous_level) <= 1
+                and STOCK_LEVELS.index(self.level) >= 2)
+
+class _ShelfState:
+    def __init__(self, smoothed: float, level: Optional[str], now: float):
+        self.smoothed = smoothed
+        self.level = level
+        self.candidate: Optional[str] = None
+        self.candidate_since = now
+        self.updated_at = now
+
+class ShelfStateTracker:
+    """Smooth per-shelf occupancy scores and report only stable stock-level transitions.
+
+    Scores are smoothed with an EMA (``alpha`` is the weight of the newest
+    score). The stable level only moves once the smoothed score is more than
+    ``hysteresis`` past a level boundary, and the new level has to hold for
+    ``min_dwell`` seconds before the transition is reported. A new shelf has
+    no stable level until its first one has held for ``min_dwell`` too, which
+    is then reported as a transition from None; until then the level of the
+    smoothed score is returned without a transition, so a single bad first
+    frame cannot raise an alert. After ``max_idle`` seconds without scores the
+    EMA restarts from the next score.
+    """
+
+    def __init__(self, alpha: float = 0.3, hysteresis: float = 0.03, min_dwell: float = 10.0,
+                 max_idle: float = 600.0):
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError(f"EMA alpha must be in (0, 1], got {alpha}")
+        self.alpha = alpha
+        self.hysteresis = hysteresis
+        self.min_dwell = min_dwell
+        self.max_idle = max_idle
+
+        self._states: Dict[Hashable, _ShelfState] = {}
+        self._lock = threading.Lock()
+        self.updates = 0
+        self.transitions = 0
+
+    def _target_level(self, level: str, smoothed: float, cut_points: List[float]) -> str:
+        index = STOCK_LEVELS.index(level)
+        while index < len(cut_points) and smoothed >= cut_points[index] + self.hysteresis:
+            index += 1
+        while index > 0 and smoothed < cut_points[index - 1] - self.hysteresis:
+            index -= 1
+        return STOCK_LEVELS[index]
+
+    def update(self, key: Hashable, score: float, empty_threshold: float = 0.15,
+               now: Optional[float] = None) -> Tuple[float, str, Optional[ShelfTransition]]:
+        """Feed one score; returns (smoothed score, stable level, transition or None)"""
+        now = time.monotonic() if now is None else now
+        cut_points = level_cut_points(empty_threshold)
+
+        with self._lock:
+            self.updates += 1
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _ShelfState(score, None, now)
+            elif now - state.updated_at > self.max_idle:
+                state.smoothed = score
+            else:
+                state.smoothed += self.alpha * (score - state.smoothed)
+            state.updated_at = now
+
+            if state.level is None:
+                target = STOCK_LEVELS[sum(state.smoothed >= cut for cut in cut_points)]
+            else:
+                target = self._target_level(state.level, state.smoothed, cut_points)
+                if target == state.level:
+                    state.candidate = None
+                    return state.smoothed, state.level, None
+            if target != state.candidate:
+                state.candidate = target
+                state.candidate_since = now
+            if now - state.candidate_since < self.min_dwell:
+                return state.smoothed, state.level or target, None
+
+            transition = ShelfTransition(state.level, target, state.smoothed)
+            state.level = target
+            state.candidate = None
+            self.transitions += 1
+            return state.smoothed, state.level, transition
+
+    def get_level(self, key: Hashable) -> Optional[str]:
+        state = self._states.get(key)
+        return state.level if state is not None else None
+
+    def discard(self, key: Hashable):
+        with self._lock:
+            self._states.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {'shelves': len(self._states), 'updates': self.updates, 'transitions': self.transitions}
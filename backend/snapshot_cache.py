@@ -0,0 +1,168 @@
+import hashlib
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, NamedTuple, Optional, Tuple, Union
+
+import cv2
+import numpy as np
+
+from cv_executor import decode_image
+
+logger = logging.getLogger(__name__)
+
+# Thumbnail widths of the per-frame resolution pyramid
+SNAPSHOT_WIDTHS = (160, 320, 640)
+
+JPEG_MAGIC = b"\xff\xd8\xff"
+
+class Snapshot(NamedTuple):
+    jpeg: bytes
+    etag: str
+    width: int
+    height: int
+    timestamp: float
+
+class _SnapshotEntry:
+    def __init__(self, original: Snapshot):
+        self.original = original
+        # Built on the first thumbnail request for this frame, then reused: width -> Snapshot
+        self.pyramid: Optional[Dict[int, Snapshot]] = None
+        self.nbytes = len(original.jpeg)
+
+class SnapshotCache:
+    """Last frame of each camera as JPEG bytes, plus a lazily built thumbnail pyramid.
+
+    Uploaded JPEGs are kept as they arrived, without re-encoding; decoded
+    frames (server-side ingestion) and other formats are encoded once. ETags
+    are content hashes, so a frame that has not changed revalidates as 304
+    even across new uploads. The first thumbnail request for a frame decodes
+    it once, at reduced size where the JPEG allows it, and encodes every width
+    in ``widths`` from it; later requests of any size reuse those bytes.
+    Least recently updated cameras are evicted once ``max_bytes`` is exceeded.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, widths: Tuple[int, ...] = SNAPSHOT_WIDTHS,
+                 quality: int = 85):
+        self.max_bytes = max_bytes
+        self.widths = tuple(sorted(widths))
+        self.quality = quality
+        self._entries: 'OrderedDict[Hashable, _SnapshotEntry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.evictions = 0
+        self.pyramids = 0
+
+    def _encode(self, frame: np.ndarray) -> bytes:
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+        if not ok:
+            raise ValueError("JPEG encoding failed")
+        return jpeg.tobytes()
+
+    @staticmethod
+    def _snapshot(jpeg: bytes, width: int, height: int, timestamp: float) -> Snapshot:
+        return Snapshot(jpeg, f'"{hashlib.blake2b(jpeg, digest_size=12).hexdigest()}"', width, height, timestamp)
+
+    def put(self, camera_id: Hashable, image: Union[bytes, np.ndarray]):
+        """Store a camera's newest frame, given as encoded image bytes or a BGR frame"""
+        if isinstance(image, np.ndarray):
+            frame = image
+            jpeg = self._encode(frame)
+        elif bytes(image[:3]) == JPEG_MAGIC:
+            jpeg = bytes(image)
+            frame = None
+        else:
+            frame = decode_image(image)
+            jpeg = self._encode(frame)
+
+        if frame is None:
+            # Header-only read of the size; the pixels are decoded when a thumbnail is first asked for
+            height, width = self._jpeg_size(jpeg)
+            if not height or not width:
+                # No start-of-frame in the marker walk (e.g. stray bytes between segments); decoders tolerate it
+                height, width = decode_image(jpeg).shape[:2]
+        else:
+            height, width = frame.shape[:2]
+        entry = _SnapshotEntry(self._snapshot(jpeg, width, height, time.time()))
+
+        with self._lock:
+            previous = self._entries.pop(camera_id, None)
+            if previous is not None:
+                self.total_bytes -= previous.nbytes
+            self._entries[camera_id] = entry
+            self.total_bytes += entry.nbytes
+            # Always keep the newest frame, even if it alone exceeds the cap
+            while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= evicted.nbytes
+                self.evictions += 1
+
+    @staticmethod
+    def _jpeg_size(jpeg: bytes) -> Tuple[int, int]:
+        """(height, width) from a JPEG's start-of-frame marker, or (0, 0) if it cannot be found"""
+        position = 2
+        while position + 9 < len(jpeg):
+            if jpeg[position] != 0xFF:
+                break
+            if jpeg[position + 1] == 0xFF:
+                position += 1  # fill byte before a marker
+                continue
+            marker = jpeg[position + 1]
+            length = int.from_bytes(jpeg[position + 2:position + 4], "big")
+            # SOF0-SOF15, except DHT (C4), JPG (C8) and DAC (CC)
+            if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+                return (int.from_bytes(jpeg[position + 5:position + 7], "big"),
+                        int.from_bytes(jpeg[position + 7:position + 9], "big"))
+            position += 2 + length
+        return 0, 0
+
+    def get(self, camera_id: Hashable, width: Optional[int] = None) -> Optional[Snapshot]:
+        """The camera's last frame, or the smallest pyramid level at least ``width`` wide"""
+        with self._lock:
+            entry = self._entries.get(camera_id)
+        if entry is None:
+            return None
+        original = entry.original
+        if width is None or width >= original.width or not self.widths or width > self.widths[-1]:
+            return original
+
+        pyramid = entry.pyramid
+        if pyramid is None:
+            pyramid = self._build_pyramid(original)
+            with self._lock:
+                if self._entries.get(camera_id) is entry and entry.pyramid is None:
+                    entry.pyramid = pyramid
+                    added = sum(len(level.jpeg) for level in pyramid.values())
+                    entry.nbytes += added
+                    self.total_bytes += added
+                    self.pyramids += 1
+        for level_width in sorted(pyramid):
+            if level_width >= width:
+                return pyramid[level_width]
+        return original
+
+    def _build_pyramid(self, original: Snapshot) -> Dict[int, Snapshot]:
+        """Every thumbnail width below the frame's own, from one (reduced) decode"""
+        widths = [width for width in self.widths if width < original.width]
+        if not widths:
+            return {}
+        # JPEGs are DCT-scaled while decoding, so most of the downscaling is free
+        reduction = 1
+        for candidate in (4, 2):
+            if original.width // candidate >= widths[-1]:
+                reduction = candidate
+                break
+        frame = decode_image(original.jpeg, reduction)
+
+        pyramid = {}
+        for width in reversed(widths):
+            height = max(1, int(round(frame.shape[0] * width / frame.shape[1])))
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+            pyramid[width] = self._snapshot(self._encode(frame), width, height, original.timestamp)
+        return pyramid
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'cameras': len(self._entries), 'total_bytes': self.total_bytes, 'max_bytes': self.max_bytes,
+                    'evictions': self.evictions, 'pyramids': self.pyramids, 'widths': list(self.widths)}
@@ -0,0 +1,40 @@
+import numpy as np
+
+from bg_registry import BackgroundModelRegistry, merge_snapshots
+
+def test_save_and_load_seed_models_lazily(tmp_path):
+    path = str(tmp_path / "bg.npz")
+    registry = BackgroundModelRegistry()
+    frame = np.full((40, 60), 120, dtype=np.uint8)
+    for _ in range(3):
+        registry.apply((1, 7), frame)
+    assert registry.save(path) == 1
+
+    restored = BackgroundModelRegistry()
+    assert restored.load(path) == 1
+    assert restored.stats()['seeds'] == 1
+    assert (1, 7) not in restored
+
+    restored.apply((1, 7), frame)
+    assert restored.stats()['seeds'] == 0
+    assert (1, 7) in restored
+
+def test_unused_seeds_survive_another_save(tmp_path):
+    path = str(tmp_path / "bg.npz")
+    registry = BackgroundModelRegistry()
+    registry.apply(("cam", 1), np.zeros((20, 20), dtype=np.uint8))
+    registry.save(path)
+
+    restored = BackgroundModelRegistry()
+    restored.load(path)
+    assert restored.save(path) == 1
+    assert [key for key, _, _ in restored.snapshot()] == [("cam", 1)]
+
+def test_merge_snapshots_keeps_most_trained_model():
+    young = np.zeros((2, 2), dtype=np.uint8)
+    old = np.ones((2, 2), dtype=np.uint8)
+    merged = merge_snapshots([[((1, 1), 3, young)], [((1, 1), 40, old), ((2, 1), 1, young)]])
+    merged = {key: (frames, background) for key, frames, background in merged}
+    assert merged[(1, 1)][0] == 40
+    assert merged[(1, 1)][1] is old
+    assert (2, 1) in merged
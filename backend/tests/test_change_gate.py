@@ -0,0 +1,44 @@
+import numpy as np
+
+from change_gate import ShelfChangeGate
+
+REGION = [0, 0, 64, 32]
+
+def roi(value, noise=0):
+    rng = np.random.default_rng(0)
+    base = np.full((32, 64), value, dtype=np.int16)
+    return np.clip(base + rng.integers(-noise, noise + 1, base.shape), 0, 255).astype(np.uint8)
+
+def test_unchanged_roi_reuses_score():
+    gate = ShelfChangeGate(tolerance=2.0)
+    fingerprint = gate.fingerprint(roi(100))
+    assert fingerprint.shape == (16, 16)
+    assert gate.lookup(1, REGION, fingerprint, now=0.0) is None
+    gate.store(1, REGION, fingerprint, 0.42, now=0.0)
+    assert gate.lookup(1, REGION, gate.fingerprint(roi(101, noise=3)), now=1.0) == 0.42
+    assert gate.stats() == {'shelves': 1, 'hits': 1, 'misses': 1}
+
+def test_change_beyond_tolerance_misses():
+    gate = ShelfChangeGate(tolerance=2.0)
+    gate.store(1, REGION, gate.fingerprint(roi(100)), 0.42, now=0.0)
+    assert gate.lookup(1, REGION, gate.fingerprint(roi(110)), now=1.0) is None
+
+def test_compares_against_last_analysed_frame():
+    # 103 is within the tolerance of the previous frame (101), but not of the analysed one (100)
+    gate = ShelfChangeGate(tolerance=2.0)
+    gate.store(1, REGION, gate.fingerprint(roi(100)), 0.42, now=0.0)
+    assert gate.lookup(1, REGION, gate.fingerprint(roi(101)), now=1.0) == 0.42
+    assert gate.lookup(1, REGION, gate.fingerprint(roi(103)), now=2.0) is None
+
+def test_region_change_age_and_invalidate_miss():
+    gate = ShelfChangeGate(max_age=30.0)
+    fingerprint = gate.fingerprint(roi(100))
+    gate.store(1, REGION, fingerprint, 0.42, now=0.0)
+    assert gate.lookup(1, [0, 0, 64, 33], fingerprint, now=1.0) is None
+    assert gate.lookup(1, REGION, fingerprint, now=31.0) is None
+    gate.store(2, REGION, fingerprint, 0.5, now=0.0)
+    gate.invalidate(1)
+    assert gate.lookup(1, REGION, fingerprint, now=1.0) is None
+    assert gate.lookup(2, REGION, fingerprint, now=1.0) == 0.5
+    gate.invalidate()
+    assert gate.stats()['shelves'] == 0
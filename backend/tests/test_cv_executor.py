@@ -0,0 +1,96 @@
+import asyncio
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+
+import cv_executor
+from cv_executor import CVWorkerPool, ImageDecodeError, decode_image
+from cv_processor import CVProcessor, ShelfSpec
+from frame_ring import FrameRef, FrameRing
+
+def test_cameras_are_pinned_to_the_least_loaded_worker():
+    pool = CVWorkerPool(CVProcessor(), kind="process", max_workers=3)
+    try:
+        assigned = [pool._worker_index(camera_id) for camera_id in (10, 11, 12, 13)]
+        assert assigned == [0, 1, 2, 0]
+        assert [pool._worker_index(camera_id) for camera_id in (12, 10, 11)] == [2, 0, 1]
+    finally:
+        pool.shutdown()
+
+def test_process_worker_keeps_camera_state_across_calls():
+    processor = CVProcessor()
+    pool = CVWorkerPool(processor, kind="process", max_workers=2)
+    frame = np.full((240, 320, 3), 128, np.uint8)
+    shelves = [ShelfSpec(id=1, name="a", region=[10, 10, 100, 60], camera_id=5)]
+
+    async def score_twice():
+        first = await pool.run_processor(5, "score_frame", frame, shelves)
+        await pool.reconfigure()
+        second = await pool.run_processor(5, "score_frame", frame, shelves)
+        return first, second
+
+    try:
+        first, second = asyncio.run(score_twice())
+    finally:
+        pool.shutdown()
+    assert not first[0].from_cache
+    # Same worker and an unchanged settings push: the change gate still has the shelf
+    assert second[0].from_cache
+
+def test_worker_closes_rings_a_camera_moved_away_from(monkeypatch):
+    monkeypatch.setattr(cv_executor, "_worker_processor", CVProcessor())
+    monkeypatch.setattr(cv_executor, "_worker_rings", OrderedDict())
+    monkeypatch.setattr(cv_executor, "_worker_camera_rings", {})
+    shelves = [ShelfSpec(id=1, name="a", region=[10, 10, 100, 60], camera_id=5)]
+    old = FrameRing.create((120, 160, 3), slots=2)
+    new = FrameRing.create((240, 320, 3), slots=2)
+    try:
+        ref = FrameRef(old.name, old.write(np.zeros(old.shape, np.uint8)))
+        cv_executor._run_in_worker_process(5, "score_frame", ref, 1, shelves)
+        attached = cv_executor._worker_rings[old.name]
+
+        ref = FrameRef(new.name, new.write(np.zeros(new.shape, np.uint8)))
+        cv_executor._run_in_worker_process(5, "score_frame", ref, 1, shelves)
+        assert list(cv_executor._worker_rings) == [new.name]
+        assert attached.shm.buf is None
+
+        cv_executor._close_worker_rings()
+        assert cv_executor._worker_rings == {} and cv_executor._worker_camera_rings == {}
+    finally:
+        old.close()
+        new.close()
+
+def test_worker_keeps_at_most_max_rings_attached(monkeypatch):
+    monkeypatch.setattr(cv_executor, "_worker_rings", OrderedDict())
+    monkeypatch.setattr(cv_executor, "_worker_max_rings", 2)
+    rings = [FrameRing.create((8, 8, 3), slots=2) for _ in range(3)]
+    try:
+        refs = [FrameRef(ring.name, ring.write(np.zeros(ring.shape, np.uint8))) for ring in rings]
+        cv_executor._resolve_frame_ref(refs[0])
+        cv_executor._resolve_frame_ref(refs[1])
+        cv_executor._resolve_frame_ref(refs[0])
+        cv_executor._resolve_frame_ref(refs[2])
+        # The least recently used attachment was closed
+        assert list(cv_executor._worker_rings) == [rings[0].name, rings[2].name]
+        cv_executor._close_worker_rings()
+    finally:
+        for ring in rings:
+            ring.close()
+
+def test_apply_settings_only_invalidates_on_changes():
+    source = CVProcessor()
+    target = CVProcessor.from_settings(source.export_settings())
+    target.change_gate.store(1, [0, 0, 10, 10], np.zeros((16, 16), np.uint8), 0.5)
+    target.apply_settings(source.export_settings())
+    assert target.change_gate.stats()['shelves'] == 1
+
+    source.set_analysis_scale(0.5, camera_id=3)
+    target.apply_settings(source.export_settings())
+    assert target.camera_scales == {3: 0.5}
+    assert target.change_gate.stats()['shelves'] == 0
+
+def test_undecodable_bytes_raise_image_decode_error():
+    for data in (b"", b"not an image", b"\xff\xd8\xff" + b"\x00" * 64):
+        with pytest.raises(ImageDecodeError):
+            decode_image(data)
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from dnn_scorer import DnnOccupancyScorer
+from tiny_occupancy_cnn import write_tiny_occupancy_model
+
+def test_rois_are_scored_in_batches_of_max_batch(tmp_path):
+    path = write_tiny_occupancy_model(str(tmp_path / "tiny.onnx"), (16, 16))
+    rng = np.random.default_rng(0)
+    rois = [rng.integers(0, 255, (20 + i, 40, 3), dtype=np.uint8) for i in range(7)]
+
+    chunked = DnnOccupancyScorer(path, (16, 16), max_batch=3)
+    single_pass = DnnOccupancyScorer(path, (16, 16), max_batch=7)
+    assert chunked.score(rois) == pytest.approx(single_pass.score(rois), abs=1e-6)
+    assert chunked.stats()['batches'] == 3
+    assert single_pass.stats()['batches'] == 1
+    assert chunked.stats()['rois'] == 7
+
+def test_max_batch_is_validated():
+    with pytest.raises(ValueError):
+        DnnOccupancyScorer("model.onnx", max_batch=0)
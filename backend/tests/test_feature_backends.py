@@ -0,0 +1,64 @@
+import cv2
+import numpy as np
+import pytest
+
+from cv_features import OCCUPANCY_FEATURES
+from cv_processor import BatchedFramePlanes, CVProcessor, FramePlanes, RoiFramePlanes, union_bounds
+
+@pytest.mark.parametrize("scale", [1.0, 0.5])
+def test_batched_gray_features_match_planes(scale):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    frame[:, :160] //= 4
+    regions = [[0, 0, 300, 50], [10, 60, 37, 90], [150, 100, 170, 130], [5, 200, 20, 20]]
+    bounds = union_bounds(frame.shape, regions)
+    planes = FramePlanes(frame, bounds, scale)
+    batched = BatchedFramePlanes(frame, bounds, scale)
+    batched.expect(regions)
+    for name in ("color_variance", "histogram"):
+        feature = OCCUPANCY_FEATURES.features[name]
+        expected = [planes.measure(feature, region) for region in regions]
+        assert batched.batch_values(feature) == pytest.approx(expected, abs=1e-6)
+
+def test_sparse_shelves_get_per_roi_planes():
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    processor = CVProcessor()
+    sparse = [[0, 0, 40, 30], [600, 450, 40, 30]]
+    dense = [[0, 0, 320, 240], [300, 200, 340, 280]]
+    assert isinstance(processor.compute_frame_planes(frame, sparse), RoiFramePlanes)
+    assert not isinstance(processor.compute_frame_planes(frame, dense), RoiFramePlanes)
+
+    planes = processor.compute_frame_planes(frame, sparse)
+    shared = FramePlanes(frame, union_bounds(frame.shape, sparse))
+    for region in sparse:
+        assert np.array_equal(planes.roi('gray', region), shared.roi('gray', region))
+        feature = OCCUPANCY_FEATURES.features["color_variance"]
+        assert planes.measure(feature, region) == pytest.approx(shared.measure(feature, region))
+    assert planes.roi('gray', [100, 100, 10, 10]) is not None
+    assert planes.roi('gray', [630, 470, 20, 20]) is None
+
+def stocked_shelf(fill, seed):
+    """Shelf board ROI stocked with labelled boxes over ``fill`` of its width"""
+    rng = np.random.default_rng(seed)
+    roi = np.full((160, 300, 3), 150, np.uint8)
+    x = 0
+    while x < int(300 * fill):
+        width, height = int(rng.integers(12, 30)), int(rng.integers(80, 160))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(roi, (x, 160 - height), (x + width, 160), color, -1)
+        cv2.putText(roi, "A", (x + 2, 160 - height // 2), cv2.FONT_HERSHEY_SIMPLEX, 0.4, (255, 255, 255), 1)
+        x += width + int(rng.integers(1, 4))
+    return np.clip(roi + rng.normal(0, 4, roi.shape), 0, 255).astype(np.uint8)
+
+@pytest.mark.parametrize("fill,seed", [(0.0, 0), (0.35, 1), (0.5, 0), (1.0, 0)])
+def test_stock_level_is_stable_across_analysis_scales(fill, seed):
+    roi = stocked_shelf(fill, seed)
+    processor = CVProcessor()
+    processor.bg_registry = None
+    region = [0, 0, roi.shape[1], roi.shape[0]]
+    full = processor.analyze_shelf_occupancy(roi, region)
+    for scale in (0.5, 0.25):
+        score = processor.analyze_shelf_occupancy(roi, region, scale=scale)
+        assert processor.classify_stock_level(score) == processor.classify_stock_level(full)
+        assert score == pytest.approx(full, abs=0.05)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from frame_ring import FrameRing, FrameRingCapture, RING_URL_PREFIX, StaleFrameError
+
+@pytest.fixture
+def ring():
+    ring = FrameRing.create((4, 6, 3), slots=3)
+    yield ring
+    ring.close()
+
+def frame(value):
+    return np.full((4, 6, 3), value, dtype=np.uint8)
+
+def test_write_and_read_views(ring):
+    assert ring.latest() is None
+    seq = ring.write(frame(7), timestamp=123.0)
+    assert seq == 1
+    view = ring.get(seq)
+    assert (view == 7).all()
+    assert not view.flags.writeable
+    assert ring.timestamp(seq) == 123.0
+    assert ring.latest(after_seq=seq) is None
+
+def test_overwritten_slots_are_stale(ring):
+    seqs = [ring.write(frame(value)) for value in range(4)]
+    assert not ring.is_current(seqs[0])
+    with pytest.raises(StaleFrameError):
+        ring.get(seqs[0])
+    assert all(ring.is_current(seq) for seq in seqs[1:])
+    latest_seq, view = ring.latest()
+    assert latest_seq == seqs[-1] and (view == 3).all()
+
+def test_shape_is_checked(ring):
+    with pytest.raises(ValueError):
+        ring.write(np.zeros((4, 6), dtype=np.uint8))
+
+def test_gray_rings_return_2d_frames():
+    ring = FrameRing.create((4, 6), slots=2)
+    try:
+        seq = ring.write(np.full((4, 6), 9, dtype=np.uint8))
+        assert ring.get(seq).shape == (4, 6)
+    finally:
+        ring.close()
+
+def test_attached_reader_sees_writes(ring):
+    reader = FrameRing.attach(ring.name)
+    try:
+        seq = ring.write(frame(42))
+        assert (reader.get(seq) == 42).all()
+    finally:
+        reader.close()
+    # Closing a reader must not unlink the owner's segment
+    reader = FrameRing.attach(ring.name)
+    assert (reader.get(seq) == 42).all()
+    reader.close()
+
+def test_capture_reads_copies(ring):
+    capture = FrameRingCapture(RING_URL_PREFIX + ring.name, timeout=0.05)
+    try:
+        assert capture.isOpened()
+        assert capture.read() == (False, None)
+        ring.write(frame(5))
+        ret, image = capture.read()
+        assert ret and image.flags.writeable and (image == 5).all()
+    finally:
+        capture.release()
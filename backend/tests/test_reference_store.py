@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from reference_store import ReferenceSnapshotStore
+
+def test_first_frame_is_captured():
+    store = ReferenceSnapshotStore()
+    roi = np.full((40, 80), 100, dtype=np.uint8)
+    assert store.score((1, 1), roi) == (1.0, True)
+    assert store.score((1, 1), roi) == (1.0, False)
+    assert store.captures == 1
+
+def test_score_falls_with_changed_share():
+    store = ReferenceSnapshotStore(diff_threshold=50, empty_change=0.6)
+    roi = np.full((40, 80), 100, dtype=np.uint8)
+    store.score((1, 1), roi)
+    changed = roi.copy()
+    changed[:, :24] = 200  # 30% of the pixels
+    score, captured = store.score((1, 1), changed)
+    assert not captured
+    assert score == pytest.approx(0.5)
+    changed[:, :] = 200
+    assert store.score((1, 1), changed)[0] == 0.0
+
+def test_resized_roi_keeps_the_reference():
+    store = ReferenceSnapshotStore()
+    stocked = np.full((40, 80), 100, dtype=np.uint8)
+    store.score((1, 1), stocked)
+
+    score, captured = store.score((1, 1), np.full((20, 40), 100, dtype=np.uint8))
+    assert (score, captured) == (1.0, False)
+    score, captured = store.score((1, 1), np.full((20, 40), 230, dtype=np.uint8))
+    assert (score, captured) == (0.0, False)
+    assert store.captures == 1
+    assert store.get((1, 1)).shape == (40, 80)
+
+def test_invalidate_recaptures_and_persists(tmp_path):
+    store = ReferenceSnapshotStore(str(tmp_path))
+    store.score((1, 2), np.full((10, 10), 50, dtype=np.uint8))
+    assert (tmp_path / "1_2.png").exists()
+
+    store.invalidate((1, 2))
+    assert not (tmp_path / "1_2.png").exists()
+    assert store.score((1, 2), np.full((10, 10), 200, dtype=np.uint8)) == (1.0, True)
+    assert ReferenceSnapshotStore(str(tmp_path)).get((1, 2))[0, 0] == 200
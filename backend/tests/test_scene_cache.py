@@ -0,0 +1,48 @@
+import numpy as np
+
+from scene_cache import SceneFingerprintCache
+
+def make_scene(seed=0, shift=0):
+    rng = np.random.default_rng(seed)
+    frame = np.full((360, 640, 3), 80, np.uint8)
+    for _ in range(12):
+        x, y = int(rng.integers(0, 560)), int(rng.integers(0, 300))
+        frame[y:y + 40, x + shift:x + shift + 80] = rng.integers(0, 255, 3)
+    return frame
+
+def test_drift_counts_differing_bits():
+    cache = SceneFingerprintCache(grid=(4, 2))
+    assert cache.drift(0b10110000, 0b10110000) == 0.0
+    assert cache.drift(0b10110000, 0b00110001) == 2 / 8
+    assert cache.drift(0, 0xFF) == 1.0
+
+def test_drift_handles_full_width_fingerprints():
+    cache = SceneFingerprintCache()
+    bits = cache.grid[0] * cache.grid[1]
+    assert cache.drift((1 << bits) - 1, 0) == 1.0
+
+def test_lookup_reuses_detections_until_the_scene_changes():
+    cache = SceneFingerprintCache()
+    frame = make_scene()
+    detections, fingerprint = cache.lookup(1, frame, now=0.0)
+    assert detections is None
+    cache.store(1, frame, fingerprint, [{'region': [0, 0, 10, 10]}], now=0.0)
+
+    # Lighting changes keep the edge layout
+    brighter = np.clip(frame.astype(np.int16) + 30, 0, 255).astype(np.uint8)
+    detections, _ = cache.lookup(1, brighter, now=1.0)
+    assert detections == [{'region': [0, 0, 10, 10]}]
+
+    detections, _ = cache.lookup(1, make_scene(seed=1), now=2.0)
+    assert detections is None
+
+def test_lookup_expires_and_copies():
+    cache = SceneFingerprintCache(max_age=10.0)
+    frame = make_scene()
+    _, fingerprint = cache.lookup(1, frame, now=0.0)
+    cache.store(1, frame, fingerprint, [{'region': [0, 0, 10, 10]}], now=0.0)
+    detections, _ = cache.lookup(1, frame, now=5.0)
+    detections[0]['region'][0] = 99
+    assert cache.lookup(1, frame, now=5.0)[0] == [{'region': [0, 0, 10, 10]}]
+    assert cache.lookup(1, frame, now=11.0)[0] is None
+    assert cache.lookup(1, frame[:200], now=5.0)[0] is None
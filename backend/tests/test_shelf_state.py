@@ -0,0 +1,55 @@
+import pytest
+
+from shelf_state import ShelfStateTracker
+
+def test_first_level_waits_for_dwell():
+    tracker = ShelfStateTracker(alpha=1.0, min_dwell=10.0)
+    assert tracker.update(1, 0.05, now=0.0) == (0.05, "EMPTY", None)
+    assert tracker.get_level(1) is None
+    _, level, transition = tracker.update(1, 0.05, now=10.0)
+    assert level == "EMPTY"
+    assert (transition.previous_level, transition.level) == (None, "EMPTY")
+    assert not transition.restocked
+    assert tracker.get_level(1) == "EMPTY"
+
+def test_bad_first_frame_does_not_transition():
+    tracker = ShelfStateTracker(alpha=1.0, min_dwell=10.0)
+    tracker.update(1, 0.0, now=0.0)
+    _, level, transition = tracker.update(1, 0.9, now=5.0)
+    assert (level, transition) == ("HIGH", None)
+    # The dwell restarts with the new level
+    assert tracker.update(1, 0.9, now=14.0)[2] is None
+    transition = tracker.update(1, 0.9, now=15.0)[2]
+    assert (transition.previous_level, transition.level) == (None, "HIGH")
+    assert tracker.transitions == 1
+
+def test_zero_dwell_reports_first_score():
+    tracker = ShelfStateTracker(min_dwell=0.0)
+    _, level, transition = tracker.update(1, 0.5, now=0.0)
+    assert level == "MEDIUM"
+    assert transition.previous_level is None
+
+def test_hysteresis_and_dwell_gate_transitions():
+    tracker = ShelfStateTracker(alpha=1.0, hysteresis=0.03, min_dwell=5.0)
+    tracker.update(1, 0.5, now=0.0)
+    tracker.update(1, 0.5, now=5.0)
+    # Within the hysteresis band of the 0.3 boundary: no candidate
+    assert tracker.update(1, 0.28, now=6.0) == (0.28, "MEDIUM", None)
+    assert tracker.update(1, 0.1, now=7.0)[1:] == ("MEDIUM", None)
+    smoothed, level, transition = tracker.update(1, 0.1, now=12.0)
+    assert level == "EMPTY"
+    assert transition.previous_level == "MEDIUM"
+    _, _, transition = tracker.update(1, 0.8, now=13.0)
+    assert transition is None
+    transition = tracker.update(1, 0.8, now=18.0)[2]
+    assert transition.restocked
+
+def test_ema_smooths_and_restarts_after_idle():
+    tracker = ShelfStateTracker(alpha=0.5, min_dwell=0.0, max_idle=60.0)
+    tracker.update(1, 1.0, now=0.0)
+    assert tracker.update(1, 0.0, now=1.0)[0] == pytest.approx(0.5)
+    assert tracker.update(1, 0.2, now=100.0)[0] == pytest.approx(0.2)
+
+def test_alpha_is_validated():
+    with pytest.raises(ValueError):
+        ShelfStateTracker(alpha=0.0)
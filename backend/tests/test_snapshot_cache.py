@@ -0,0 +1,30 @@
+import cv2
+import numpy as np
+import pytest
+
+from snapshot_cache import SnapshotCache
+
+@pytest.fixture
+def jpeg():
+    frame = np.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype=np.uint8)
+    return cv2.imencode(".jpg", frame)[1].tobytes()
+
+def insert_after_app0(jpeg, data):
+    end = 4 + int.from_bytes(jpeg[4:6], "big")
+    return jpeg[:end] + data + jpeg[end:]
+
+def test_size_is_read_past_appn_and_dqt_segments(jpeg):
+    # SOI, APP0, then an APP1 (Exif) segment ahead of the DQT and SOF segments
+    exif = insert_after_app0(jpeg, b"\xff\xe1" + (8).to_bytes(2, "big") + b"Exif\x00\x00")
+    assert SnapshotCache._jpeg_size(exif) == (480, 640)
+    assert SnapshotCache._jpeg_size(insert_after_app0(jpeg, b"\xff\xff")) == (480, 640)
+
+def test_size_falls_back_to_decoding_without_a_readable_sof(jpeg):
+    stray = insert_after_app0(jpeg, b"\x00\x13\x37")
+    assert SnapshotCache._jpeg_size(stray) == (0, 0)
+    cache = SnapshotCache()
+    cache.put(1, stray)
+    snapshot = cache.get(1)
+    assert (snapshot.height, snapshot.width) == (480, 640)
+    assert snapshot.jpeg == stray
+    assert cache.get(1, 160).width == 160
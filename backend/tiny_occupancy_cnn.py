@@ -0,0 +1,127 @@
+"""
+Writes a tiny occupancy CNN as an ONNX file, without onnx, torch or a network.
+
+The network is Conv(3->4, 3x3) -> Relu -> GlobalAveragePool -> Flatten ->
+Gemm(4->1) -> Sigmoid. Its filters are fixed horizontal and vertical
+gradient kernels, so it scores a shelf ROI by its mean edge strength: a
+bare shelf scores low, a shelf full of packaging high. It is not a trained
+model; it exists so the cv2.dnn scoring path (DnnOccupancyScorer) can be
+exercised and benchmarked anywhere, e.g. in CI.
+
+Usage (from the backend directory):
+    python tiny_occupancy_cnn.py occupancy_models/tiny_occupancy.onnx
+"""
+import argparse
+import os
+import struct
+
+import numpy as np
+
+ONNX_FLOAT = 1
+
+
+# Minimal protobuf wire-format encoding: enough for an ONNX ModelProto
+def _varint(value: int) -> bytes:
+    value &= (1 << 64) - 1
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint(field << 3 | wire_type)
+
+
+def _int(field: int, value: int) -> bytes:
+    return _key(field, 0) + _varint(value)
+
+
+def _bytes(field: int, value) -> bytes:
+    if isinstance(value, str):
+        value = value.encode()
+    return _key(field, 2) + _varint(len(value)) + value
+
+
+def _float(field: int, value: float) -> bytes:
+    return _key(field, 5) + struct.pack('<f', value)
+
+
+def _tensor(name: str, array: np.ndarray) -> bytes:
+    array = np.ascontiguousarray(array, dtype='<f4')
+    dims = b''.join(_int(1, dim) for dim in array.shape)
+    return dims + _int(2, ONNX_FLOAT) + _bytes(8, name) + _bytes(9, array.tobytes())
+
+
+def _value_info(name: str, shape) -> bytes:
+    dims = b''.join(_bytes(1, _bytes(2, dim) if isinstance(dim, str) else _int(1, dim)) for dim in shape)
+    tensor_type = _int(1, ONNX_FLOAT) + _bytes(2, dims)
+    return _bytes(1, name) + _bytes(2, _bytes(1, tensor_type))
+
+
+def _attribute(name: str, value) -> bytes:
+    if isinstance(value, float):
+        return _bytes(1, name) + _int(20, 1) + _float(2, value)
+    if isinstance(value, int):
+        return _bytes(1, name) + _int(20, 2) + _int(3, value)
+    return _bytes(1, name) + _int(20, 7) + b''.join(_int(8, item) for item in value)
+
+
+def _node(op_type: str, inputs, outputs, **attributes) -> bytes:
+    return (b''.join(_bytes(1, name) for name in inputs) + b''.join(_bytes(2, name) for name in outputs)
+            + _bytes(3, f"{op_type.lower()}_{outputs[0]}") + _bytes(4, op_type)
+            + b''.join(_bytes(5, _attribute(name, value)) for name, value in attributes.items()))
+
+
+def tiny_occupancy_onnx(input_size=(64, 64), gain: float = 100.0, offset: float = -2.5) -> bytes:
+    """ONNX bytes of the gradient-energy occupancy CNN for (width, height) inputs scaled to [0, 1]"""
+    width, height = input_size
+    gradient = np.array([[-1, 0, 1], [-2, 0, 2], [-1, 0, 1]], dtype=np.float32) / 8.0
+    kernels = np.stack([gradient, -gradient, gradient.T, -gradient.T])
+    # Each filter sees the mean of the three colour channels
+    conv_weight = np.repeat(kernels[:, None, :, :] / 3.0, 3, axis=1)
+    conv_bias = np.zeros(4, dtype=np.float32)
+    gemm_weight = np.full((1, 4), gain / 2.0, dtype=np.float32)
+    gemm_bias = np.array([offset], dtype=np.float32)
+
+    nodes = [
+        _node("Conv", ["input", "conv_w", "conv_b"], ["conv"], kernel_shape=[3, 3]),
+        _node("Relu", ["conv"], ["relu"]),
+        _node("GlobalAveragePool", ["relu"], ["pool"]),
+        _node("Flatten", ["pool"], ["flat"], axis=1),
+        _node("Gemm", ["flat", "gemm_w", "gemm_b"], ["logit"], transB=1),
+        _node("Sigmoid", ["logit"], ["occupancy"]),
+    ]
+    initializers = [_tensor("conv_w", conv_weight), _tensor("conv_b", conv_bias),
+                    _tensor("gemm_w", gemm_weight), _tensor("gemm_b", gemm_bias)]
+    graph = (b''.join(_bytes(1, node) for node in nodes) + _bytes(2, "tiny_occupancy")
+             + b''.join(_bytes(5, tensor) for tensor in initializers)
+             + _bytes(11, _value_info("input", ["batch", 3, height, width]))
+             + _bytes(12, _value_info("occupancy", ["batch", 1])))
+    return _int(1, 7) + _bytes(2, "stock-monitor") + _bytes(7, graph) + _bytes(8, _bytes(1, "") + _int(2, 11))
+
+
+def write_tiny_occupancy_model(path: str, input_size=(64, 64)) -> str:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(tiny_occupancy_onnx(input_size))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--size", type=int, nargs=2, default=[64, 64], metavar=("WIDTH", "HEIGHT"))
+    args = parser.parse_args()
+    print(f"Wrote {write_tiny_occupancy_model(args.path, tuple(args.size))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Offline trainer for learned occupancy models.
+
+Reads a JSONL manifest of labelled shelf snapshots, one per line:
+
+    {"image": "snapshots/0001.jpg", "region": [x, y, w, h], "occupancy": 0.4,
+     "store_id": 3, "product_category": "dairy"}
+
+``occupancy`` is the labelled fill level in [0, 1]; a ``level`` (EMPTY, LOW,
+MEDIUM or HIGH) may be given instead. Relative image paths are resolved
+against the manifest's directory. The feature vector of every snapshot is
+computed with the same code CVProcessor scores shelves with, and a linear
+(ridge) or logistic model is fitted on it.
+
+A default model is always written; with --by store or --by category a model
+is also written for every store / product category with at least
+--min-samples snapshots. CVProcessor picks them up from CV_MODEL_DIR (the
+category model first, then the store model, then the default one).
+
+The background-subtraction feature needs a video history, which single
+snapshots do not have, so it is left out of the default feature set.
+
+Usage (from the backend directory):
+    python train_occupancy.py manifest.jsonl [--kind logistic] [--by category] [--out occupancy_models]
+"""
+import argparse
+import json
+import os
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+from cv_processor import CVProcessor
+from occupancy_model import MODEL_KINDS, OccupancyModelRegistry, fit_model, model_filename
+from shelf_state import STOCK_LEVELS, level_cut_points
+
+# Fill level assumed for snapshots labelled with a stock level only
+LEVEL_OCCUPANCY = {"EMPTY": 0.05, "LOW": 0.22, "MEDIUM": 0.5, "HIGH": 0.85}
+
+DEFAULT_FEATURES = ["edge_density", "color_variance", "histogram", "contours"]
+
+
+def load_samples(manifest_path, processor, features, scale):
+    """(feature matrix, occupancy labels, store ids, categories) of a manifest"""
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    rows, labels, stores, categories = [], [], [], []
+    with open(manifest_path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if "occupancy" in item:
+                label = float(item["occupancy"])
+            elif item.get("level", "").upper() in LEVEL_OCCUPANCY:
+                label = LEVEL_OCCUPANCY[item["level"].upper()]
+            else:
+                raise ValueError(f"Line {line_number}: needs an occupancy or a stock level label")
+            path = item["image"] if os.path.isabs(item["image"]) else os.path.join(base, item["image"])
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Skipping line {line_number}: cannot read {path}")
+                continue
+            region = [int(value) for value in item["region"]]
+            planes = processor.compute_frame_planes(frame, [region], scale)
+            if planes is None or not planes.contains(region):
+                print(f"Skipping line {line_number}: region {region} is outside the image")
+                continue
+            rows.append([processor.evaluate_feature(planes, processor.features.features[name], region)
+                         for name in features])
+            labels.append(min(max(label, 0.0), 1.0))
+            stores.append(item.get("store_id"))
+            categories.append(item.get("product_category"))
+    return np.array(rows, dtype=np.float64), np.array(labels), stores, categories
+
+
+def level_index(scores, empty_threshold=0.15):
+    return np.searchsorted(level_cut_points(empty_threshold), scores, side="right")
+
+
+def evaluate(name, predicted, labels):
+    mae = float(np.mean(np.abs(predicted - labels)))
+    accuracy = float(np.mean(level_index(predicted) == level_index(labels)))
+    print(f"  {name:<12} MAE {mae:.3f}  stock-level accuracy {accuracy:.1%}")
+    return {'mae': round(mae, 4), 'level_accuracy': round(accuracy, 4)}
+
+
+def train(X, y, features, args, weights, rng, label):
+    """Fit one model, reporting holdout error against the hand-tuned blend"""
+    order = rng.permutation(len(y))
+    holdout = order[:int(len(y) * args.holdout)] if len(y) >= 10 else order[:0]
+    train_rows = order[len(holdout):]
+    print(f"{label}: {len(train_rows)} training / {len(holdout)} holdout snapshots")
+
+    model = fit_model(args.kind, features, X[train_rows], y[train_rows], args.l2)
+    metadata = {'samples': len(y), 'holdout': len(holdout)}
+    if len(holdout):
+        hand_tuned = np.minimum(X[holdout] @ weights / weights.sum(), 1.0)
+        evaluate("hand-tuned", hand_tuned, y[holdout])
+        metadata['holdout_metrics'] = evaluate(args.kind, model.predict(X[holdout]), y[holdout])
+    # The shipped model is refitted on every snapshot
+    return fit_model(args.kind, features, X, y, args.l2, metadata)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest")
+    parser.add_argument("--kind", choices=MODEL_KINDS, default="logistic")
+    parser.add_argument("--by", choices=["none", "store", "category"], default="none")
+    parser.add_argument("--features", nargs="+", default=DEFAULT_FEATURES)
+    parser.add_argument("--scale", type=float, default=1.0, help="analysis scale the features are computed at")
+    parser.add_argument("--l2", type=float, default=1e-3)
+    parser.add_argument("--holdout", type=float, default=0.2, help="share of snapshots held out for evaluation")
+    parser.add_argument("--min-samples", type=int, default=30)
+    parser.add_argument("--out", default=os.getenv("CV_MODEL_DIR", "occupancy_models"))
+    args = parser.parse_args()
+
+    processor = CVProcessor()
+    unknown = [name for name in args.features if name not in processor.features.features]
+    if unknown:
+        parser.error(f"Unknown features: {unknown}")
+    weights = np.array([processor.features.features[name].weight for name in args.features])
+
+    X, y, stores, categories = load_samples(args.manifest, processor, args.features, args.scale)
+    if len(y) < 2:
+        parser.error("Need at least two usable snapshots")
+    print(f"{len(y)} snapshots; labelled stock levels: "
+          + ", ".join(f"{level} {int(np.sum(level_index(y) == index))}" for index, level in enumerate(STOCK_LEVELS)))
+
+    rng = np.random.default_rng(0)
+    registry = OccupancyModelRegistry(args.out)
+    path = registry.save(train(X, y, args.features, args, weights, rng, "default"))
+    print(f"  wrote {path}")
+
+    if args.by != "none":
+        keys = stores if args.by == "store" else categories
+        groups = defaultdict(list)
+        for index, key in enumerate(keys):
+            if key is not None:
+                groups[key].append(index)
+        for key, indices in sorted(groups.items(), key=lambda item: str(item[0])):
+            if len(indices) < args.min_samples:
+                print(f"{args.by} {key}: only {len(indices)} snapshots, uses the default model")
+                continue
+            label = model_filename(**{'store_id' if args.by == "store" else 'category': key})
+            model = train(X[indices], y[indices], args.features, args, weights, rng, label)
+            if args.by == "store":
+                path = registry.save(model, store_id=key)
+            else:
+                path = registry.save(model, category=key)
+            print(f"  wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,9 +4,11 @@ import json
 import datetime
 from collections import deque
 import os
+import sys
 import threading
 import time
 import requests
+from pathlib import Path
 from typing import List, Dict, Any, Optional
 import logging
 from dataclasses import dataclass
@@ -17,6 +19,31 @@ import websockets
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Reuse the backend's per-shelf background model registry when it is available
+sys.path.append(str(Path(__file__).resolve().parent.parent / "backend"))
+try:
+    from cv_features import CostAccounting, FeatureRegistry
+except ImportError:
+    CostAccounting = None
+    FeatureRegistry = None
+try:
+    from scene_cache import SceneFingerprintCache
+except ImportError:
+    SceneFingerprintCache = None
+try:
+    from bg_registry import BackgroundModelRegistry
+except ImportError:
+    BackgroundModelRegistry = None
+try:
+    from shelf_state import ShelfStateTracker
+except ImportError:
+    ShelfStateTracker = None
+try:
+    from frame_ring import FrameRingCapture, RING_URL_PREFIX
+except ImportError:
+    FrameRingCapture = None
+    RING_URL_PREFIX = "shm://"
+
 @dataclass
 class ShelfConfig:
     id: int
@@ -25,9 +52,11 @@ class ShelfConfig:
     camera_id: int
     empty_threshold: float = 0.15
     product_category: str = ""
+    analysis_scale: Optional[float] = None  # falls back to the monitor's analysis_scale
+    metric_profile: Optional[str] = None  # falls back to the monitor's metric_profile
 
 class EnhancedStockMonitor:
-    def __init__(self, camera_id=0, api_base_url="http://localhost:8000", auth_token=""):
+    def __init__(self, camera_id=0, api_base_url="http://localhost:8000", auth_token="", bg_snapshot_path=None):
         self.camera_id = camera_id
         self.cap = None
         self.api_base_url = api_base_url
@@ -37,6 +66,13 @@ class EnhancedStockMonitor:
         # Configuration
         self.shelf_configs: List[ShelfConfig] = []
         self.empty_threshold = 0.15
+        self.analysis_scale = 1.0  # ROI downscale factor before feature extraction
+        # Without the backend's registry every feature is evaluated and costs are not recorded
+        self.features = self.build_feature_registry() if FeatureRegistry is not None else None
+        self.metric_profile = "full"  # or "fast": edges + gray variance only
+        self.feature_costs = CostAccounting() if CostAccounting is not None else None
+        # Shelf detections reused while the scene is unchanged (every call detects without the backend)
+        self.scene_cache = SceneFingerprintCache() if SceneFingerprintCache is not None else None
         self.alert_history = deque(maxlen=100)
         self.setup_mode = False
         self.monitoring = False
@@ -46,8 +82,14 @@ class EnhancedStockMonitor:
         self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
             history=500, varThreshold=16, detectShadows=True
         )
-        
-        # Alert system
+        # Per-shelf models (falls back to the shared subtractor without the backend)
+        self.bg_registry = BackgroundModelRegistry() if BackgroundModelRegistry is not None else None
+        self.bg_snapshot_path = bg_snapshot_path
+        if self.bg_registry is not None and bg_snapshot_path:
+            self.bg_registry.load(bg_snapshot_path)
+        
+        # Alert system: with the backend available, alerts fire on smoothed transitions to EMPTY only
+        self.shelf_states = ShelfStateTracker() if ShelfStateTracker is not None else None
         self.alert_cooldown = {}
         self.alert_duration = 300  # 5 minutes cooldown
         
@@ -67,7 +109,12 @@ class EnhancedStockMonitor:
             if isinstance(camera_source, int):
                 self.cap = cv2.VideoCapture(camera_source)
             elif isinstance(camera_source, str):
-                if camera_source.startswith(('rtsp://', 'http://', 'https://')):
+                if camera_source.startswith(RING_URL_PREFIX):
+                    # Frames shared by a separate capture process (backend/frame_ring.py)
+                    if FrameRingCapture is None:
+                        raise ValueError("Shared-memory frame rings need the backend package")
+                    self.cap = FrameRingCapture(camera_source)
+                elif camera_source.startswith(('rtsp://', 'http://', 'https://')):
                     self.cap = cv2.VideoCapture(camera_source)
                 elif os.path.exists(camera_source):
                     self.cap = cv2.VideoCapture(camera_source)
@@ -121,8 +168,20 @@ class EnhancedStockMonitor:
             logger.error(f"Error loading shelves from API: {str(e)}")
             return False
     
-    def detect_shelves_automatically(self, frame):
-        """Enhanced automatic shelf detection"""
+    def detect_shelves_automatically(self, frame, refresh=False):
+        """Enhanced automatic shelf detection, cached until the scene's edge layout drifts"""
+        if self.scene_cache is None:
+            return self.detect_shelves_full(frame)
+        if refresh:
+            self.scene_cache.invalidate(self.camera_id)
+        detections, fingerprint = self.scene_cache.lookup(self.camera_id, frame)
+        if detections is None:
+            detections = self.detect_shelves_full(frame)
+            self.scene_cache.store(self.camera_id, frame, fingerprint, detections)
+        return detections
+    
+    def detect_shelves_full(self, frame):
+        """Full detection pass: multi-threshold Canny, closing and contour filtering"""
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
         
         # Apply Gaussian blur
@@ -167,8 +226,15 @@ class EnhancedStockMonitor:
         potential_shelves.sort(key=lambda x: x['confidence'], reverse=True)
         return potential_shelves[:10]  # Return top 10 candidates
     
-    def analyze_shelf_occupancy_advanced(self, frame, shelf_region):
-        """Advanced shelf occupancy analysis with multiple techniques"""
+    def analyze_shelf_occupancy_advanced(self, frame, shelf_region, shelf_id=None, analysis_scale=None,
+                                         metric_profile=None):
+        """Advanced shelf occupancy analysis with multiple techniques.
+        
+        With an analysis scale below 1 the ROI is resized with INTER_AREA first and the
+        scale-dependent metrics (edge density, histogram variance, contour perimeter)
+        are rescaled back to their full-resolution range. ``metric_profile``
+        selects which registered features are evaluated.
+        """
         x, y, w, h = shelf_region
         
         # Validate region
@@ -180,51 +246,92 @@ class EnhancedStockMonitor:
         if shelf_roi.size == 0:
             return 0.0, shelf_roi
         
-        # Convert to different color spaces
-        gray_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2GRAY)
-        hsv_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2HSV)
-        lab_roi = cv2.cvtColor(shelf_roi, cv2.COLOR_BGR2LAB)
-        
-        # Method 1: Enhanced edge density analysis
-        edges = cv2.Canny(gray_roi, 50, 150)
-        edge_density = np.sum(edges > 0) / (edges.shape[0] * edges.shape[1])
-        
-        # Method 2: Multi-channel color variance
-        gray_variance = np.var(gray_roi)
-        color_variance = np.mean([np.var(hsv_roi[:,:,i]) for i in range(3)])
-        
-        # Method 3: Texture analysis using Local Binary Patterns
-        texture_score = self.calculate_texture_score(gray_roi)
-        
-        # Method 4: Advanced histogram analysis
-        hist_score = self.calculate_histogram_score(gray_roi)
-        
-        # Method 5: Background subtraction
-        try:
-            fg_mask = self.bg_subtractor.apply(shelf_roi)
-            foreground_ratio = np.sum(fg_mask > 0) / (fg_mask.shape[0] * fg_mask.shape[1])
-        except:
-            foreground_ratio = 0.0
-        
-        # Method 6: Contour complexity analysis
-        contour_score = self.calculate_contour_complexity(edges)
-        
-        # Method 7: Color distribution analysis
-        color_dist_score = self.calculate_color_distribution_score(hsv_roi)
-        
-        # Combine all metrics with weights
-        occupancy_score = (
-            edge_density * 0.20 +
-            min(gray_variance / 1000, 1.0) * 0.15 +
-            min(color_variance / 1000, 1.0) * 0.15 +
-            texture_score * 0.15 +
-            hist_score * 0.10 +
-            foreground_ratio * 0.10 +
-            contour_score * 0.10 +
-            color_dist_score * 0.05
-        )
-        
-        return min(occupancy_score, 1.0), shelf_roi
+        scale = self.analysis_scale if analysis_scale is None else analysis_scale
+        analysis_roi = shelf_roi
+        if scale != 1.0:
+            size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            analysis_roi = cv2.resize(shelf_roi, size, interpolation=cv2.INTER_AREA)
+        
+        # Only the planes the profile's features read are computed
+        planes = {"color": analysis_roi}
+        values = []
+        for name, plane, weight, fn in self.active_features(metric_profile):
+            if plane not in planes:
+                planes[plane] = self.compute_plane(plane, planes, shelf_region, shelf_id)
+            roi = planes[plane]
+            start = time.perf_counter()
+            value = fn(roi, scale) if roi is not None else 0.0
+            if self.feature_costs is not None:
+                self.feature_costs.record(name, time.perf_counter() - start)
+            values.append((weight, value))
+        
+        # Weighted mean, like FeatureRegistry.combine, so smaller profiles stay on the same 0-1 scale
+        total_weight = sum(weight for weight, _ in values)
+        if total_weight <= 0:
+            return 0.0, shelf_roi
+        return min(sum(weight * value for weight, value in values) / total_weight, 1.0), shelf_roi
+    
+    def feature_specs(self):
+        """(name, plane, weight, fn) of the advanced analysis' occupancy features"""
+        return [
+            # Edge density grows roughly as 1/scale
+            ("edge_density", "edges", 0.20,
+             lambda edges, scale: min(np.sum(edges > 0) / (edges.shape[0] * edges.shape[1]) * scale, 1.0)),
+            ("gray_variance", "gray", 0.15, lambda gray, scale: min(np.var(gray) / 1000, 1.0)),
+            ("color_variance", "hsv", 0.15,
+             lambda hsv, scale: min(np.mean([np.var(hsv[:, :, i]) for i in range(3)]) / 1000, 1.0)),
+            ("texture", "gray", 0.15, lambda gray, scale: self.calculate_texture_score(gray)),
+            ("histogram", "gray", 0.10, self.calculate_histogram_score),
+            ("foreground", "foreground", 0.10,
+             lambda fg_mask, scale: np.sum(fg_mask > 0) / (fg_mask.shape[0] * fg_mask.shape[1])),
+            ("contours", "edges", 0.10, self.calculate_contour_complexity),
+            ("color_distribution", "hsv", 0.05, self.calculate_color_distribution_score),
+        ]
+    
+    def active_features(self, metric_profile=None):
+        """(name, plane, weight, fn) of the features to evaluate; all of them without the backend's registry"""
+        if self.features is None:
+            return self.feature_specs()
+        return [feature[:4] for feature in self.features.resolve(metric_profile or self.metric_profile)]
+    
+    def build_feature_registry(self):
+        """Occupancy features of the advanced analysis and the metric profiles over them"""
+        features = FeatureRegistry()
+        for name, plane, weight, fn in self.feature_specs():
+            features.register(name, plane, weight, fn)
+        
+        features.add_profile("full", list(features.features))
+        features.add_profile("fast", ["edge_density", "gray_variance"])
+        return features
+    
+    def compute_plane(self, name, planes, shelf_region, shelf_id=None):
+        """Derive one analysis plane of a shelf ROI from the planes computed so far"""
+        if name == "edges" and "gray" not in planes:
+            planes["gray"] = self.compute_plane("gray", planes, shelf_region, shelf_id)
+        
+        start = time.perf_counter()
+        analysis_roi = planes["color"]
+        if name == "gray":
+            plane = cv2.cvtColor(analysis_roi, cv2.COLOR_BGR2GRAY)
+        elif name == "edges":
+            plane = cv2.Canny(planes["gray"], 50, 150)
+        elif name == "hsv":
+            plane = cv2.cvtColor(analysis_roi, cv2.COLOR_BGR2HSV)
+        elif name == "foreground":
+            try:
+                if self.bg_registry is not None:
+                    model_key = (self.camera_id, shelf_id if shelf_id is not None else tuple(shelf_region))
+                    plane = self.bg_registry.apply(model_key, analysis_roi)
+                else:
+                    plane = self.bg_subtractor.apply(analysis_roi)
+            except:
+                plane = None
+        else:
+            raise ValueError(f"Unknown plane: {name}")
+        if self.feature_costs is not None:
+            self.feature_costs.record(f"plane:{name}", time.perf_counter() - start)
+        return plane
+
     
     def calculate_texture_score(self, gray_roi):
         """Calculate texture score using variance of Laplacian"""
@@ -235,17 +342,19 @@ class EnhancedStockMonitor:
         except:
             return 0.0
     
-    def calculate_histogram_score(self, gray_roi):
+    def calculate_histogram_score(self, gray_roi, scale=1.0):
         """Calculate histogram-based score"""
         try:
             hist = cv2.calcHist([gray_roi], [0], None, [256], [0, 256])
-            hist_variance = np.var(hist)
+            # Bin counts shrink with the pixel count, so their variance shrinks roughly as scale^3.
+            # The entropy term over raw counts is not a bounded metric and is left uncompensated.
+            hist_variance = np.var(hist) / scale ** 3
             hist_entropy = -np.sum(hist * np.log2(hist + 1e-10))
             return min((hist_variance / 1000000 + hist_entropy / 1000), 1.0)
         except:
             return 0.0
     
-    def calculate_contour_complexity(self, edges):
+    def calculate_contour_complexity(self, edges, scale=1.0):
         """Calculate contour complexity score"""
         try:
             contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -253,13 +362,13 @@ class EnhancedStockMonitor:
                 return 0.0
             
             # Calculate complexity based on contour count and perimeter
-            total_perimeter = sum(cv2.arcLength(contour, True) for contour in contours)
+            total_perimeter = sum(cv2.arcLength(contour, True) for contour in contours) / scale
             complexity = min(len(contours) / 20.0 + total_perimeter / 1000.0, 1.0)
             return complexity
         except:
             return 0.0
     
-    def calculate_color_distribution_score(self, hsv_roi):
+    def calculate_color_distribution_score(self, hsv_roi, scale=1.0):
         """Calculate color distribution score"""
         try:
             # Calculate color distribution in HSV space
@@ -360,20 +469,41 @@ class EnhancedStockMonitor:
             x, y, w, h = shelf_config.region
             
             # Analyze occupancy
-            occupancy_score, shelf_roi = self.analyze_shelf_occupancy_advanced(frame, shelf_config.region)
+            occupancy_score, shelf_roi = self.analyze_shelf_occupancy_advanced(
+                frame, shelf_config.region, shelf_config.id, shelf_config.analysis_scale,
+                shelf_config.metric_profile
+            )
+            
+            # Smooth the score into a stable level when the state tracker is available
+            if self.shelf_states is not None:
+                smoothed_score, level, transition = self.shelf_states.update(
+                    shelf_config.id, occupancy_score, shelf_config.empty_threshold
+                )
+                entered_empty = transition is not None and level == "EMPTY"
+            else:
+                smoothed_score = occupancy_score
+                if occupancy_score < shelf_config.empty_threshold:
+                    level = "EMPTY"
+                elif occupancy_score < 0.3:
+                    level = "LOW"
+                elif occupancy_score < 0.7:
+                    level = "MEDIUM"
+                else:
+                    level = "HIGH"
+                entered_empty = level == "EMPTY"
             
             # Determine color and status
-            if occupancy_score < shelf_config.empty_threshold:
+            if level == "EMPTY":
                 color = (0, 0, 255)  # Red for empty
                 status = "EMPTY"
                 thickness = 3
-                if self.monitoring:
-                    self.send_alert_to_api(shelf_config, occupancy_score)
-            elif occupancy_score < 0.3:
+                if self.monitoring and entered_empty:
+                    self.send_alert_to_api(shelf_config, smoothed_score)
+            elif level == "LOW":
                 color = (0, 165, 255)  # Orange for low stock
                 status = "LOW"
                 thickness = 2
-            elif occupancy_score < 0.7:
+            elif level == "MEDIUM":
                 color = (0, 255, 255)  # Yellow for medium stock
                 status = "MEDIUM"
                 thickness = 2
@@ -450,6 +580,8 @@ class EnhancedStockMonitor:
                 self.bg_subtractor = cv2.createBackgroundSubtractorMOG2(
                     history=500, varThreshold=16, detectShadows=True
                 )
+                if self.bg_registry is not None:
+                    self.bg_registry.clear()
                 logger.info("Background model reset")
             elif key == ord('s'):
                 # Save screenshot
@@ -465,6 +597,11 @@ class EnhancedStockMonitor:
         self.running = False
         if self.cap:
             self.cap.release()
+        if self.bg_registry is not None and self.bg_snapshot_path:
+            try:
+                self.bg_registry.save(self.bg_snapshot_path)
+            except Exception as e:
+                logger.error(f"Failed to save background models: {str(e)}")
         cv2.destroyAllWindows()
         logger.info("Enhanced monitoring system shutdown complete")
 
@@ -1,4 +1,4 @@
-import React, { useState, useRef, useCallback } from 'react';
+import React, { useState, useRef, useCallback, useEffect } from 'react';
 import {
   Container,
   Paper,
@@ -27,6 +27,7 @@ import {
   Refresh,
   Fullscreen,
   Settings,
+  Videocam,
 } from '@mui/icons-material';
 import Webcam from 'react-webcam';
 import { useDropzone } from 'react-dropzone';
@@ -34,6 +35,9 @@ import { useQuery } from 'react-query';
 import { cameraService, cvService } from '../services/authService';
 import { useSocket } from '../contexts/SocketContext';
 
+// Milliseconds between webcam frames sent while streaming
+const STREAM_INTERVAL_MS = 1000;
+
 const LiveMonitoringPage = () => {
   const [selectedCamera, setSelectedCamera] = useState('');
   const [isStreaming, setIsStreaming] = useState(false);
@@ -41,7 +45,10 @@ const LiveMonitoringPage = () => {
   const [analysisResults, setAnalysisResults] = useState([]);
   const [processing, setProcessing] = useState(false);
   const [useWebcam, setUseWebcam] = useState(true);
+  const [useServerStream, setUseServerStream] = useState(false);
   const webcamRef = useRef(null);
+  const frameSocketRef = useRef(null);
+  const streamTimerRef = useRef(null);
   const { connected } = useSocket();
 
   const { data: cameras, isLoading: camerasLoading } = useQuery(
@@ -77,13 +84,11 @@ const LiveMonitoringPage = () => {
       const imageSrc = webcamRef.current.getScreenshot();
       setCurrentFrame(imageSrc);
       
-      // Convert data URL to blob for processing
-      fetch(imageSrc)
-        .then(res => res.blob())
-        .then(blob => {
-          const file = new File([blob], 'webcam-capture.jpg', { type: 'image/jpeg' });
-          processFrame(file);
-        });
+      // Upload straight from the canvas rather than decoding the base64 data URL
+      webcamRef.current.getCanvas().toBlob((blob) => {
+        const file = new File([blob], 'webcam-capture.jpg', { type: 'image/jpeg' });
+        processFrame(file);
+      }, 'image/jpeg');
     }
   }, [webcamRef]);
 
@@ -105,17 +110,45 @@ const LiveMonitoringPage = () => {
     }
   };
 
+  const closeFrameSocket = () => {
+    clearInterval(streamTimerRef.current);
+    streamTimerRef.current = null;
+    if (frameSocketRef.current) {
+      frameSocketRef.current.close();
+      frameSocketRef.current = null;
+    }
+  };
+
   const startStreaming = () => {
     setIsStreaming(true);
-    // In a real implementation, this would start the video stream processing
-    // For now, we'll just enable the webcam
+    if (!useWebcam) {
+      return;
+    }
+    // Binary JPEG frames over one socket; the server drops frames it cannot keep up with
+    const frameSocket = cvService.openFrameSocket((message) => {
+      if (message.type === 'results') {
+        setAnalysisResults(message.results);
+      } else if (message.type === 'error') {
+        console.error('Error processing frame:', message.detail);
+      }
+    });
+    frameSocketRef.current = frameSocket;
+    streamTimerRef.current = setInterval(() => {
+      const canvas = webcamRef.current && webcamRef.current.getCanvas();
+      if (canvas) {
+        canvas.toBlob((blob) => blob && frameSocket.sendFrame(selectedCamera, blob), 'image/jpeg');
+      }
+    }, STREAM_INTERVAL_MS);
   };
 
   const stopStreaming = () => {
+    closeFrameSocket();
     setIsStreaming(false);
     setAnalysisResults([]);
   };
 
+  useEffect(() => closeFrameSocket, []);
+
   const autoDetectShelves = async () => {
     if (!currentFrame || !selectedCamera) {
       alert('Please capture a frame and select a camera first');
@@ -179,19 +212,27 @@ const LiveMonitoringPage = () => {
 
             <Box display="flex" gap={1} mb={2}>
               <Button
-                variant={useWebcam ? 'contained' : 'outlined'}
-                onClick={() => setUseWebcam(true)}
+                variant={useWebcam && !useServerStream ? 'contained' : 'outlined'}
+                onClick={() => { setUseWebcam(true); setUseServerStream(false); }}
                 startIcon={<CameraAlt />}
               >
                 Webcam
               </Button>
               <Button
-                variant={!useWebcam ? 'contained' : 'outlined'}
-                onClick={() => setUseWebcam(false)}
+                variant={!useWebcam && !useServerStream ? 'contained' : 'outlined'}
+                onClick={() => { setUseWebcam(false); setUseServerStream(false); }}
                 startIcon={<Upload />}
               >
                 Upload
               </Button>
+              <Button
+                variant={useServerStream ? 'contained' : 'outlined'}
+                onClick={() => setUseServerStream(true)}
+                startIcon={<Videocam />}
+                disabled={!selectedCamera}
+              >
+                Stream
+              </Button>
             </Box>
 
             <Box display="flex" gap={1} mb={2}>
@@ -300,7 +341,18 @@ const LiveMonitoringPage = () => {
                 backgroundColor: '#f5f5f5',
               }}
             >
-              {useWebcam ? (
+              {useServerStream && selectedCamera ? (
+                <img
+                  key={selectedCamera}
+                  src={cvService.streamUrl(selectedCamera)}
+                  alt="Annotated camera stream"
+                  style={{
+                    maxWidth: '100%',
+                    maxHeight: '400px',
+                    objectFit: 'contain',
+                  }}
+                />
+              ) : useWebcam ? (
                 <>
                   <Webcam
                     audio={false}
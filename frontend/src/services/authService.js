@@ -103,6 +103,29 @@ export const cvService = {
       headers: { 'Content-Type': 'multipart/form-data' },
     });
   },
+  // <img> tags cannot send the Authorization header, so the token goes in the query string
+  streamUrl: (cameraId) =>
+    `${API_BASE_URL}/api/cameras/${cameraId}/stream?token=${encodeURIComponent(localStorage.getItem('token') || '')}`,
+  // Persistent socket for continuous frames: each binary message is a 4-byte big-endian
+  // camera id followed by the JPEG; analysis results come back as JSON messages
+  openFrameSocket: (onMessage) => {
+    const token = encodeURIComponent(localStorage.getItem('token') || '');
+    const socket = new WebSocket(`${API_BASE_URL.replace(/^http/, 'ws')}/ws/frames?token=${token}`);
+    socket.onmessage = (event) => onMessage(JSON.parse(event.data));
+    return {
+      sendFrame: async (cameraId, blob) => {
+        if (socket.readyState !== WebSocket.OPEN) {
+          return;
+        }
+        const jpeg = new Uint8Array(await blob.arrayBuffer());
+        const message = new Uint8Array(4 + jpeg.length);
+        new DataView(message.buffer).setUint32(0, cameraId);
+        message.set(jpeg, 4);
+        socket.send(message);
+      },
+      close: () => socket.close(),
+    };
+  },
 };
 
 export default api;